@@ -0,0 +1,92 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import Response
+from typing import Optional
+from app.models.schemas import AnalysisRecord, AnalysisResponse, AnalysisSectionResponse, PDFGenerateRequest
+from app.api.dependencies import AnalysisStoreDep, RateLimitDep
+from app.utils.analysis_store import ANALYSIS_SECTIONS
+from app.utils.http_cache import make_etag, etag_matches
+
+router = APIRouter(prefix="/analyses", tags=["Analyses"])
+
+# 保存した分析は変更されないため、クライアント側で長めにキャッシュさせる
+CACHE_CONTROL = "private, max-age=86400, immutable"
+
+async def _get_record(store, analysis_id: str) -> AnalysisRecord:
+    record = await asyncio.to_thread(store.get, analysis_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="分析が見つかりません（期限切れの可能性があります）")
+    return record
+
+def _section_response(
+    analysis_id: str,
+    section: str,
+    content: str,
+    structured: Optional[dict],
+    if_none_match: Optional[str]
+) -> Response:
+    """セクションを返す（分析IDとセクション名からETagが決まる）"""
+    etag = make_etag(f"{analysis_id}-{section}")
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = AnalysisSectionResponse(
+        analysis_id=analysis_id, section=section, content=content, structured=structured
+    )
+    return Response(content=body.model_dump_json(), media_type="application/json", headers=headers)
+
+@router.get("/{analysis_id}", response_model=AnalysisResponse)
+async def get_analysis(analysis_id: str, store: AnalysisStoreDep, _rate_limit: RateLimitDep):
+    """保存済み分析の概要と取得できるセクション一覧"""
+    record = await _get_record(store, analysis_id)
+    return AnalysisResponse(
+        analysis_id=record.analysis_id,
+        created_at=record.created_at,
+        company_data=record.company_data,
+        sections=store.section_index(record)
+    )
+
+@router.get("/{analysis_id}/sections/{section}", response_model=AnalysisSectionResponse)
+async def get_analysis_section(
+    analysis_id: str,
+    section: str,
+    store: AnalysisStoreDep,
+    _rate_limit: RateLimitDep,
+    if_none_match: Optional[str] = Header(None)
+):
+    """セクション（summary / hypothesis / matching_result / hearing_items）を取得"""
+    if section not in dict(ANALYSIS_SECTIONS):
+        raise HTTPException(status_code=404, detail=f"不明なセクションです: {section}")
+
+    record = await _get_record(store, analysis_id)
+    return _section_response(
+        analysis_id, section, getattr(record, section), record.structured_results.get(section), if_none_match
+    )
+
+@router.get("/{analysis_id}/summary/steps/{step}", response_model=AnalysisSectionResponse)
+async def get_summary_step(
+    analysis_id: str,
+    step: int,
+    store: AnalysisStoreDep,
+    _rate_limit: RateLimitDep,
+    if_none_match: Optional[str] = Header(None)
+):
+    """要約ステップの結果を取得"""
+    record = await _get_record(store, analysis_id)
+    summary_step = next((s for s in record.summary_steps if s.step == step), None)
+    if summary_step is None:
+        raise HTTPException(status_code=404, detail=f"要約ステップが見つかりません: {step}")
+
+    return _section_response(analysis_id, f"summary_step{step}", summary_step.content, None, if_none_match)
+
+@router.get("/{analysis_id}/pdf")
+async def get_analysis_pdf(
+    analysis_id: str,
+    _rate_limit: RateLimitDep,
+    if_none_match: Optional[str] = Header(None)
+):
+    """レポートPDFを取得（事前生成済みならキャッシュから返し、なければその場で生成）"""
+    from app.api.pdf_routes import generate_analysis_report
+
+    return await generate_analysis_report(PDFGenerateRequest(analysis_id=analysis_id), if_none_match)
@@ -5,13 +5,14 @@ from app.config import settings
 from app.services.company_service import CompanyService
 from app.services.solution_service import SolutionService
 from app.services.gemini_service import GeminiService
+from app.utils.analysis_store import AnalysisStore
 
 logger = logging.getLogger(__name__)
 
 # API Key validation
 async def verify_api_key():
     """Google API キーの検証"""
-    if not settings.GOOGLE_API_KEY:
+    if not settings.GOOGLE_API_KEY and not settings.GEMINI_USE_FAKE_MODEL and not settings.TRAFFIC_REPLAY_CASSETTES:
         logger.error("Google API キーが設定されていません")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -32,6 +33,10 @@ async def get_gemini_service() -> GeminiService:
     """GeminiServiceの依存性注入"""
     return GeminiService()
 
+async def get_analysis_store() -> AnalysisStore:
+    """AnalysisStoreの依存性注入"""
+    return AnalysisStore()
+
 # Rate limiting (将来的な拡張用)
 class RateLimiter:
     """レート制限クラス（将来的な実装用）"""
@@ -65,4 +70,5 @@ ApiKeyDep = Annotated[bool, Depends(verify_api_key)]
 CompanyServiceDep = Annotated[CompanyService, Depends(get_company_service)]
 SolutionServiceDep = Annotated[SolutionService, Depends(get_solution_service)]
 GeminiServiceDep = Annotated[GeminiService, Depends(get_gemini_service)]
+AnalysisStoreDep = Annotated[AnalysisStore, Depends(get_analysis_store)]
 RateLimitDep = Annotated[bool, Depends(RateLimiter())]
\ No newline at end of file
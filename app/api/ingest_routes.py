@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from fastapi import APIRouter, HTTPException
+from typing import Dict
+from app.config import settings
+from app.models.schemas import ReportIngestRequest, ReportIngestJobResponse
+from app.api.dependencies import ApiKeyDep, RateLimitDep
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/ingest", tags=["Ingest"])
+
+# 実行中・完了済みの取り込みジョブ（プロセス内で保持。完了後は期限・件数の上限で削除）
+_jobs: Dict[str, Dict] = {}
+
+def _on_job_done(job_id: str, task: asyncio.Task) -> None:
+    job = _jobs.get(job_id)
+    if job is not None:
+        job["finished_at"] = time.monotonic()
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"取り込みジョブ失敗: {job_id}: {task.exception()}")
+
+def _prune_jobs() -> None:
+    """期限を過ぎた完了済みジョブと、上限を超えた分の古い完了済みジョブを削除（実行中は残す）"""
+    now = time.monotonic()
+    finished = sorted(
+        (job["finished_at"], job_id) for job_id, job in _jobs.items() if job.get("finished_at") is not None
+    )
+    excess = len(_jobs) - settings.REPORT_INGEST_MAX_JOBS
+    for finished_at, job_id in finished:
+        if now - finished_at > settings.REPORT_INGEST_JOB_TTL_SECONDS or excess > 0:
+            del _jobs[job_id]
+            excess -= 1
+
+def _resolve_directory(path: str) -> str:
+    """取り込み元のパスを REPORT_INGEST_ROOT_DIR 配下に限定して解決"""
+    if not settings.REPORT_INGEST_ROOT_DIR:
+        raise HTTPException(status_code=403, detail="APIからの取り込みは無効です（REPORT_INGEST_ROOT_DIR 未設定）")
+
+    root = os.path.realpath(settings.REPORT_INGEST_ROOT_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=400, detail="取り込み元は REPORT_INGEST_ROOT_DIR 配下を指定してください")
+    return resolved
+
+def _job_response(job_id: str) -> ReportIngestJobResponse:
+    job = _jobs[job_id]
+    return ReportIngestJobResponse(
+        job_id=job_id,
+        directory=job["directory"],
+        progress=job["progress"].to_dict()
+    )
+
+@router.post("/reports", response_model=ReportIngestJobResponse, status_code=202)
+async def ingest_reports(
+    request: ReportIngestRequest,
+    _api_key: ApiKeyDep,
+    _rate_limit: RateLimitDep
+):
+    """ディレクトリ内の報告書PDFをバックグラウンドで一括取り込み"""
+    from app.services.report_ingestion import IngestionProgress, ingest_reports, scan_directory
+
+    directory = _resolve_directory(request.directory)
+    if not os.path.isdir(directory):
+        raise HTTPException(status_code=404, detail="ディレクトリが見つかりません")
+    manifest = _resolve_directory(request.manifest) if request.manifest else None
+
+    items = await asyncio.to_thread(scan_directory, directory, manifest)
+    progress = IngestionProgress(total=len(items))
+
+    _prune_jobs()
+    job_id = uuid.uuid4().hex
+    task = asyncio.create_task(ingest_reports(items, progress=progress))
+    _jobs[job_id] = {
+        "directory": request.directory,
+        "progress": progress,
+        "task": task,
+        "finished_at": None,
+    }
+    task.add_done_callback(lambda done: _on_job_done(job_id, done))
+    return _job_response(job_id)
+
+@router.get("/reports/{job_id}", response_model=ReportIngestJobResponse)
+async def get_ingest_job(job_id: str):
+    """取り込みジョブの進捗を取得"""
+    _prune_jobs()
+    if job_id not in _jobs:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return _job_response(job_id)
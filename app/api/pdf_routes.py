@@ -1,58 +1,262 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+import asyncio
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Dict, Any
-import io
+from typing import List, Dict, Any, Optional, Callable, BinaryIO, Iterator, Union
+import tempfile
+import threading
+import weakref
+import logging
 from datetime import datetime
-from app.services.pdf_service import PDFService
-from app.models.schemas import Solution
+from app.config import settings
+from app.models.schemas import Solution, PDFGenerateRequest
+from app.utils.http_cache import make_etag, etag_matches, attachment_header
+from app.utils.pdf_cache import PDFCache, get_pdf_cache
+from app.utils.analysis_store import AnalysisStore
+from app.utils.memory_budget import estimate_render_bytes, get_memory_budget
+from app.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/pdf", tags=["PDF"])
 
-class PDFGenerateRequest(BaseModel):
-    """PDF生成リクエスト"""
-    company_data: Dict[str, str]
-    results: Dict[str, str]
-    solutions: List[Dict[str, str]] = []
+# 実行中のレポート描画（キャッシュキーごとに1件。描画中に来た同じリクエストは完了を待つ）
+_report_renders: SingleFlight = SingleFlight()
+# 分析完了後に開始したバックグラウンド描画（タスクへの参照を保持する）
+_background_renders: set = set()
+
+class PDFExportRequest(BaseModel):
+    """複数レポートのZIP一括出力リクエスト"""
+    reports: List[PDFGenerateRequest]
+    filename: Optional[str] = None
 
 class SimplePDFRequest(BaseModel):
     """シンプルPDF生成リクエスト"""
     text: str
     title: str = "レポート"
 
-@router.post("/generate-report")
-async def generate_analysis_report(request: PDFGenerateRequest):
-    """分析レポートPDFを生成"""
+def _get_pdf_service():
+    """PDFServiceを生成（reportlab は重いため初回利用時にインポートする）"""
+    from app.services.pdf_service import PDFService
+    
+    return PDFService()
+
+async def _render_to_spool(render: Callable[[BinaryIO], Any], text_chars: int) -> BinaryIO:
+    """PDFを一時ファイル（小さい間はメモリ）へ描画し、先頭に巻き戻して返す
+    
+    描画中は本文の文字数から見積もったメモリ量をメモリ予算に計上する。
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.PDF_SPOOL_MAX_MEMORY)
+    try:
+        # reportlab の描画はCPUを占有するためイベントループ外で実行
+        async with get_memory_budget().reserve(estimate_render_bytes(text_chars), "render"):
+            await run_in_threadpool(render, spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+def _iter_spool(spool: BinaryIO) -> Iterator[bytes]:
+    """一時ファイルをチャンク単位で読み出し、読み終えたら閉じる"""
     try:
-        pdf_service = PDFService()
-        pdf_buffer = pdf_service.generate_analysis_report(
+        while True:
+            chunk = spool.read(settings.PDF_STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
+
+class _SharedSpool:
+    """キャッシュできないサイズの描画結果（描画の完了を待っていた呼び出し元で共有する）
+
+    各呼び出し元は自分の読み出し位置で配信し、誰も参照しなくなった時点で一時ファイルを閉じる。
+    """
+
+    def __init__(self, spool: BinaryIO):
+        self._spool = spool
+        self._lock = threading.Lock()
+        weakref.finalize(self, spool.close)
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        offset = 0
+        while True:
+            with self._lock:
+                self._spool.seek(offset)
+                chunk = self._spool.read(settings.PDF_STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+
+def _spool_size(spool: BinaryIO) -> int:
+    """一時ファイルのサイズを取得（位置は先頭に戻す）"""
+    size = spool.seek(0, 2)
+    spool.seek(0)
+    return size
+
+async def _resolve_analysis(request: PDFGenerateRequest) -> PDFGenerateRequest:
+    """analysis_id が指定されていれば保存済みの分析から本文を補う"""
+    if not request.analysis_id:
+        if not request.company_data or not request.results:
+            raise HTTPException(status_code=422, detail="analysis_id または company_data と results を指定してください")
+        return request
+    
+    store = AnalysisStore()
+    record = await asyncio.to_thread(store.get, request.analysis_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="分析が見つかりません（期限切れの可能性があります）")
+    
+    return request.model_copy(update={
+        "company_data": {**record.company_data, **request.company_data},
+        "results": {**store.results(record), **request.results},
+        "structured_results": {**record.structured_results, **request.structured_results},
+    })
+
+async def _render_report(request: PDFGenerateRequest) -> BinaryIO:
+    """分析レポートPDFを一時ファイルへ描画"""
+    pdf_service = _get_pdf_service()
+    return await _render_to_spool(
+        lambda output: pdf_service.generate_analysis_report(
             company_data=request.company_data,
             results=request.results,
-            solutions=request.solutions
-        )
-        
-        # ファイル名を生成
-        company_name = request.company_data.get('company_name', '企業')
-        current_date = datetime.now().strftime("%Y%m%d")
-        filename = f"{company_name}_分析結果_{current_date}.pdf"
+            solutions=request.solutions,
+            output=output,
+            structured_results=request.structured_results
+        ),
+        text_chars=sum(len(text) for text in request.results.values())
+    )
+
+async def _render_report_to_cache(cache_key: str, request: PDFGenerateRequest) -> Union[bytes, _SharedSpool]:
+    """本文を解決済みのリクエストを描画してキャッシュに格納（キャッシュできないサイズなら一時ファイルのまま返す）"""
+    spool = await _render_report(request)
+    pdf_cache = get_pdf_cache()
+    if _spool_size(spool) > pdf_cache.max_entry_bytes:
+        return _SharedSpool(spool)
+    
+    def store() -> bytes:
+        with spool:
+            pdf_bytes = spool.read()
+        pdf_cache.put(cache_key, pdf_bytes)
+        return pdf_bytes
+    
+    # キャッシュバックエンド（SQLiteなど）への書き込みはイベントループ外で行う
+    return await asyncio.to_thread(store)
+
+def schedule_report_render(analysis_id: str) -> None:
+    """保存済み分析のレポートPDFをバックグラウンドで描画する
+    
+    分析IDのみのリクエスト（GET /analyses/{id}/pdf と同じ内容）のキャッシュに格納するため、
+    描画後の取得はキャッシュから即座に返る。描画中の取得は完了を待つ。
+    """
+    request = PDFGenerateRequest(analysis_id=analysis_id)
+    cache_key = PDFCache.make_key(request.model_dump())
+    if _report_renders.in_flight(cache_key):
+        return
+    
+    async def render_resolved() -> Union[bytes, _SharedSpool]:
+        # 描画済みならキャッシュの内容を返す（キャッシュの確認中に来た取得も相乗りさせる）
+        cached = await asyncio.to_thread(get_pdf_cache().get, cache_key)
+        if cached is not None:
+            return cached
+        return await _render_report_to_cache(cache_key, await _resolve_analysis(request))
+    
+    async def render() -> None:
+        try:
+            await _report_renders.run(cache_key, render_resolved)
+            logger.info(f"レポートPDFを事前生成: {analysis_id}")
+        except Exception as e:
+            logger.warning(f"レポートPDFの事前生成に失敗: {analysis_id}: {e}")
+    
+    task = asyncio.create_task(render())
+    _background_renders.add(task)
+    task.add_done_callback(_background_renders.discard)
+
+@router.post("/generate-report")
+async def generate_analysis_report(
+    request: PDFGenerateRequest,
+    if_none_match: Optional[str] = Header(None)
+):
+    """分析レポートPDFを生成"""
+    # リクエスト内容のハッシュをキャッシュキー兼ETagとして使用
+    # （保存済みの分析は変更されないため、analysis_id 指定時は本文を読み出す前に判定できる）
+    # PDFには生成日時が入り、描画し直すとバイト列が変わるため弱いETagとする
+    cache_key = PDFCache.make_key(request.model_dump())
+    etag = make_etag(cache_key, weak=True)
+    
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    request = await _resolve_analysis(request)
+    
+    # ファイル名を生成
+    company_name = request.company_data.get('company_name', '企業')
+    current_date = datetime.now().strftime("%Y%m%d")
+    filename = f"{company_name}_分析結果_{current_date}.pdf"
+    headers = {
+        "Content-Disposition": attachment_header(filename),
+        "ETag": etag
+    }
+    
+    try:
+        rendered = await asyncio.to_thread(get_pdf_cache().get, cache_key)
+        if rendered is None and _report_renders.in_flight(cache_key):
+            # バックグラウンドで描画中なら、やり直さずに完了を待つ（失敗した場合はこの場で描画）
+            try:
+                rendered = await _report_renders.run(cache_key, lambda: _render_report_to_cache(cache_key, request))
+            except Exception as e:
+                logger.warning(f"バックグラウンド描画の結果を利用できません: {e}")
+        if rendered is None:
+            # 同時に来た同じリクエストも1回の描画にまとめる
+            rendered = await _report_renders.run(cache_key, lambda: _render_report_to_cache(cache_key, request))
         
-        return StreamingResponse(
-            io.BytesIO(pdf_buffer.read()),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+        # キャッシュ可能なサイズならメモリから、それ以外は一時ファイルから直接配信
+        if isinstance(rendered, _SharedSpool):
+            return StreamingResponse(
+                rendered.iter_chunks(),
+                media_type="application/pdf",
+                headers=headers
+            )
+        return Response(content=rendered, media_type="application/pdf", headers=headers)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF生成エラー: {str(e)}")
 
+@router.post("/export")
+async def export_reports(request: PDFExportRequest):
+    """複数の分析レポートPDFを並列に生成し、ZIPとして順次配信"""
+    from app.services.report_export import ReportExporter
+    
+    if not request.reports:
+        raise HTTPException(status_code=422, detail="reports を1件以上指定してください")
+    if len(request.reports) > settings.PDF_EXPORT_MAX_REPORTS:
+        raise HTTPException(status_code=422, detail=f"一度に出力できるのは {settings.PDF_EXPORT_MAX_REPORTS} 件までです")
+    
+    # 配信開始後はエラーを返せないため、分析IDの解決は先に済ませる
+    reports = await asyncio.gather(*(_resolve_analysis(report) for report in request.reports))
+    
+    current_date = datetime.now().strftime("%Y%m%d")
+    filename = request.filename or f"分析結果_{len(reports)}社_{current_date}.zip"
+    return StreamingResponse(
+        ReportExporter().stream_zip(reports),
+        media_type="application/zip",
+        headers={"Content-Disposition": attachment_header(filename)}
+    )
+
 @router.post("/generate-simple")
 async def generate_simple_pdf(request: SimplePDFRequest):
     """シンプルなテキストPDFを生成"""
     try:
-        pdf_service = PDFService()
-        pdf_buffer = pdf_service.generate_simple_text_pdf(
-            text=request.text,
-            title=request.title
+        pdf_service = _get_pdf_service()
+        spool = await _render_to_spool(
+            lambda output: pdf_service.generate_simple_text_pdf(
+                text=request.text,
+                title=request.title,
+                output=output
+            ),
+            text_chars=len(request.text)
         )
         
         # ファイル名を生成
@@ -60,9 +264,9 @@ async def generate_simple_pdf(request: SimplePDFRequest):
         filename = f"{request.title}_{current_date}.pdf"
         
         return StreamingResponse(
-            io.BytesIO(pdf_buffer.read()),
+            _iter_spool(spool),
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers={"Content-Disposition": attachment_header(filename)}
         )
     
     except Exception as e:
@@ -72,12 +276,15 @@ async def generate_simple_pdf(request: SimplePDFRequest):
 async def test_pdf_generation():
     """PDF生成テスト"""
     try:
-        pdf_service = PDFService()
+        pdf_service = _get_pdf_service()
         test_text = "これはPDF生成のテストです。\n\n日本語フォントが正しく表示されているかを確認します。"
-        pdf_buffer = pdf_service.generate_simple_text_pdf(test_text, "テストレポート")
+        spool = await _render_to_spool(
+            lambda output: pdf_service.generate_simple_text_pdf(test_text, "テストレポート", output=output),
+            text_chars=len(test_text)
+        )
         
         return StreamingResponse(
-            io.BytesIO(pdf_buffer.read()),
+            _iter_spool(spool),
             media_type="application/pdf",
             headers={"Content-Disposition": "attachment; filename=test_report.pdf"}
         )
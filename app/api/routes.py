@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import logging
+from fastapi import APIRouter, HTTPException, Header, Request
+from fastapi.responses import Response
+from typing import Dict, Optional
+from app.config import settings
 from app.models.schemas import (
     CompanySearchRequest,
     CompanySearchResponse,
+    PrefetchRequest,
+    PrefetchResponse,
     SolutionsResponse,
     HealthResponse
 )
@@ -11,9 +18,26 @@ from app.api.dependencies import (
     SolutionServiceDep,
     RateLimitDep
 )
+from app.utils.http_cache import etag_matches
+from app.utils.memory_budget import get_memory_budget
+from app.utils.request_deadline import DeadlineExceeded, cancellation_stats, run_with_deadline
+from app.utils.text_normalizer import normalization_stats
+from app.utils.traffic_recorder import replay_match_stats
+from app.services.gemini_scheduler import get_gemini_scheduler
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 実行中の事前取得（企業名ごとに1件。タスクへの参照を保持する）
+_prefetches: Dict[str, asyncio.Task] = {}
+
+def _on_prefetch_done(company_name: str, task: asyncio.Task) -> None:
+    if _prefetches.get(company_name) is task:
+        del _prefetches[company_name]
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"事前取得失敗: {company_name}: {task.exception()}")
+
 @router.get("/", response_model=HealthResponse)
 async def health_check():
     """ヘルスチェック"""
@@ -22,26 +46,83 @@ async def health_check():
 @router.get("/solutions", response_model=SolutionsResponse)
 async def get_solutions(
     solution_service: SolutionServiceDep,
-    _: RateLimitDep
+    _: RateLimitDep,
+    if_none_match: Optional[str] = Header(None)
 ):
     """ソリューション一覧を取得"""
     try:
-        solutions = solution_service.get_solutions()
-        return SolutionsResponse(success=True, solutions=solutions)
+        catalog = solution_service.get_catalog()
+        if etag_matches(if_none_match, catalog.etag):
+            return Response(status_code=304, headers={"ETag": catalog.etag})
+        
+        # 事前にシリアライズ済みのレスポンスをそのまま返す
+        return Response(
+            content=catalog.response_body,
+            media_type="application/json",
+            headers={"ETag": catalog.etag}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/metrics")
+async def get_metrics():
+    """メモリ予算・Gemini呼び出し・テキスト正規化・リクエスト取り消しの利用状況（再生中は記録との一致の内訳も）"""
+    metrics = {
+        "memory_budget": get_memory_budget().stats(),
+        "gemini_scheduler": get_gemini_scheduler().stats(),
+        "text_normalization": normalization_stats(),
+        "cancellations": cancellation_stats(),
+    }
+    replay_matches = replay_match_stats()
+    if replay_matches is not None:
+        metrics["traffic_replay"] = replay_matches
+    return metrics
+
+@router.post("/prefetch", response_model=PrefetchResponse, status_code=202)
+async def prefetch(
+    request: PrefetchRequest,
+    company_service: CompanyServiceDep,
+    _api_key: ApiKeyDep,
+    _rate_limit: RateLimitDep
+):
+    """企業の報告書取得・要約をバックグラウンドで開始（検索前に呼び出す）"""
+    company_name = request.company_name.strip()
+    if not settings.PREFETCH_ENABLED:
+        return PrefetchResponse(company_name=company_name, status="disabled")
+    if company_name in _prefetches:
+        return PrefetchResponse(company_name=company_name, status="in_progress")
+    if not company_service.get_company_code(company_name):
+        return PrefetchResponse(company_name=company_name, status="unknown_company")
+    
+    task = asyncio.create_task(company_service.prefetch(company_name))
+    _prefetches[company_name] = task
+    task.add_done_callback(lambda done: _on_prefetch_done(company_name, done))
+    return PrefetchResponse(company_name=company_name, status="started")
+
 @router.post("/search-company", response_model=CompanySearchResponse)
 async def search_company(
     request: CompanySearchRequest,
+    http_request: Request,
     company_service: CompanyServiceDep,
     _api_key: ApiKeyDep,
     _rate_limit: RateLimitDep
 ):
-    """企業検索・分析を実行"""
+    """企業検索・分析を実行（期限切れ・クライアント切断時は残りのGemini呼び出しを取り消す）"""
     try:
-        result = await company_service.analyze_company(request)
+        result = await run_with_deadline(http_request, lambda: company_service.analyze_company(request))
+        
+        # 結果が確定したらレポートPDFをバックグラウンドで生成しておく
+        render_pdf = settings.PDF_EAGER_RENDER if request.render_pdf is None else request.render_pdf
+        if render_pdf and result.analysis_id:
+            from app.api.pdf_routes import schedule_report_render
+            
+            schedule_report_render(result.analysis_id)
+        
         return result
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         # Gemini API などで発生した例外は500で返す
         raise HTTPException(status_code=500, detail=f"APIサーバーエラー: {str(e)}")
@@ -1,5 +1,6 @@
 import os
-from typing import List
+import tempfile
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -20,11 +21,21 @@ class Settings(BaseSettings):
     ]
     
     # Gemini設定（BaseSettings経由で環境変数から取得）
-    GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY")
+    # 未設定の検証はインポート時ではなく利用時（verify_api_key / GeminiService）に行う
+    GOOGLE_API_KEY: Optional[str] = os.getenv("GOOGLE_API_KEY")
     GEMINI_MODEL_NAME: str = "gemini-2.5-flash"
 
-    if not GOOGLE_API_KEY:
-        raise ValueError("GOOGLE_API_KEY not found")
+    # Gemini呼び出しスケジューラ設定（クォータと同時実行数）
+    GEMINI_RPM_LIMIT: int = 1000
+    GEMINI_TPM_LIMIT: int = 1000000
+    GEMINI_MAX_CONCURRENCY: int = 8
+    GEMINI_MIN_CONCURRENCY: int = 1
+    GEMINI_CHARS_PER_TOKEN: float = 1.0
+    GEMINI_EXPECTED_OUTPUT_TOKENS: int = 2048
+    GEMINI_RATE_LIMIT_COOLDOWN_SECONDS: float = 5.0
+
+    # ローカル検証用の代替モデルを使用する（APIキー不要）
+    GEMINI_USE_FAKE_MODEL: bool = False
 
     def _get_required_env_var(self, var_name: str) -> str:
         """必須環境変数を取得"""
@@ -41,4 +52,145 @@ class Settings(BaseSettings):
     # PDF処理設定
     MAX_PDF_CHARS: int = 10000
 
+    # 取り込んだ企業・報告書の対応表
+    COMPANY_REGISTRY_PATH: str = os.path.join(tempfile.gettempdir(), "sales_ai_agent", "company_registry.json")
+    # APIから一括取り込みできるディレクトリ（未設定の場合はAPIからの取り込みを無効化）
+    REPORT_INGEST_ROOT_DIR: Optional[str] = None
+    # 完了した取り込みジョブの状態を保持する期間と、保持するジョブ数の上限
+    REPORT_INGEST_JOB_TTL_SECONDS: int = 60 * 60
+    REPORT_INGEST_MAX_JOBS: int = 100
+
+    # 企業コード→報告書PDF URLの解決キャッシュ設定
+    # 期限内は保存済みのURLを即座に返し、再検証の時期を過ぎたものはバックグラウンドで再取得する
+    REPORT_URL_CACHE_TTL_SECONDS: int = 90 * 24 * 60 * 60
+    REPORT_URL_REVALIDATE_AFTER_SECONDS: int = 24 * 60 * 60
+    REPORT_URL_NEGATIVE_TTL_SECONDS: int = 60 * 60
+    WEB_SCRAPER_TIMEOUT: int = 15
+
+    # PDFダウンロード設定
+    PDF_DOWNLOAD_DIR: str = os.path.join(tempfile.gettempdir(), "sales_ai_agent", "pdfs")
+    PDF_MAX_DOWNLOAD_BYTES: int = 100 * 1024 * 1024
+    PDF_DOWNLOAD_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    PDF_DOWNLOAD_CHUNK_SIZE: int = 256 * 1024
+    PDF_DOWNLOAD_TIMEOUT: int = 60
+
+    # メモリ予算によるアドミッション制御（PDFのダウンロード・抽出・描画の推定メモリ量の合計上限）
+    # BYTES=0 の場合はコンテナのメモリ量×RATIO（取得できなければ FALLBACK_BYTES）
+    MEMORY_BUDGET_BYTES: int = 0
+    MEMORY_BUDGET_RATIO: float = 0.6
+    MEMORY_BUDGET_FALLBACK_BYTES: int = 1024 * 1024 * 1024
+    # 処理ごとの推定メモリ量
+    MEMORY_ESTIMATE_DOWNLOAD_BYTES: int = 16 * 1024 * 1024
+    MEMORY_ESTIMATE_EXTRACT_FACTOR: float = 6.0
+    MEMORY_ESTIMATE_TEXT_BYTES_PER_CHAR: int = 8
+    MEMORY_ESTIMATE_RENDER_BASE_BYTES: int = 8 * 1024 * 1024
+    MEMORY_ESTIMATE_RENDER_BYTES_PER_CHAR: int = 256
+
+    # PDFテキスト抽出設定（WORKERS=0 の場合はCPUコア数）
+    PDF_EXTRACT_WORKERS: int = 0
+    PDF_EXTRACT_PAGES_PER_TASK: int = 16
+
+    # 抽出済みテキストストア設定
+    REPORT_TEXT_STORE_DIR: str = os.path.join(tempfile.gettempdir(), "sales_ai_agent", "report_texts")
+    REPORT_TEXT_STORE_COMPRESSION_LEVEL: int = 6
+
+    # 抽出テキストの正規化設定（プロンプトに渡す前にヘッダー・フッター・ページ番号を除き、
+    # 折り返し行を結合して空白を整理する。COMPACT_TABLES は数値のみの行の並びを1行にまとめる）
+    TEXT_NORMALIZATION_ENABLED: bool = True
+    TEXT_NORMALIZATION_COMPACT_TABLES: bool = False
+    # ヘッダー・フッターとみなす繰り返し（最低ページ数と、全ページに対する割合）
+    TEXT_NORMALIZATION_MIN_REPEAT_PAGES: int = 3
+    TEXT_NORMALIZATION_REPEAT_RATIO: float = 0.2
+
+    # 報告書パッセージ検索設定（各ステップに関連箇所のみを渡す）
+    REPORT_RETRIEVAL_ENABLED: bool = True
+    REPORT_RETRIEVAL_TOP_K: int = 8
+    REPORT_RETRIEVAL_PASSAGE_CHARS: int = 1200
+    REPORT_RETRIEVAL_CACHE_SIZE: int = 8
+
+    # 段階的要約のチェックポイント設定（保存先はキャッシュバックエンド）
+    CHECKPOINT_TTL_SECONDS: int = 7 * 24 * 60 * 60
+
+    # リクエストの期限（秒）。X-Request-Timeout ヘッダーで指定した場合はそちらを優先（上限 MAX）
+    # 期限切れ・クライアントの切断時は残りのGemini呼び出しなどを取り消す
+    REQUEST_TIMEOUTS: Dict[str, float] = {"/search-company": 300.0}
+    REQUEST_TIMEOUT_MAX_SECONDS: float = 900.0
+    REQUEST_DISCONNECT_POLL_SECONDS: float = 0.5
+
+    # 本番トラフィックの記録（容量試験の再生用）
+    # 有効時は TRAFFIC_RECORD_PATHS に一致するリクエストと、上流（Gemini・日経・PDF）とのやり取りを
+    # TRAFFIC_CASSETTE_DIR 配下にプロセスごとのカセットとして保存する
+    TRAFFIC_RECORDING_ENABLED: bool = False
+    TRAFFIC_CASSETTE_DIR: str = os.path.join(tempfile.gettempdir(), "sales_ai_agent", "cassettes")
+    TRAFFIC_RECORD_PATHS: List[str] = ["/search-company", "/pdf/"]
+    TRAFFIC_RECORD_MAX_BODY_BYTES: int = 1024 * 1024
+    # 再生時に上流の代わりに応答を返すカセット（複数指定可）と、記録された上流の所要時間に掛ける倍率（0で待たない）
+    TRAFFIC_REPLAY_CASSETTES: List[str] = []
+    TRAFFIC_REPLAY_LATENCY_SCALE: float = 1.0
+    # 再生時、内容が完全に一致する記録がない上流呼び出し（プロンプトや検索件数を変更した場合など）に
+    # 同じリクエストの同じ種類の記録を呼び出し順に返す（なければ種類ごとの記録順）。false なら完全一致のみ
+    TRAFFIC_REPLAY_FALLBACK_ENABLED: bool = True
+
+    # 事前取得（企業選択時点で報告書の取得・要約をバックグラウンドレーンで開始する）
+    PREFETCH_ENABLED: bool = True
+
+    # 保存する分析結果の設定（分析IDでセクションごとの取得・PDF生成ができる期間）
+    ANALYSIS_TTL_SECONDS: int = 30 * 24 * 60 * 60
+    ANALYSIS_STORE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # 段階的要約の実行方式
+    # independent: ステップごとに報告書と前段の結果を含む単発プロンプトを送信
+    # session: 報告書を最初の1ターンでのみ送り、以降は会話の追加ターンとして実行
+    #          （先頭が共通になるため、Gemini 2.5の暗黙的キャッシュが効く）
+    # cached: 報告書をコンテキストキャッシュに登録して参照（SDK未対応時はsession）
+    SUMMARY_CHAIN_MODE: str = "independent"
+    # 要約の既定の方式（リクエストの analysis_mode で変更可能）
+    # full: 6ステップの段階的要約 / fast: 全観点を1回の呼び出しで要約 / fast_split: 前半・後半を並列に要約
+    SUMMARY_ANALYSIS_MODE: str = "full"
+    SUMMARY_SESSION_CONTEXT_CHARS: int = 20000
+    SUMMARY_CONTEXT_CACHE_TTL_SECONDS: int = 600
+
+    # 構造化出力設定
+    # 有効時は仮説・マッチング・ヒアリングをYAMLの structured_output に従ったJSONで出力させる
+    # YAMLの max_output_tokens は設定に関わらず各段（要約ステップを含む）の出力上限として指定する
+    STRUCTURED_OUTPUT_ENABLED: bool = False
+    # gemini-2.5 系は思考トークンも出力上限に含まれ、YAMLの上限（回答の長さ）のままでは回答が途中で
+    # 切れるため、この分を加えて指定する（思考しないモデルでは0）
+    GEMINI_THINKING_TOKEN_ALLOWANCE: int = 8192
+    # response_mime_type / response_schema をAPIに渡す（対応するSDKが必要。無効時はプロンプトで指示）
+    GEMINI_RESPONSE_SCHEMA_ENABLED: bool = False
+
+    # ソリューション絞り込み設定（マッチングに渡す候補数）
+    SOLUTION_SHORTLIST_K: int = 20
+
+    # キャッシュバックエンド設定（memory / sqlite / redis）
+    # sqlite は同一ホストのワーカー間、redis は複数ホスト間でキャッシュを共有する
+    CACHE_BACKEND: str = "sqlite"
+    CACHE_SQLITE_PATH: str = os.path.join(tempfile.gettempdir(), "sales_ai_agent", "cache.sqlite3")
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_KEY_PREFIX: str = "sales_ai_agent"
+    CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    CACHE_MAX_ENTRY_BYTES: int = 16 * 1024 * 1024
+
+    # 分析完了後にレポートPDFをバックグラウンドで生成する（リクエストの render_pdf で上書き可）
+    PDF_EAGER_RENDER: bool = False
+
+    # 生成PDFキャッシュ設定
+    PDF_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    PDF_CACHE_MAX_ENTRY_BYTES: int = 16 * 1024 * 1024
+
+    # 複数レポートのZIP一括出力設定（WORKERS=0 の場合はCPUコア数）
+    PDF_EXPORT_WORKERS: int = 0
+    PDF_EXPORT_MAX_REPORTS: int = 100
+
+    # PDF配信設定（この値を超えるとメモリではなく一時ファイルに書き出す）
+    PDF_SPOOL_MAX_MEMORY: int = 1024 * 1024
+    PDF_STREAM_CHUNK_SIZE: int = 64 * 1024
+
+    # 起動設定（PREWARM: 起動後にバックグラウンドで重いモジュール等を事前読み込み）
+    PREWARM_ON_STARTUP: bool = True
+    PREWARM_DELAY_SECONDS: float = 1.0
+    # 計測値は環境により0.6〜1秒程度ばらつくため余裕を持たせる
+    IMPORT_TIME_BUDGET_MS: int = 2000
+
 settings = Settings()
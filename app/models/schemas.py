@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Dict, List, Literal, Optional
 
 # リクエストモデル
 class CompanySearchRequest(BaseModel):
@@ -8,6 +8,25 @@ class CompanySearchRequest(BaseModel):
     department_name: Optional[str] = Field("", description="部署名")
     position_name: Optional[str] = Field("", description="役職名")
     job_scope: Optional[str] = Field("", description="業務範囲")
+    compact: bool = Field(False, description="本文を省略し、分析IDとセクション一覧のみを返す")
+    render_pdf: Optional[bool] = Field(None, description="分析完了後にレポートPDFをバックグラウンドで生成（未指定時は設定値）")
+    analysis_mode: Optional[Literal["full", "fast", "fast_split"]] = Field(
+        None, description="要約の方式（full: 段階的要約 / fast: 1回の呼び出し / fast_split: 2回の並列呼び出し。未指定時は設定値）"
+    )
+
+class PrefetchRequest(BaseModel):
+    """事前取得リクエスト（企業選択時点で送る）"""
+    company_name: str = Field(..., description="企業名")
+
+class PrefetchResponse(BaseModel):
+    """事前取得レスポンス"""
+    company_name: str = Field(..., description="企業名")
+    status: str = Field(..., description="started / in_progress / unknown_company / disabled")
+
+class ReportIngestRequest(BaseModel):
+    """報告書PDF一括取り込みリクエスト"""
+    directory: str = Field(..., description="PDFを格納したディレクトリ（REPORT_INGEST_ROOT_DIR 配下）", min_length=1)
+    manifest: Optional[str] = Field(None, description="code, company_name, file 列を持つCSV（省略時はファイル名から判定）")
 
 class SolutionMatchRequest(BaseModel):
     """ソリューションマッチングリクエスト"""
@@ -16,10 +35,19 @@ class SolutionMatchRequest(BaseModel):
 # レスポンスモデル
 class Solution(BaseModel):
     """ソリューション情報"""
+    model_config = ConfigDict(frozen=True)
+    
     name: str = Field(..., description="ソリューション名")
     features: str = Field(..., description="特徴")
     use_case: str = Field(..., description="用途")
 
+class AnalysisSectionInfo(BaseModel):
+    """保存済み分析のセクション情報"""
+    name: str = Field(..., description="セクション名")
+    title: str = Field(..., description="表示名")
+    chars: int = Field(0, description="文字数")
+    path: str = Field(..., description="取得用のパス")
+
 class CompanySearchResponse(BaseModel):
     """企業検索レスポンス"""
     success: bool = Field(..., description="成功フラグ")
@@ -27,13 +55,67 @@ class CompanySearchResponse(BaseModel):
     hypothesis: Optional[str] = Field("", description="仮説")
     hearing_items: Optional[str] = Field("", description="ヒアリング項目")
     matching_result: Optional[str] = Field("", description="マッチング結果")
+    structured_results: Dict[str, Dict[str, Any]] = Field({}, description="構造化出力（hypothesis / matching_result / hearing_items）")
+    reused_summary_steps: List[int] = Field([], description="チェックポイントから再利用した要約ステップ")
+    analysis_mode: Optional[str] = Field(None, description="実行した要約の方式")
+    analysis_id: Optional[str] = Field(None, description="保存した分析のID")
+    sections: List[AnalysisSectionInfo] = Field([], description="分析IDから個別に取得できるセクション")
+    report_pdf_path: Optional[str] = Field(None, description="レポートPDFの取得用パス")
     error_message: Optional[str] = Field("", description="エラーメッセージ")
 
+class SummaryStepResult(BaseModel):
+    """要約ステップの結果"""
+    step: int = Field(..., description="ステップ番号（1始まり）")
+    name: str = Field(..., description="ステップ名")
+    content: str = Field("", description="要約")
+
+class AnalysisRecord(BaseModel):
+    """保存する分析結果"""
+    analysis_id: str = Field(..., description="分析ID")
+    created_at: float = Field(..., description="作成日時（UNIX時間）")
+    company_data: Dict[str, str] = Field({}, description="企業名・部署名・役職・業務範囲")
+    pdf_url: Optional[str] = Field(None, description="分析した報告書")
+    summary: str = Field("", description="要約")
+    summary_steps: List[SummaryStepResult] = Field([], description="要約ステップごとの結果")
+    hypothesis: str = Field("", description="仮説")
+    matching_result: str = Field("", description="マッチング結果")
+    hearing_items: str = Field("", description="ヒアリング項目")
+    structured_results: Dict[str, Dict[str, Any]] = Field({}, description="構造化出力")
+
+class AnalysisResponse(BaseModel):
+    """保存済み分析の概要"""
+    analysis_id: str = Field(..., description="分析ID")
+    created_at: float = Field(..., description="作成日時（UNIX時間）")
+    company_data: Dict[str, str] = Field({}, description="企業名・部署名・役職・業務範囲")
+    sections: List[AnalysisSectionInfo] = Field([], description="取得できるセクション")
+
+class AnalysisSectionResponse(BaseModel):
+    """保存済み分析の1セクション"""
+    analysis_id: str = Field(..., description="分析ID")
+    section: str = Field(..., description="セクション名")
+    content: str = Field("", description="本文")
+    structured: Optional[Dict[str, Any]] = Field(None, description="構造化出力（ある場合）")
+
+class PDFGenerateRequest(BaseModel):
+    """PDF生成リクエスト（analysis_id 指定時は保存済みの分析を使い、指定した項目だけ上書きする）"""
+    analysis_id: Optional[str] = None
+    company_data: Dict[str, str] = {}
+    results: Dict[str, str] = {}
+    solutions: List[Dict[str, str]] = []
+    # 構造化出力（CompanySearchResponse.structured_results）。あるセクションはテキストより優先
+    structured_results: Dict[str, Dict[str, Any]] = {}
+
 class SolutionsResponse(BaseModel):
     """ソリューション一覧レスポンス"""
     success: bool = Field(..., description="成功フラグ")
     solutions: List[Solution] = Field([], description="ソリューション一覧")
 
+class ReportIngestJobResponse(BaseModel):
+    """報告書PDF一括取り込みジョブの状態"""
+    job_id: str = Field(..., description="ジョブID")
+    directory: str = Field(..., description="取り込み元ディレクトリ")
+    progress: Dict[str, Any] = Field({}, description="進捗とスループット")
+
 class HealthResponse(BaseModel):
     """ヘルスチェックレスポンス"""
     message: str = Field(..., description="メッセージ")
@@ -1,14 +1,25 @@
+import asyncio
 import logging
-from app.models.schemas import CompanySearchRequest, CompanySearchResponse
-from app.services.gemini_service import GeminiService
+from typing import Optional
+from app.config import settings
+from app.models.schemas import CompanySearchRequest, CompanySearchResponse, SummaryStepResult
+from app.services.gemini_service import GeminiService, SUMMARY_STEPS
+from app.services.gemini_scheduler import Priority, priority_scope
 from app.services.solution_service import SolutionService
 from app.utils.web_scraper import WebScraper
+from app.utils.company_registry import company_registry
+from app.utils.analysis_store import AnalysisStore
+from app.utils.single_flight import SingleFlight
+from app.utils.request_deadline import DeadlineExceeded, check_deadline
 from app.data.company_codes import company_codes
 from fastapi import HTTPException
 
 
 logger = logging.getLogger(__name__)
 
+# 実行中の報告書URL解決（企業コードごとに1件。待っている呼び出し元がいなくなれば結果を待たない）
+_pdf_url_flights: SingleFlight = SingleFlight(cancel_when_abandoned=True)
+
 class CompanyService:
     """企業分析サービス"""
     
@@ -16,10 +27,39 @@ class CompanyService:
         self.gemini_service = GeminiService()
         self.solution_service = SolutionService()
         self.web_scraper = WebScraper()
+        self.analysis_store = AnalysisStore()
     
     def get_company_code(self, company_name: str) -> str:
-        """企業名から企業コードを取得"""
-        return company_codes.get(company_name)
+        """企業名から企業コードを取得（一括取り込みで登録した企業も対象）"""
+        return company_codes.get(company_name) or company_registry.get_code(company_name)
+    
+    async def resolve_pdf_url(self, code: str) -> Optional[str]:
+        """企業コードから報告書を特定（取り込み済みならそれを使い、なければURLを解決）"""
+        report_url = company_registry.get_report_url(code)
+        if report_url:
+            return report_url
+        # 解決済みならキャッシュから即座に返る。未解決なら同じ企業コードの解決に相乗りする
+        return await _pdf_url_flights.run(
+            code, lambda: asyncio.to_thread(self.web_scraper.fetch_securities_report_pdf, code)
+        )
+    
+    async def prefetch(self, company_name: str) -> bool:
+        """企業名だけで決まる処理（報告書の特定・PDF取得・抽出・段階的要約）を事前に実行
+        
+        バックグラウンドレーンで実行し、結果はチェックポイントに残る。
+        実行中に同じ企業の検索が来た場合は、要約をやり直さずこの処理の完了を待つ。
+        """
+        code = self.get_company_code(company_name)
+        if not code:
+            return False
+        
+        with priority_scope(Priority.BACKGROUND):
+            pdf_url = await self.resolve_pdf_url(code)
+            if not pdf_url:
+                return False
+            await self.gemini_service.run_summary_chain(pdf_url, company_name, settings.SUMMARY_ANALYSIS_MODE)
+        logger.info(f"事前取得完了: {company_name}")
+        return True
     
     async def analyze_company(self, request: CompanySearchRequest) -> CompanySearchResponse:
         """企業分析を実行"""
@@ -36,8 +76,9 @@ class CompanyService:
                     error_message="指定された企業名が辞書に存在しません。先に企業コードを登録してください。"
                 )
             
-            # 有価証券報告書PDFを取得
-            pdf_url = self.web_scraper.fetch_securities_report_pdf(code)
+            # 取り込み済みの報告書があれば使用し、なければPDFのURLを取得（解決済みならキャッシュから即座に返る）
+            check_deadline("pdf_url")
+            pdf_url = await self.resolve_pdf_url(code)
             logger.info(f"PDF URL: {pdf_url}")
             
             if not pdf_url:
@@ -49,11 +90,16 @@ class CompanyService:
             # -----------------------
             # 要約取得（try-catch）
             # -----------------------
+            check_deadline("summary")
             try:
-                summary = await self.gemini_service.summarize_securities_report(
-                    pdf_url, request.company_name
+                summary_result = await self.gemini_service.run_summary_chain(
+                    pdf_url, request.company_name, request.analysis_mode or settings.SUMMARY_ANALYSIS_MODE
                 )
-                logger.info("要約取得成功")
+                summary = summary_result.text
+                logger.info(f"要約取得成功（再利用ステップ: {summary_result.reused_steps}）")
+            except DeadlineExceeded:
+                # 期限切れは失敗応答にせず、呼び出し元（504応答）へ伝える
+                raise
             except Exception as e:
                 logger.error(f"要約取得失敗: {str(e)}")
                 return CompanySearchResponse(
@@ -64,18 +110,25 @@ class CompanyService:
             hypothesis = ""
             hearing_items = ""
             matching_result = ""
+            structured_results = {}
             
             # 部署名と役職が入力されている場合、仮説とヒアリング項目を生成
             if request.department_name and request.position_name:
                 # -----------------------
                 # 仮説生成
                 # -----------------------
+                check_deadline("hypothesis")
                 try:
-                    hypothesis = await self.gemini_service.generate_hypothesis(
+                    hypothesis_output = await self.gemini_service.generate_hypothesis(
                         summary, request.department_name,
                         request.position_name, request.job_scope
                     )
+                    hypothesis = hypothesis_output.text
+                    if hypothesis_output.data is not None:
+                        structured_results["hypothesis"] = hypothesis_output.data
                     logger.info("仮説取得成功")
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
                     logger.error(f"仮説生成失敗: {str(e)}")
                     return CompanySearchResponse(
@@ -86,13 +139,23 @@ class CompanyService:
                 # -----------------------
                 # ソリューションマッチング
                 # -----------------------
+                check_deadline("matching")
                 try:
                     if hypothesis:
-                        solutions = self.solution_service.get_solutions()
-                        matching_result = await self.gemini_service.match_solutions(
-                            hypothesis, solutions
+                        # 後段には仮説のうち必要な項目のみを渡す（構造化出力時）
+                        matching_input = hypothesis_output.for_stage("matching")
+                        
+                        # 類似度で候補を絞り込み、上位のみをGeminiに渡す
+                        solutions, solutions_text = self.solution_service.shortlist_with_text(matching_input)
+                        matching_output = await self.gemini_service.match_solutions(
+                            matching_input, solutions, solutions_text
                         )
+                        matching_result = matching_output.text
+                        if matching_output.data is not None:
+                            structured_results["matching_result"] = matching_output.data
                         logger.info("マッチング取得成功")
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
                     logger.error(f"マッチング失敗: {str(e)}")
                     return CompanySearchResponse(
@@ -103,14 +166,20 @@ class CompanyService:
                 # -----------------------
                 # ヒアリング項目生成
                 # -----------------------
+                check_deadline("hearing")
                 try:
-                    hearing_items = await self.gemini_service.generate_hearing_items(
+                    hearing_output = await self.gemini_service.generate_hearing_items(
                         request.company_name,
                         request.department_name,
                         request.position_name,
-                        hypothesis
+                        hypothesis_output.for_stage("hearing")
                     )
+                    hearing_items = hearing_output.text
+                    if hearing_output.data is not None:
+                        structured_results["hearing_items"] = hearing_output.data
                     logger.info("ヒアリング項目取得成功")
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
                     logger.error(f"ヒアリング項目生成失敗: {str(e)}")
                     return CompanySearchResponse(
@@ -118,14 +187,56 @@ class CompanyService:
                         error_message=f"ヒアリング項目生成に失敗しました: {str(e)}"
                     )
             
+            # 分析結果を保存（セクションごとの取得・分析IDを指定したPDF生成に使用）
+            check_deadline("save")
+            record = await asyncio.to_thread(
+                self.analysis_store.save,
+                company_data={
+                    "company_name": request.company_name,
+                    "department_name": request.department_name or "",
+                    "position_name": request.position_name or "",
+                    "job_scope": request.job_scope or "",
+                },
+                pdf_url=pdf_url,
+                summary=summary,
+                summary_steps=[
+                    SummaryStepResult(step=i, name=step_name, content=summary_result.step_results.get(i, ""))
+                    for i, (_, step_name) in enumerate(SUMMARY_STEPS, 1)
+                ],
+                hypothesis=hypothesis,
+                matching_result=matching_result,
+                hearing_items=hearing_items,
+                structured_results=structured_results
+            )
+            logger.info(f"分析結果を保存: {record.analysis_id}")
+            
+            if request.compact:
+                # 本文は返さず、必要なセクションを分析IDで個別に取得させる
+                return CompanySearchResponse(
+                    success=True,
+                    reused_summary_steps=summary_result.reused_steps,
+                    analysis_mode=summary_result.mode,
+                    analysis_id=record.analysis_id,
+                    sections=self.analysis_store.section_index(record),
+                    report_pdf_path=f"/analyses/{record.analysis_id}/pdf"
+                )
+            
             return CompanySearchResponse(
                 success=True,
                 summary=summary,
                 hypothesis=hypothesis,
                 hearing_items=hearing_items,
-                matching_result=matching_result
+                matching_result=matching_result,
+                structured_results=structured_results,
+                reused_summary_steps=summary_result.reused_steps,
+                analysis_mode=summary_result.mode,
+                analysis_id=record.analysis_id,
+                sections=self.analysis_store.section_index(record),
+                report_pdf_path=f"/analyses/{record.analysis_id}/pdf"
             )
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"企業分析エラー（未処理例外）: {str(e)}")
             raise HTTPException(status_code=500, detail=f"企業分析中に予期せぬエラーが発生しました: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""ローカル検証用のGeminiモデル代替
+
+``GEMINI_USE_FAKE_MODEL=true`` またはGeminiServiceへの注入で使用する。
+google.generativeai の GenerativeModel / ChatSession と同じ呼び出し方
+（generate_content / start_chat / send_message）に対応し、送信された文字数と
+応答時間を記録する。
+"""
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+HEADING_PATTERN = re.compile(r"^#{2,3} .+$")
+
+
+@dataclass
+class FakeCall:
+    """1回の呼び出しの記録"""
+    kind: str
+    input_chars: int
+    cached_chars: int
+    elapsed: float
+
+
+class FakeResponse:
+    """generate_content / send_message の応答"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _content_text(content: Any) -> str:
+    """文字列または {"role", "parts"} 形式の内容からテキストを取り出す"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        return "".join(str(part) for part in content.get("parts", []))
+    return str(content)
+
+
+class FakeGenerativeModel:
+    """入力長に比例した遅延で決まった形式の応答を返すモデル
+
+    応答はプロンプト末尾の【出力形式】に含まれる見出しをそのまま並べたもの
+    （generation_config に response_schema があればスキーマどおりのJSON）。
+    キャッシュ済みのコンテキスト（明示的なキャッシュ、または会話で再送された履歴の
+    暗黙的キャッシュ）は入力文字数に含めず、通常より低い単価で遅延に加算する。
+    """
+
+    def __init__(
+        self,
+        model_name: str = "fake-gemini",
+        base_latency: float = 0.0,
+        latency_per_1k_chars: float = 0.0,
+        cached_latency_ratio: float = 0.1,
+        calls: Optional[List[FakeCall]] = None,
+        cached_context: str = ""
+    ):
+        self.model_name = model_name
+        self.base_latency = base_latency
+        self.latency_per_1k_chars = latency_per_1k_chars
+        self.cached_latency_ratio = cached_latency_ratio
+        self.calls = [] if calls is None else calls
+        self.cached_context = cached_context
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents: Any, generation_config: Optional[Dict[str, Any]] = None) -> FakeResponse:
+        """単発の生成"""
+        return self._respond("generate_content", _content_text(contents), generation_config=generation_config)
+
+    def start_chat(self, history: Optional[List[Dict[str, Any]]] = None) -> "FakeChatSession":
+        """会話セッションを開始"""
+        return FakeChatSession(self, history)
+
+    def with_cached_context(self, context: str) -> "FakeGenerativeModel":
+        """コンテキストをキャッシュ済みとして扱うモデルを返す（呼び出し記録は共有）"""
+        return FakeGenerativeModel(
+            model_name=self.model_name,
+            base_latency=self.base_latency,
+            latency_per_1k_chars=self.latency_per_1k_chars,
+            cached_latency_ratio=self.cached_latency_ratio,
+            calls=self.calls,
+            cached_context=context
+        )
+
+    def _respond(
+        self,
+        kind: str,
+        prompt: str,
+        cached_prefix_chars: int = 0,
+        generation_config: Optional[Dict[str, Any]] = None
+    ) -> FakeResponse:
+        cached_chars = len(self.cached_context) + cached_prefix_chars
+        new_chars = len(prompt) - cached_prefix_chars
+        delay = self.base_latency + self.latency_per_1k_chars * (
+            new_chars + cached_chars * self.cached_latency_ratio
+        ) / 1000
+        started = time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            self.calls.append(FakeCall(kind, new_chars, cached_chars, time.perf_counter() - started))
+
+        response_schema = (generation_config or {}).get("response_schema")
+        if response_schema is not None:
+            return FakeResponse(json.dumps(self._sample(response_schema), ensure_ascii=False))
+
+        # 最後の【出力形式】直後に並ぶ見出しを応答とする
+        headings = []
+        for line in prompt.rsplit("【出力形式】", 1)[-1].strip().splitlines():
+            if HEADING_PATTERN.match(line.strip()):
+                headings.append(line.strip())
+            elif line.strip() or headings:
+                break
+        headings = headings or ["## 回答"]
+        return FakeResponse("\n".join(f"{heading}\n- （{self.model_name}の応答）" for heading in headings))
+
+    def _sample(self, schema: Dict[str, Any]) -> Any:
+        """スキーマに沿った応答値を生成"""
+        if schema.get("type") == "object":
+            return {name: self._sample(child) for name, child in schema.get("properties", {}).items()}
+        if schema.get("type") == "array":
+            return [self._sample(schema["items"]) for _ in range(2)]
+        if schema.get("enum"):
+            return schema["enum"][0]
+        return f"{schema.get('description', '')}（{self.model_name}の応答）"
+
+    @property
+    def total_input_chars(self) -> int:
+        """これまでに送信された入力文字数の合計（キャッシュ分を除く）"""
+        return sum(call.input_chars for call in self.calls)
+
+
+class FakeChatSession:
+    """会話履歴を保持するセッション
+
+    実際のAPIと同様に毎回履歴全体を送信し、このセッションで前回送信した部分
+    （今回の先頭と一致する）は暗黙的キャッシュに載ったものとして扱う。
+    """
+
+    def __init__(self, model: FakeGenerativeModel, history: Optional[List[Dict[str, Any]]] = None):
+        self.model = model
+        self.history: List[Dict[str, Any]] = list(history or [])
+        self._last_sent_chars = 0
+
+    def send_message(self, content: Any, generation_config: Optional[Dict[str, Any]] = None) -> FakeResponse:
+        message = _content_text(content)
+        sent = "".join(_content_text(turn) for turn in self.history) + message
+        response = self.model._respond("send_message", sent, self._last_sent_chars, generation_config)
+        self._last_sent_chars = len(sent)
+        self.history.append({"role": "user", "parts": [message]})
+        self.history.append({"role": "model", "parts": [response.text]})
+        return response
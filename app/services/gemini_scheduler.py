@@ -0,0 +1,297 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+from app.config import settings
+from app.utils.request_deadline import check_deadline
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """Gemini呼び出しの優先レーン（値が小さいほど優先）"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    BATCH = 2
+
+
+# 現在の処理の優先レーン（バックグラウンド処理などで切り替える）
+current_priority: ContextVar[Priority] = ContextVar("gemini_priority", default=Priority.INTERACTIVE)
+
+
+class SharedPriority:
+    """複数の呼び出し元が相乗りする処理の優先レーン（処理中に引き上げられる）
+
+    相乗りした処理から入れ子で相乗りした処理は、外側の引き上げも反映する。
+    """
+
+    def __init__(self, priority: Priority, parent: Optional["SharedPriority"] = None):
+        self._priority = priority
+        self._parent = parent
+
+    @property
+    def priority(self) -> Priority:
+        if self._parent is not None:
+            return min(self._priority, self._parent.priority)
+        return self._priority
+
+    def raise_to(self, priority: Priority) -> None:
+        """待っている呼び出し元のレーンがより優先なら、処理全体をそのレーンに引き上げる"""
+        if priority < self._priority:
+            self._priority = priority
+            if _scheduler is not None:
+                _scheduler.reprioritize()
+
+
+# 相乗りされている処理の優先レーン（設定時は current_priority より優先して使う）
+shared_priority: ContextVar[Optional[SharedPriority]] = ContextVar("gemini_shared_priority", default=None)
+
+
+def effective_priority() -> Priority:
+    """このコンテキストのGemini呼び出しが使うレーン"""
+    shared = shared_priority.get()
+    return shared.priority if shared is not None else current_priority.get()
+
+
+@contextmanager
+def priority_scope(priority: Priority):
+    """このブロック内のGemini呼び出しを指定レーンで実行する"""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+# 優先度の低いレーンが使える同時実行数・クォータの割合（対話処理のための余力を残す）
+LANE_SHARE = {
+    Priority.INTERACTIVE: 1.0,
+    Priority.BACKGROUND: 0.75,
+    Priority.BATCH: 0.5,
+}
+
+
+def estimate_tokens(prompt: str, max_output_tokens: Optional[int] = None) -> int:
+    """プロンプト長から入出力の合計トークン数を見積もる（出力上限があればそれを出力分とする）"""
+    output_tokens = max_output_tokens or settings.GEMINI_EXPECTED_OUTPUT_TOKENS
+    return int(len(prompt) / settings.GEMINI_CHARS_PER_TOKEN) + output_tokens
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """429（クォータ超過）エラーか判定"""
+    if getattr(error, "code", None) == 429 or type(error).__name__ == "ResourceExhausted":
+        return True
+    return "429" in str(error)
+
+
+class GeminiScheduler:
+    """すべてのGemini呼び出しを集約するスケジューラ
+
+    - 優先レーン（対話・バックグラウンド・バッチ）順に実行枠を割り当てる
+    - 直近60秒のリクエスト数（RPM）と見積もりトークン数（TPM）をクォータと照合する
+    - 429を受けたら同時実行数を半減し、成功が続けば1ずつ戻す（AIMD）
+    """
+
+    WINDOW_SECONDS = 60.0
+
+    def __init__(
+        self,
+        rpm_limit: int,
+        tpm_limit: int,
+        max_concurrency: int,
+        min_concurrency: int = 1
+    ):
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = max_concurrency
+
+        self._in_flight = 0
+        self._successes = 0
+        self._backoff_until = 0.0
+        self._window: Deque[Tuple[float, int]] = deque()
+        self._window_tokens = 0
+        self._waiters: List[Tuple[int, int, int, asyncio.Future, Optional[SharedPriority]]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.rate_limited_count = 0
+        self.completed_count = 0
+        self.cancelled_queued_count = 0
+        self.cancelled_in_flight_count = 0
+
+    async def submit(
+        self,
+        call: Callable[[], T],
+        estimated_tokens: int,
+        priority: Optional[Priority] = None
+    ) -> T:
+        """実行枠を確保してから同期呼び出しをスレッドで実行する（期限切れなら開始しない）"""
+        shared = shared_priority.get() if priority is None else None
+        priority = effective_priority() if priority is None else priority
+        check_deadline("gemini")
+        await self._acquire(priority, estimated_tokens, shared)
+        call_future = asyncio.ensure_future(asyncio.to_thread(call))
+        try:
+            result = await asyncio.shield(call_future)
+        except asyncio.CancelledError:
+            # 実行中のAPI呼び出しは中断できないため、完了するまで実行枠を保持する
+            self.cancelled_in_flight_count += 1
+            call_future.add_done_callback(self._release_abandoned)
+            raise
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self._on_rate_limited()
+            self._release()
+            raise
+        else:
+            self._on_success()
+            self._release()
+            return result
+
+    async def _acquire(
+        self,
+        priority: Priority,
+        estimated_tokens: int,
+        shared: Optional[SharedPriority] = None
+    ) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), estimated_tokens, future, shared))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 枠の割り当て後に取り消された場合は枠を返却する
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                self.cancelled_queued_count += 1
+            raise
+    
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    def reprioritize(self) -> None:
+        """相乗りした処理のレーンが引き上げられたら、待機中の呼び出しの順序を組み直す"""
+        self._waiters = [
+            (min(priority, int(shared.priority)) if shared is not None else priority, sequence, tokens, future, shared)
+            for priority, sequence, tokens, future, shared in self._waiters
+        ]
+        heapq.heapify(self._waiters)
+        self._dispatch()
+    
+    def _release_abandoned(self, call_future: asyncio.Future) -> None:
+        """呼び出し元が取り消された呼び出しの完了時に実行枠を返却（結果は破棄）"""
+        if not call_future.cancelled() and call_future.exception() is not None:
+            logger.info(f"取り消し済みのGemini呼び出しが失敗: {call_future.exception()}")
+        self._release()
+
+    def _prune_window(self, now: float) -> None:
+        while self._window and now - self._window[0][0] >= self.WINDOW_SECONDS:
+            _, tokens = self._window.popleft()
+            self._window_tokens -= tokens
+
+    def _wait_seconds(self, priority: Priority, estimated_tokens: int, now: float) -> float:
+        """このレーンの呼び出しを開始できるまでの待ち時間（0なら即時実行可）"""
+        if now < self._backoff_until:
+            return self._backoff_until - now
+
+        share = LANE_SHARE[priority]
+        if self._in_flight >= max(1, int(self.concurrency_limit * share)):
+            # 実行中の呼び出しが終われば再評価される
+            return float("inf")
+
+        over_rpm = len(self._window) + 1 > self.rpm_limit * share
+        # 窓が空なら、見積もりがクォータを超える単発の呼び出しも通す
+        over_tpm = self._window and self._window_tokens + estimated_tokens > self.tpm_limit * share
+        if over_rpm or over_tpm:
+            return max(0.0, self._window[0][0] + self.WINDOW_SECONDS - now)
+        return 0.0
+
+    def _dispatch(self) -> None:
+        """待機中の呼び出しへ優先順に実行枠を割り当てる"""
+        now = time.monotonic()
+        self._prune_window(now)
+
+        while self._waiters:
+            priority, _, estimated_tokens, future, _ = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = self._wait_seconds(Priority(priority), estimated_tokens, now)
+            if wait > 0:
+                if wait != float("inf"):
+                    self._schedule_wakeup(wait)
+                return
+
+            heapq.heappop(self._waiters)
+            self._in_flight += 1
+            self._window.append((now, estimated_tokens))
+            self._window_tokens += estimated_tokens
+            future.set_result(None)
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _on_rate_limited(self) -> None:
+        self.rate_limited_count += 1
+        self._successes = 0
+        self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit // 2)
+        self._backoff_until = time.monotonic() + settings.GEMINI_RATE_LIMIT_COOLDOWN_SECONDS
+        logger.warning(f"Gemini 429を検知: 同時実行数を{self.concurrency_limit}に縮小")
+
+    def _on_success(self) -> None:
+        self.completed_count += 1
+        self._successes += 1
+        if self._successes >= self.concurrency_limit and self.concurrency_limit < self.max_concurrency:
+            self.concurrency_limit += 1
+            self._successes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """現在の利用状況を返す"""
+        self._prune_window(time.monotonic())
+        queued = {lane.name.lower(): 0 for lane in Priority}
+        for priority, _, _, future, _ in self._waiters:
+            if not future.done():
+                queued[Priority(priority).name.lower()] += 1
+        return {
+            "in_flight": self._in_flight,
+            "concurrency_limit": self.concurrency_limit,
+            "queued": queued,
+            "requests_last_minute": len(self._window),
+            "rpm_limit": self.rpm_limit,
+            "estimated_tokens_last_minute": self._window_tokens,
+            "tpm_limit": self.tpm_limit,
+            "rate_limited_count": self.rate_limited_count,
+            "completed_count": self.completed_count,
+            "cancelled_queued_count": self.cancelled_queued_count,
+            "cancelled_in_flight_count": self.cancelled_in_flight_count,
+        }
+
+
+_scheduler: Optional[GeminiScheduler] = None
+
+
+def get_gemini_scheduler() -> GeminiScheduler:
+    """プロセス共通のスケジューラを取得"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = GeminiScheduler(
+            rpm_limit=settings.GEMINI_RPM_LIMIT,
+            tpm_limit=settings.GEMINI_TPM_LIMIT,
+            max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+            min_concurrency=settings.GEMINI_MIN_CONCURRENCY
+        )
+    return _scheduler
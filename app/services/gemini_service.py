@@ -1,30 +1,115 @@
 import os
-import yaml
-import fitz  # PyMuPDF
-import requests
-from typing import List, Dict, Any
-from google.generativeai import GenerativeModel
-import google.generativeai as genai
+import re
+import asyncio
+import hashlib
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import TYPE_CHECKING, Callable, List, Dict, Any, Optional, Tuple
 from app.config import settings
 from app.models.schemas import Solution
+from app.services.solution_service import format_solution
+from app.services.gemini_scheduler import estimate_tokens, get_gemini_scheduler
+from app.utils.pdf_downloader import PDFDownloader
+from app.utils.pdf_text_extractor import PDFTextExtractor
+from app.utils.report_text_store import ReportTextStore
+from app.utils.single_flight import SingleFlight
+from app.utils.text_normalizer import normalize_pages
+from app.utils.memory_budget import estimate_extraction_bytes, estimate_text_bytes, get_memory_budget
+from app.utils.step_checkpoint import StepCheckpointStore
+from app.utils.traffic_recorder import RecordingModel, wrap_model
+from app.utils.request_deadline import DeadlineExceeded, check_deadline
+
+if TYPE_CHECKING:
+    from app.utils.passage_retriever import PassageRetriever
+
+# 段階的要約のYAML設定ファイル名とステップ名のリスト（順序重要）
+SUMMARY_STEPS = [
+    ("company_analysis_prompts/company_analysis_step1.yml", "step1"),
+    ("company_analysis_prompts/company_analysis_step2.yml", "step2"),
+    ("company_analysis_prompts/company_analysis_step3.yml", "step3"),
+    ("company_analysis_prompts/company_analysis_step4.yml", "step4"),
+    ("company_analysis_prompts/company_analysis_step5.yml", "step5"),
+    ("company_analysis_prompts/company_analysis_step6.yml", "step6")
+]
+
+# 要約の実行方式と、1回の呼び出しにまとめるステップ番号
+# full: ステップごとに順に実行 / fast: 全ステップを1回で / fast_split: 前半・後半の2回を並列実行
+SUMMARY_ANALYSIS_MODES: Dict[str, List[List[int]]] = {
+    "full": [[1], [2], [3], [4], [5], [6]],
+    "fast": [[1, 2, 3, 4, 5, 6]],
+    "fast_split": [[1, 2, 3], [4, 5, 6]],
+}
+FAST_SUMMARY_PROMPT = "company_analysis_prompts/company_analysis_fast.yml"
+# 高速要約の応答をステップごとに分割する見出し（## Step 1: ...）
+STEP_HEADING_PATTERN = re.compile(r"^##\s*Step\s*(\d+)", re.MULTILINE)
+
+@dataclass
+class SummaryResult:
+    """段階的要約の結果"""
+    text: str
+    step_results: Dict[int, str] = field(default_factory=dict)
+    reused_steps: List[int] = field(default_factory=list)
+    step_latencies: Dict[int, float] = field(default_factory=dict)
+    step_input_chars: Dict[int, int] = field(default_factory=dict)
+    mode: str = "full"
+
+@dataclass
+class StageOutput:
+    """仮説・マッチング・ヒアリング各段の出力"""
+    text: str
+    data: Optional[Dict[str, Any]] = None
+    downstream: Dict[str, str] = field(default_factory=dict)
+    
+    def for_stage(self, consumer: str) -> str:
+        """後段に渡すテキスト（構造化出力時は必要な項目のみ）"""
+        return self.downstream.get(consumer, self.text)
+
+# 実行中の段階的要約（事前取得と実際の検索で同じ報告書の要約を二重に実行しない）
+# 待っている検索が全て取り消されたら残りの要約ステップは実行しない
+_summary_flights: SingleFlight[SummaryResult] = SingleFlight(cancel_when_abandoned=True)
 
 class GeminiService:
     """Gemini API サービス"""
     
-    def __init__(self):
+    def __init__(self, model: Optional[Any] = None):
         print(f"=== GeminiService初期化開始 ===")
         print(f"GOOGLE_API_KEY存在: {bool(settings.GOOGLE_API_KEY)}")
         print(f"GEMINI_MODEL_NAME: {settings.GEMINI_MODEL_NAME}")
         
-        if not settings.GOOGLE_API_KEY:
+        if model is None and settings.GEMINI_USE_FAKE_MODEL:
+            from app.services.fake_gemini_model import FakeGenerativeModel
+            
+            model = FakeGenerativeModel(model_name=settings.GEMINI_MODEL_NAME)
+            print("ローカル検証用モデルを使用")
+        
+        if model is None and settings.TRAFFIC_REPLAY_CASSETTES:
+            # カセットに記録した応答を返すため、Gemini APIには接続しない
+            model = RecordingModel()
+            print("カセットに記録したGeminiの応答を再生")
+        
+        if model is None and not settings.GOOGLE_API_KEY:
             raise ValueError("GOOGLE_API_KEY が設定されていません")
         
         try:
-            genai.configure(api_key=settings.GOOGLE_API_KEY)
-            print("genai.configure 成功")
+            if model is None:
+                # google.generativeai は読み込みが重いため初回利用時にインポートする
+                import google.generativeai as genai
+                from google.generativeai import GenerativeModel
+                
+                genai.configure(api_key=settings.GOOGLE_API_KEY)
+                print("genai.configure 成功")
+                
+                model = GenerativeModel(model_name=settings.GEMINI_MODEL_NAME)
+                print("GenerativeModel 作成成功")
             
-            self.model = GenerativeModel(model_name=settings.GEMINI_MODEL_NAME)
-            print("GenerativeModel 作成成功")
+            self.model = wrap_model(model)
+            
+            self.pdf_downloader = PDFDownloader()
+            self.text_extractor = PDFTextExtractor()
+            self.text_store = ReportTextStore()
+            self.checkpoints = StepCheckpointStore()
             
         except Exception as e:
             print(f"GeminiService初期化エラー: {e}")
@@ -33,8 +118,82 @@ class GeminiService:
         
         print("=== GeminiService初期化完了 ===")
     
+    async def _generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> Any:
+        """スケジューラ経由でGeminiを呼び出す（優先レーン・クォータ・429時の縮退を適用）"""
+        return await get_gemini_scheduler().submit(
+            lambda: self.model.generate_content(prompt, generation_config=generation_config),
+            estimate_tokens(prompt, self._answer_tokens(generation_config))
+        )
+
+    @staticmethod
+    def _answer_tokens(generation_config: Optional[Dict[str, Any]]) -> Optional[int]:
+        """クォータ見積もり用の出力トークン数（思考トークンの上乗せ分は含めない）"""
+        max_output_tokens = (generation_config or {}).get("max_output_tokens")
+        if not max_output_tokens:
+            return None
+        return max(max_output_tokens - settings.GEMINI_THINKING_TOKEN_ALLOWANCE, 1)
+    
+    def _generation_config(
+        self,
+        max_output_tokens: Optional[int],
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """生成設定（出力上限は常に指定し、JSONスキーマは構造化出力が有効な場合のみ）
+
+        出力上限には思考トークンの分（GEMINI_THINKING_TOKEN_ALLOWANCE）を加える。
+        """
+        config = {}
+        if max_output_tokens:
+            config["max_output_tokens"] = max_output_tokens + settings.GEMINI_THINKING_TOKEN_ALLOWANCE
+        if (
+            response_schema is not None
+            and settings.STRUCTURED_OUTPUT_ENABLED
+            and settings.GEMINI_RESPONSE_SCHEMA_ENABLED
+        ):
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = response_schema
+        return config or None
+    
+    async def _run_stage(self, stage: str, prompt: str, label: str) -> StageOutput:
+        """構造化出力が有効ならJSONで出力させて整形し、無効ならそのまま生成する"""
+        from app.services.structured_output import get_stage_schema
+        
+        # 出力上限はYAMLの定義から常に適用し、JSONでの出力は構造化出力が有効な場合のみ
+        stage_schema = get_stage_schema(stage)
+        schema = stage_schema if settings.STRUCTURED_OUTPUT_ENABLED else None
+        if schema is not None:
+            prompt = schema.build_prompt(prompt)
+        generation_config = self._generation_config(
+            stage_schema.max_output_tokens if stage_schema is not None else None,
+            schema.response_schema() if schema is not None else None
+        )
+        
+        print(f"[{label}] プロンプト文字数: {len(prompt)} 文字")
+        print(f"Gemini API呼び出し開始（{label}）...")
+        response = await self._generate(prompt, generation_config)
+        
+        if not response.text:
+            raise Exception(f"{label}でレスポンスが空でした")
+        print(f"[{label}] Gemini応答文字数: {len(response.text)} 文字")
+        
+        if schema is None:
+            return StageOutput(text=response.text)
+        
+        data = schema.parse(response.text)
+        if data is None:
+            # JSONとして解釈できない場合は従来どおりテキストのまま扱う
+            print(f"[{label}] 構造化出力の解析に失敗したためテキストとして扱います")
+            return StageOutput(text=response.text)
+        
+        downstream = {}
+        for consumer in schema.downstream:
+            downstream[consumer] = schema.downstream_text(data, consumer)
+        return StageOutput(text=schema.to_markdown(data), data=data, downstream=downstream)
+    
     def _load_yaml_prompt(self, filename: str) -> Dict[str, Any]:
         """YAMLプロンプトファイルを読み込み"""
+        import yaml
+        
         filepath = os.path.join(settings.PROMPTS_DIR, filename)
         with open(filepath, "r", encoding="utf-8") as f:
             return yaml.safe_load(f)
@@ -79,49 +238,441 @@ class GeminiService:
         
         return "\n\n".join(prompt_parts)
    
+    def _retrieve_report_text(self, retriever: Optional["PassageRetriever"], yaml_data: Dict[str, Any]) -> Optional[str]:
+        """ステップYAMLの問い合わせ語で関連パッセージを検索（設定がなければNone）"""
+        retrieval = yaml_data.get("retrieval")
+        if retriever is None or not retrieval or not retrieval.get("query"):
+            return None
+        
+        report_text = retriever.retrieve(
+            retrieval["query"],
+            top_k=retrieval.get("top_k", settings.REPORT_RETRIEVAL_TOP_K),
+            max_chars=settings.MAX_PDF_CHARS
+        )
+        return report_text or None
+    
+    async def _load_report_pages(self, pdf_url: str) -> List[str]:
+        """報告書のページ単位テキストを取得し、プロンプト用に正規化"""
+        pages = await self._load_raw_report_pages(pdf_url)
+        if not settings.TEXT_NORMALIZATION_ENABLED:
+            return pages
+        
+        normalization = await asyncio.to_thread(
+            normalize_pages, pages, settings.TEXT_NORMALIZATION_COMPACT_TABLES
+        )
+        print(f"テキスト正規化: {normalization.summary_line()}")
+        return normalization.pages
+    
+    async def _load_raw_report_pages(self, pdf_url: str) -> List[str]:
+        """報告書のページ単位テキストを取得（未保存ならダウンロード・抽出して保存）"""
+        report_key = ReportTextStore.make_key(pdf_url)
+        pages = await asyncio.to_thread(self.text_store.read_pages, report_key)
+        if pages is not None:
+            print(f"保存済みテキストを使用: {report_key}")
+            return pages
+        
+        # 1. PDFをディスクへストリーミング保存（メモリに全体を保持しない）
+        memory_budget = get_memory_budget()
+        with self.pdf_downloader.lease(pdf_url):
+            check_deadline("download")
+            print("PDFダウンロード開始...")
+            async with memory_budget.reserve(settings.MEMORY_ESTIMATE_DOWNLOAD_BYTES, "download"):
+                pdf_path = await asyncio.to_thread(self.pdf_downloader.download, pdf_url)
+            pdf_size = os.path.getsize(pdf_path)
+            print(f"PDFダウンロード成功: {pdf_size} bytes ({pdf_path})")
+            
+            # 2-3. プロセスプールでページ並列にテキスト抽出（ワーカーはパスから開くため、完了まで整理で削除させない）
+            check_deadline("extract")
+            print("テキスト抽出開始...")
+            async with memory_budget.reserve(estimate_extraction_bytes(pdf_size), "extract"):
+                extraction = await self.text_extractor.extract(pdf_path)
+            print(f"テキスト抽出成功: {len(extraction.pages)} pages, {extraction.elapsed:.2f}秒")
+            print(f"抽出時間の長いページ: {extraction.slowest_pages()}")
+        
+        await asyncio.to_thread(self.text_store.put, report_key, extraction.pages, pdf_url)
+        return extraction.pages
+   
+    def _summary_checkpoint_keys(
+        self,
+        pdf_url: str,
+        company_name: str,
+        yaml_steps: List[Tuple[str, str]]
+    ) -> List[str]:
+        """各ステップのチェックポイントキーを生成（前段までのプロンプト版数を累積して含める）"""
+        keys = []
+        version = "\n".join([
+            settings.GEMINI_MODEL_NAME,
+            str(settings.MAX_PDF_CHARS),
+            settings.SUMMARY_CHAIN_MODE,
+            f"normalize={settings.TEXT_NORMALIZATION_ENABLED},{settings.TEXT_NORMALIZATION_COMPACT_TABLES}",
+        ])
+        for yaml_file, step_name in yaml_steps:
+            with open(os.path.join(settings.PROMPTS_DIR, yaml_file), "rb") as f:
+                version = hashlib.sha256(version.encode("utf-8") + f.read()).hexdigest()
+            keys.append(StepCheckpointStore.make_key(pdf_url, company_name, step_name, version))
+        return keys
+   
+    def _build_session_context(
+        self,
+        company_name: str,
+        yaml_list: List[Dict[str, Any]],
+        retriever: Optional["PassageRetriever"],
+        full_text: str
+    ) -> str:
+        """会話の最初に一度だけ送る報告書コンテキストを構築（全ステップの関連パッセージの和集合）"""
+        queries = [
+            (data["retrieval"]["query"], data["retrieval"].get("top_k", settings.REPORT_RETRIEVAL_TOP_K))
+            for data in yaml_list
+            if data.get("retrieval") and data["retrieval"].get("query")
+        ]
+        report_text = ""
+        if retriever is not None and queries:
+            report_text = retriever.retrieve_union(queries, max_chars=settings.SUMMARY_SESSION_CONTEXT_CHARS)
+        if not report_text:
+            report_text = full_text[:settings.SUMMARY_SESSION_CONTEXT_CHARS]
+        
+        intro = yaml_list[0].get("common", {}).get("intro", "").replace("{company_name}", company_name)
+        return intro + "\n\n## 分析対象の有価証券報告書\n" + report_text
+    
+    def _build_session_turn(
+        self,
+        yaml_data: Dict[str, Any],
+        step_name: str,
+        company_name: str,
+        sent_common: Dict[str, str]
+    ) -> str:
+        """ステップの指示を追加ターン用に構築（送信済みと同じ共通部分は省略）"""
+        common = yaml_data.get("common", {})
+        changed = {key: value for key, value in common.items() if sent_common.get(key) != value}
+        sent_common.update(common)
+        return self._build_prompt_from_yaml(
+            {"common": changed, step_name: yaml_data.get(step_name, "")},
+            step_name,
+            company_name=company_name
+        )
+    
+    def _create_context_cache(self, context: str) -> Optional[Tuple[Any, Optional[Callable[[], Any]]]]:
+        """報告書コンテキストをキャッシュに登録し、(キャッシュを参照するモデル, 削除処理) を返す
+        
+        SDKやモデルが対応していない場合はNoneを返す（呼び出し側はsession方式で実行する）。
+        """
+        if getattr(self.model, "bypass_context_cache", False):
+            print("トラフィック記録・再生中のため session 方式で実行")
+            return None
+        
+        with_cached_context = getattr(self.model, "with_cached_context", None)
+        if with_cached_context is not None:
+            return with_cached_context(context), None
+        
+        try:
+            from google.generativeai import GenerativeModel, caching
+        except ImportError:
+            print("コンテキストキャッシュ非対応のSDKのため session 方式で実行")
+            return None
+        
+        try:
+            cache = caching.CachedContent.create(
+                model=self.model.model_name,
+                contents=[context],
+                ttl=timedelta(seconds=settings.SUMMARY_CONTEXT_CACHE_TTL_SECONDS)
+            )
+        except Exception as e:
+            # 最小トークン数に満たない場合などは作成できない
+            print(f"コンテキストキャッシュ作成失敗のため session 方式で実行: {e}")
+            return None
+        return GenerativeModel.from_cached_content(cached_content=cache), cache.delete
+    
+    async def _run_session_steps(
+        self,
+        company_name: str,
+        yaml_steps: List[Tuple[str, str]],
+        step_results: Dict[int, str],
+        checkpoint_keys: List[str],
+        retriever: Optional["PassageRetriever"],
+        full_text: str,
+        step_latencies: Dict[int, float],
+        step_input_chars: Dict[int, int]
+    ) -> None:
+        """報告書を一度だけ送り、未完了のステップを会話の追加ターンとして実行
+        
+        完了済みステップは（指示, 結果）の組として会話履歴に復元する。
+        cached 方式では報告書をコンテキストキャッシュに置き、履歴には含めない。
+        """
+        scheduler = get_gemini_scheduler()
+        yaml_list = [self._load_yaml_prompt(yaml_file) for yaml_file, _ in yaml_steps]
+        context = await asyncio.to_thread(
+            self._build_session_context, company_name, yaml_list, retriever, full_text
+        )
+        print(f"報告書コンテキスト: {len(context)} 文字（{settings.SUMMARY_CHAIN_MODE}）")
+        
+        model = self.model
+        cached = None
+        if settings.SUMMARY_CHAIN_MODE == "cached":
+            cached = await scheduler.submit(lambda: self._create_context_cache(context), estimate_tokens(context))
+            if cached is not None:
+                model = cached[0]
+        
+        try:
+            history = []
+            history_chars = 0
+            sent_common = {"intro": yaml_list[0].get("common", {}).get("intro", "")}
+            chat = None
+            for i, ((yaml_file, step_name), yaml_data) in enumerate(zip(yaml_steps, yaml_list), 1):
+                message = self._build_session_turn(yaml_data, step_name, company_name, sent_common)
+                if i == 1 and cached is None:
+                    message = context + "\n\n" + message
+                elif i > 1:
+                    message = "上記の有価証券報告書とこれまでの分析結果を踏まえて、次の分析を行ってください。\n\n" + message
+                
+                if i in step_results:
+                    history.append({"role": "user", "parts": [message]})
+                    history.append({"role": "model", "parts": [step_results[i]]})
+                    history_chars += len(message) + len(step_results[i])
+                    continue
+                
+                print(f"--- ステップ {i}: {yaml_file} ({step_name}) 追加ターン送信: {len(message)} 文字 ---")
+                try:
+                    if chat is None:
+                        chat = model.start_chat(history=history)
+                    
+                    # 会話セッションは履歴を毎回送信するため、見積もりには履歴分も含める
+                    generation_config = self._generation_config(yaml_data.get("max_output_tokens"))
+                    max_output_tokens = self._answer_tokens(generation_config)
+                    started = time.perf_counter()
+                    response = await scheduler.submit(
+                        lambda: chat.send_message(message, generation_config=generation_config),
+                        estimate_tokens(message, max_output_tokens) + int(history_chars / settings.GEMINI_CHARS_PER_TOKEN)
+                    )
+                    step_latencies[i] = time.perf_counter() - started
+                    step_input_chars[i] = history_chars + len(message)
+                    
+                    if not response.text:
+                        raise Exception(f"ステップ{i}でレスポンスが空でした")
+                    
+                    step_results[i] = response.text
+                    history_chars += len(message) + len(response.text)
+                    print(f"ステップ{i}完了: {len(response.text)} 文字")
+                    
+                    await asyncio.to_thread(self.checkpoints.put, checkpoint_keys[i - 1], response.text)
+                    
+                except DeadlineExceeded:
+                    # 期限切れはステップの失敗にせず、呼び出し元（504応答）へ伝える
+                    raise
+                except Exception as e:
+                    print(f"ステップ{i}でエラー: {e}")
+                    print(f"エラータイプ: {type(e)}")
+                    raise Exception(f"ステップ{i}（{yaml_file}）の処理中にエラーが発生しました: {e}")
+        finally:
+            if cached is not None and cached[1] is not None:
+                try:
+                    await asyncio.to_thread(cached[1])
+                except Exception as e:
+                    print(f"コンテキストキャッシュ削除エラー: {e}")
+    
     async def summarize_securities_report(self, pdf_url: str, company_name: str) -> str:
         """有価証券報告書を要約"""
+        result = await self.run_summary_chain(pdf_url, company_name)
+        return result.text
+    
+    async def run_summary_chain(self, pdf_url: str, company_name: str, mode: str = "full") -> SummaryResult:
+        """有価証券報告書を要約（同じ報告書・企業・方式の要約が実行中ならその結果を待つ）
+        
+        mode が fast / fast_split の場合は、ステップの観点をまとめたプロンプトで要約する。
+        """
+        if mode not in SUMMARY_ANALYSIS_MODES:
+            raise ValueError(f"不明な要約方式です: {mode}")
+        if mode == "full":
+            factory = lambda: self._run_summary_chain(pdf_url, company_name)
+        else:
+            factory = lambda: self._run_fast_summary(pdf_url, company_name, mode)
+        return await _summary_flights.run((pdf_url, company_name, mode), factory)
+    
+    async def _open_report(
+        self, pdf_url: str, text_reservation: AsyncExitStack
+    ) -> Tuple[str, Optional["PassageRetriever"]]:
+        """報告書テキストと検索インデックスを用意（テキストの推定量をメモリ予算に計上する）"""
+        # 1-3. 報告書テキストを取得（保存済みならPDF解析を省略）
+        check_deadline("report_text")
+        pages = await self._load_report_pages(pdf_url)
+        full_text = "".join(pages)
+        print(f"報告書テキスト取得成功: {len(pages)} pages, {len(full_text)} 文字")
+        await text_reservation.enter_async_context(
+            get_memory_budget().reserve(estimate_text_bytes(len(full_text)), "report_text")
+        )
+        
+        # 報告書パッセージの検索インデックスを構築（報告書ごとにキャッシュ）
+        retriever = None
+        if settings.REPORT_RETRIEVAL_ENABLED:
+            from app.utils.passage_retriever import get_passage_retriever
+            
+            retriever = await asyncio.to_thread(
+                get_passage_retriever, ReportTextStore.make_key(pdf_url), pages
+            )
+            print(f"パッセージ検索インデックス: {len(retriever.passages)} passages")
+        return full_text, retriever
+    
+    def _format_summary_sections(self, step_results: Dict[int, str]) -> str:
+        """各ステップの結果をセクション形式でまとめる"""
+        sections = []
+        for i, (_, step_name) in enumerate(SUMMARY_STEPS, 1):
+            title = f"## Step {i}: {step_name} の要約"
+            content = step_results.get(i, "(このステップの出力はありません)")
+            sections.append(f"{title}\n\n{content}")
+        return "\n\n---\n\n".join(sections)
+    
+    def _build_fast_prompt(
+        self,
+        company_name: str,
+        steps: List[int],
+        yaml_list: List[Dict[str, Any]],
+        retriever: Optional["PassageRetriever"],
+        full_text: str
+    ) -> Tuple[str, Optional[int]]:
+        """複数ステップの【分析対象】と【出力形式】を1つのプロンプトにまとめる（出力上限は各ステップの合計）"""
+        targets = []
+        output_formats = []
+        queries: List[str] = []
+        top_k = 0
+        max_output_tokens = 0
+        for i in steps:
+            yaml_data = yaml_list[i - 1]
+            target, _, output_format = yaml_data[SUMMARY_STEPS[i - 1][1]].partition("【出力形式】")
+            targets.append(target.replace("【分析対象】", "").strip())
+            output_formats.append(output_format.strip())
+            
+            retrieval = yaml_data.get("retrieval") or {}
+            queries.extend(query for query in retrieval.get("query", []) if query not in queries)
+            top_k += retrieval.get("top_k", settings.REPORT_RETRIEVAL_TOP_K)
+            max_output_tokens += yaml_data.get("max_output_tokens") or 0
+        
+        # まとめた観点の問い合わせ語で関連パッセージを検索（設定がなければ報告書の先頭）
+        report_text = None
+        if retriever is not None and queries:
+            report_text = retriever.retrieve(queries, top_k=top_k, max_chars=settings.MAX_PDF_CHARS) or None
+        if report_text is None:
+            report_text = full_text[:settings.MAX_PDF_CHARS]
+        
+        intro = yaml_list[0].get("common", {}).get("intro", "").replace("{company_name}", company_name)
+        instructions = self._load_yaml_prompt(FAST_SUMMARY_PROMPT)["instructions"]
+        instructions = instructions.replace("{step_count}", str(len(steps)))
+        # 出力形式の見出しは空行を挟まずに並べる
+        prompt = "\n\n".join([
+            intro.strip(),
+            instructions.strip(),
+            "【分析対象】\n" + "\n\n".join(targets),
+            "【出力形式】\n" + "\n".join(output_formats),
+            "## 分析対象の有価証券報告書\n" + report_text
+        ])
+        return prompt, max_output_tokens or None
+    
+    def _split_fast_response(self, text: str, steps: List[int]) -> Dict[int, str]:
+        """まとめて生成した応答を「## Step N」見出しでステップごとに分割"""
+        matches = [match for match in STEP_HEADING_PATTERN.finditer(text) if int(match.group(1)) in steps]
+        results = {}
+        for match, following in zip(matches, matches[1:] + [None]):
+            end = following.start() if following else len(text)
+            results.setdefault(int(match.group(1)), text[match.start():end].strip())
+        if not results:
+            # 見出しで分割できない場合は先頭のステップに全文を割り当てる
+            results[steps[0]] = text.strip()
+        return results
+    
+    async def _run_fast_summary(self, pdf_url: str, company_name: str, mode: str) -> SummaryResult:
+        """ステップの観点をまとめたプロンプトで要約（チェックポイントは使わない）
+        
+        結果は「## Step N」見出しでステップごとに分割し、段階的要約と同じセクション構成で返す。
+        """
+        text_reservation = AsyncExitStack()
+        try:
+            print(f"=== 高速要約開始（{mode}）: {company_name} ===")
+            full_text, retriever = await self._open_report(pdf_url, text_reservation)
+            yaml_list = [self._load_yaml_prompt(yaml_file) for yaml_file, _ in SUMMARY_STEPS]
+            
+            step_results: Dict[int, str] = {}
+            step_latencies = {}
+            step_input_chars = {}
+            
+            async def run_part(steps: List[int]) -> None:
+                prompt, max_output_tokens = self._build_fast_prompt(
+                    company_name, steps, yaml_list, retriever, full_text
+                )
+                print(f"Gemini API呼び出し開始（ステップ{steps}）: {len(prompt)} 文字")
+                started = time.perf_counter()
+                response = await self._generate(prompt, self._generation_config(max_output_tokens))
+                # 呼び出し単位の値は先頭のステップに記録する
+                step_latencies[steps[0]] = time.perf_counter() - started
+                step_input_chars[steps[0]] = len(prompt)
+                if not response.text:
+                    raise Exception(f"ステップ{steps}でレスポンスが空でした")
+                step_results.update(self._split_fast_response(response.text, steps))
+            
+            await asyncio.gather(*(run_part(steps) for steps in SUMMARY_ANALYSIS_MODES[mode]))
+            
+            missing = [i for i in range(1, len(SUMMARY_STEPS) + 1) if i not in step_results]
+            if missing:
+                print(f"応答に見出しがなかったステップ: {missing}")
+            print(f"=== 高速要約完了: 呼び出し別所要時間 { {i: round(t, 2) for i, t in step_latencies.items()} } ===")
+            
+            return SummaryResult(
+                text=self._format_summary_sections(step_results),
+                step_results=step_results,
+                step_latencies=step_latencies,
+                step_input_chars=step_input_chars,
+                mode=mode
+            )
+        finally:
+            await text_reservation.aclose()
+    
+    async def _run_summary_chain(self, pdf_url: str, company_name: str) -> SummaryResult:
+        """有価証券報告書を段階的に要約（完了済みステップはチェックポイントから再利用）"""
+        # 報告書テキストを保持している間はその推定量をメモリ予算に計上する
+        text_reservation = AsyncExitStack()
         try:
             print(f"=== summarize_securities_report 開始 ===")
             print(f"PDF URL: {pdf_url}")
             print(f"企業名: {company_name}")
             
-            # 1. PDFデータをダウンロード
-            print("PDFダウンロード開始...")
-            response = requests.get(pdf_url)
-            response.raise_for_status()
-            print(f"PDFダウンロード成功: {len(response.content)} bytes")
-            
-            # 2. fitz で PDF を読み込む
-            print("PDF読み込み開始...")
-            doc = fitz.open(stream=response.content, filetype="pdf")
-            print(f"PDF読み込み成功: {len(doc)} pages")
+            yaml_steps = SUMMARY_STEPS
             
-            # 3. テキスト抽出
-            print("テキスト抽出開始...")
+            # 先頭から完了済みステップを確認し、最初の未完了ステップから再開する
+            checkpoint_keys = self._summary_checkpoint_keys(pdf_url, company_name, yaml_steps)
+            step_results = {}
+            reused_steps = []
+            for i, checkpoint_key in enumerate(checkpoint_keys, 1):
+                cached = await asyncio.to_thread(self.checkpoints.get, checkpoint_key)
+                if cached is None:
+                    break
+                step_results[i] = cached
+                reused_steps.append(i)
+            if reused_steps:
+                print(f"チェックポイントから再利用: ステップ{reused_steps}")
+            
+            retriever = None
             full_text = ""
-            for page in doc:
-                full_text += page.get_text()
-            print(f"テキスト抽出成功: {len(full_text)} 文字")
+            current_text = ""
+            if len(reused_steps) < len(yaml_steps):
+                full_text, retriever = await self._open_report(pdf_url, text_reservation)
+                
+                # 再開時は直前のステップ結果を現在のテキストとする
+                current_text = step_results[reused_steps[-1]] if reused_steps else full_text[:settings.MAX_PDF_CHARS]
 
 
             # 4. 段階的要約実行
             print("段階的要約開始...")
+            step_latencies = {}
+            step_input_chars = {}
             
-            # YAML設定ファイル名とステップ名のリスト（順序重要）
-            yaml_steps = [
-                ("company_analysis_prompts/company_analysis_step1.yml", "step1"),
-                ("company_analysis_prompts/company_analysis_step2.yml", "step2"), 
-                ("company_analysis_prompts/company_analysis_step3.yml", "step3"),
-                ("company_analysis_prompts/company_analysis_step4.yml", "step4"),
-                ("company_analysis_prompts/company_analysis_step5.yml", "step5"),
-                ("company_analysis_prompts/company_analysis_step6.yml", "step6")
-            ]
-            
-            current_text = full_text[:settings.MAX_PDF_CHARS]
-            step_results = {}
+            if settings.SUMMARY_CHAIN_MODE in ("session", "cached") and len(reused_steps) < len(yaml_steps):
+                # 報告書を一度だけ送り、各ステップを会話の追加ターンとして実行
+                await self._run_session_steps(
+                    company_name, yaml_steps, step_results, checkpoint_keys,
+                    retriever, full_text, step_latencies, step_input_chars
+                )
             
             for i, (yaml_file, step_name) in enumerate(yaml_steps, 1):
+                if i in step_results:
+                    continue
+                
                 print(f"--- ステップ {i}: {yaml_file} ({step_name}) 実行開始 ---")
                 
                 try:
@@ -129,30 +680,42 @@ class GeminiService:
                     yaml_data = self._load_yaml_prompt(yaml_file)
                     print(f"YAML読み込み成功: {yaml_file}")
                     
+                    # ステップの観点に関連するパッセージを検索（設定がなければ従来どおり）
+                    report_text = self._retrieve_report_text(retriever, yaml_data)
+                    if report_text is not None:
+                        print(f"関連パッセージ取得: {len(report_text)} 文字")
+                    else:
+                        report_text = current_text
+                    
                     # プロンプト構築
                     prompt = self._build_prompt_from_yaml(
                         yaml_data,
                         step_name,
                         company_name=company_name,
-                        securities_report=current_text,
+                        securities_report=report_text,
                         previous_results=step_results
                     )
                     
                     # プロンプトにデータを追加
                     if i == 1:
                         # 最初のステップでは元のテキストを使用
-                        final_prompt = prompt + "\n\n## 分析対象の有価証券報告書\n" + current_text
+                        final_prompt = prompt + "\n\n## 分析対象の有価証券報告書\n" + report_text
                     else:
                         # 2ステップ目以降は前のステップの結果も含める
                         context = "\n".join([f"### ステップ{j}の結果\n{result}" 
                                            for j, result in step_results.items()])
-                        final_prompt = prompt + "\n\n## 前のステップの分析結果\n" + context + "\n\n## 元の有価証券報告書（参考）\n" + current_text[:10000]
+                        final_prompt = prompt + "\n\n## 前のステップの分析結果\n" + context + "\n\n## 元の有価証券報告書（参考）\n" + report_text[:10000]
                     
                     print(f"最終プロンプト準備完了: {len(final_prompt)} 文字")
                     
                     # Gemini API呼び出し
                     print(f"Gemini API呼び出し開始（ステップ{i}）...")
-                    response = self.model.generate_content(final_prompt)
+                    started = time.perf_counter()
+                    response = await self._generate(
+                        final_prompt, self._generation_config(yaml_data.get("max_output_tokens"))
+                    )
+                    step_latencies[i] = time.perf_counter() - started
+                    step_input_chars[i] = len(final_prompt)
                     
                     if not response.text:
                         raise Exception(f"ステップ{i}でレスポンスが空でした")
@@ -160,28 +723,30 @@ class GeminiService:
                     step_results[i] = response.text
                     print(f"ステップ{i}完了: {len(response.text)} 文字")
                     
+                    # 完了したステップを保存し、失敗時の再試行で再利用できるようにする
+                    await asyncio.to_thread(self.checkpoints.put, checkpoint_keys[i - 1], response.text)
+                    
                     # 次のステップのために結果を現在のテキストとして設定
                     if i < len(yaml_steps):
                         current_text = response.text
                     
+                except DeadlineExceeded:
+                    # 期限切れはステップの失敗にせず、呼び出し元（504応答）へ伝える
+                    raise
                 except Exception as e:
                     print(f"ステップ{i}でエラー: {e}")
                     print(f"エラータイプ: {type(e)}")
                     raise Exception(f"ステップ{i}（{yaml_file}）の処理中にエラーが発生しました: {e}")
             
             print("=== 段階的要約完了 ===")
+            if step_latencies:
+                print(f"ステップ別入力文字数: {step_input_chars}")
+                print(f"ステップ別所要時間: { {i: round(t, 2) for i, t in step_latencies.items()} }")
 
             # 🔽 各ステップごとにセクション形式でまとめて出力
             print("要約セクションを構築中...")
             
-            sections = []
-            for i in range(1, len(yaml_steps) + 1):
-                step_name = yaml_steps[i - 1][1]
-                title = f"## Step {i}: {step_name} の要約"
-                content = step_results.get(i, "(このステップの出力はありません)")
-                sections.append(f"{title}\n\n{content}")
-            
-            final_result = "\n\n---\n\n".join(sections)
+            final_result = self._format_summary_sections(step_results)
             
             print(f"要約セクション構築完了: {len(final_result)} 文字")
 
@@ -189,7 +754,13 @@ class GeminiService:
             # final_result = step_results[len(yaml_steps)]
             # print(f"最終結果: {len(final_result)} 文字")
             
-            return final_result
+            return SummaryResult(
+                text=final_result,
+                step_results=step_results,
+                reused_steps=reused_steps,
+                step_latencies=step_latencies,
+                step_input_chars=step_input_chars
+            )
 
 
 
@@ -221,15 +792,14 @@ class GeminiService:
             
             # return response.text
             
-        except requests.RequestException as e:
-            print(f"PDFダウンロードエラー: {e}")
-            raise
         except Exception as e:
             print(f"summarize_securities_report エラー: {e}")
             print(f"エラータイプ: {type(e)}")
             import traceback
             print(f"スタックトレース: {traceback.format_exc()}")
             raise
+        finally:
+            await text_reservation.aclose()
         
     async def generate_hypothesis(
         self, 
@@ -237,7 +807,7 @@ class GeminiService:
         department_name: str, 
         position_name: str, 
         job_scope: str
-    ) -> str:
+    ) -> StageOutput:
         """仮説を生成"""
         try:
             print(f"=== generate_hypothesis 開始 ===")
@@ -258,19 +828,11 @@ class GeminiService:
             prompt = prompt.replace("{position_name}", position_name)
             prompt = prompt.replace("{job_scope}", job_scope)
 
-            print(f"最終プロンプト準備完了: {len(prompt)} 文字")
+            # Gemini API呼び出し（構造化出力が有効ならJSONで出力させる）
+            hypothesis = await self._run_stage("hypothesis", prompt, "仮説生成")
             
-            # Gemini API呼び出し
-            print("Gemini API呼び出し開始（仮説生成）...")
-            response = self.model.generate_content(prompt)
-            
-            if not response.text:
-                raise Exception("仮説生成でレスポンスが空でした")
-            
-            hypothesis_text = response.text
-            
-            print(f"仮説生成完了: {len(hypothesis_text)} 文字")
-            return hypothesis_text
+            print(f"仮説生成完了: {len(hypothesis.text)} 文字")
+            return hypothesis
         
         except Exception as e:
             print(f"generate_hypothesis エラー: {e}")
@@ -292,8 +854,13 @@ class GeminiService:
         # response = self.model.generate_content(prompt)
         # return response.text
     
-    async def match_solutions(self, hypothesis: str, solutions: List[Solution]) -> str:
-        """ソリューションマッチング"""
+    async def match_solutions(
+        self,
+        hypothesis: str,
+        solutions: List[Solution],
+        solutions_text: Optional[str] = None
+    ) -> StageOutput:
+        """ソリューションマッチング（hypothesisは仮説のうちマッチングに必要な部分）"""
         try:
             print(f"=== match_solutions 開始 ===")
             print(f"ソリューション数: {len(solutions)}")
@@ -308,27 +875,16 @@ class GeminiService:
             
             prompt_template = yaml_data["matching_prompt"]["template"]
             
-            # ソリューション情報をテキスト化
-            solutions_text = "\n".join([
-                f"・{s.name}：{s.features}（用途：{s.use_case}）"
-                for s in solutions
-            ])
+            # ソリューション情報をテキスト化（整形済みテキストがあればそのまま使用）
+            if solutions_text is None:
+                solutions_text = "\n".join([format_solution(s) for s in solutions])
             
             # 変数置換
             prompt = prompt_template.replace("{hypothesis}", hypothesis)
             prompt = prompt.replace("{solutions}", solutions_text)
             
-            print(f"[ソリューションマッチング] プロンプト文字数: {len(prompt)} 文字")
-            
-            # Gemini API呼び出し
-            print("Gemini API呼び出し開始（ソリューションマッチング）...")
-            response = self.model.generate_content(prompt)
-            
-            if not response.text:
-                raise Exception("ソリューションマッチングでレスポンスが空でした")
-            
-            print(f"[ソリューションマッチング] Gemini応答文字数: {len(response.text)} 文字")
-            return response.text
+            # Gemini API呼び出し（構造化出力が有効ならJSONで出力させる）
+            return await self._run_stage("matching", prompt, "ソリューションマッチング")
             
         except Exception as e:
             print(f"match_solutions エラー: {e}")
@@ -343,8 +899,8 @@ class GeminiService:
         department_name: str,
         position_name: str,
         hypothesis_text: str
-    ) -> str:
-        """ヒアリング項目を生成"""
+    ) -> StageOutput:
+        """ヒアリング項目を生成（hypothesis_textは仮説のうちヒアリングに必要な部分）"""
         try:
             print(f"=== generate_hearing_items 開始 ===")
             print(f"企業名: {company_name}")
@@ -369,17 +925,8 @@ class GeminiService:
             prompt = prompt.replace("{industry}", "※報告書から業界を判断してください")
             prompt = prompt.replace("{hypothesis}", hypothesis_text)
             
-            print(f"[ヒアリング生成] プロンプト文字数: {len(prompt)} 文字")
-            
-            # Gemini API呼び出し
-            print("Gemini API呼び出し開始（ヒアリング項目生成）...")
-            response = self.model.generate_content(prompt)
-            
-            if not response.text:
-                raise Exception("ヒアリング項目生成でレスポンスが空でした")
-            
-            print(f"[ヒアリング生成] Gemini応答文字数: {len(response.text)} 文字")
-            return response.text
+            # Gemini API呼び出し（構造化出力が有効ならJSONで出力させる）
+            return await self._run_stage("hearing", prompt, "ヒアリング生成")
             
         except Exception as e:
             print(f"generate_hearing_items エラー: {e}")
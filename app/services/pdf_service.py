@@ -1,6 +1,6 @@
 import io
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, BinaryIO, List, Optional
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
@@ -10,6 +10,15 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import os
+from xml.sax.saxutils import escape
+from app.services.structured_output import get_stage_schema
+
+# 結果のキーと構造化出力の段の対応
+STRUCTURED_SECTIONS = {
+    "hypothesis": "hypothesis",
+    "matching_result": "matching",
+    "hearing_items": "hearing",
+}
 
 class PDFService:
     """PDF生成サービス"""
@@ -65,6 +74,15 @@ class PDFService:
             textColor=colors.darkblue
         ))
         
+        self.styles.add(ParagraphStyle(
+            name='JapaneseSubHeading',
+            parent=self.styles['Heading2'],
+            fontName='Japanese',
+            fontSize=11,
+            spaceAfter=6,
+            spaceBefore=8
+        ))
+        
         self.styles.add(ParagraphStyle(
             name='JapaneseNormal',
             parent=self.styles['Normal'],
@@ -74,6 +92,17 @@ class PDFService:
             alignment=TA_LEFT
         ))
         
+        self.styles.add(ParagraphStyle(
+            name='JapaneseDetail',
+            parent=self.styles['Normal'],
+            fontName='Japanese',
+            fontSize=10,
+            spaceAfter=4,
+            leftIndent=18,
+            bulletIndent=8,
+            alignment=TA_LEFT
+        ))
+        
         self.styles.add(ParagraphStyle(
             name='JapaneseSmall',
             parent=self.styles['Normal'],
@@ -87,11 +116,17 @@ class PDFService:
         self, 
         company_data: Dict[str, str], 
         results: Dict[str, str],
-        solutions: list
-    ) -> io.BytesIO:
-        """分析レポートPDFを生成"""
+        solutions: list,
+        output: Optional[BinaryIO] = None,
+        structured_results: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> BinaryIO:
+        """分析レポートPDFを生成（output指定時はそのファイルへ書き込む）
+        
+        structured_results にあるセクションは、テキストを分割せず項目ごとに描画する。
+        """
+        structured_results = structured_results or {}
         
-        buffer = io.BytesIO()
+        buffer = output if output is not None else io.BytesIO()
         doc = SimpleDocTemplate(
             buffer,
             pagesize=A4,
@@ -142,13 +177,21 @@ class PDFService:
         
         # 各セクションを追加
         sections = [
-            ("有価証券報告書要約", results.get('summary', '')),
-            ("仮説・担当者課題", results.get('hypothesis', '')),
-            ("ソリューションマッチング", results.get('matching_result', '')),
-            ("ヒアリング項目", results.get('hearing_items', ''))
+            ("有価証券報告書要約", 'summary'),
+            ("仮説・担当者課題", 'hypothesis'),
+            ("ソリューションマッチング", 'matching_result'),
+            ("ヒアリング項目", 'hearing_items')
         ]
         
-        for section_title, content in sections:
+        for section_title, key in sections:
+            structured_story = self._structured_story(key, structured_results.get(key))
+            if structured_story:
+                story.append(Paragraph(section_title, self.styles['JapaneseHeading']))
+                story.extend(structured_story)
+                story.append(Spacer(1, 15))
+                continue
+            
+            content = results.get(key, '')
             if content:
                 story.append(Paragraph(section_title, self.styles['JapaneseHeading']))
                 
@@ -201,9 +244,36 @@ class PDFService:
         
         return buffer
     
-    def generate_simple_text_pdf(self, text: str, title: str = "レポート") -> io.BytesIO:
-        """シンプルなテキストPDFを生成"""
-        buffer = io.BytesIO()
+    def _structured_story(self, key: str, data: Optional[Dict[str, Any]]) -> List[Any]:
+        """構造化出力のセクションを項目ごとの段落に変換（定義がなければ空）"""
+        stage = STRUCTURED_SECTIONS.get(key)
+        if not data or stage is None:
+            return []
+        
+        schema = get_stage_schema(stage)
+        if schema is None:
+            return []
+        
+        story = []
+        for kind, text in schema.to_blocks(data):
+            if kind == "heading":
+                story.append(Paragraph(escape(text), self.styles['JapaneseSubHeading']))
+            elif kind == "bullet":
+                story.append(Paragraph(escape(text), self.styles['JapaneseNormal'], bulletText="・"))
+            elif kind == "detail":
+                story.append(Paragraph(escape(text), self.styles['JapaneseDetail'], bulletText="・"))
+            else:
+                story.append(Paragraph(escape(text), self.styles['JapaneseNormal']))
+        return story
+    
+    def generate_simple_text_pdf(
+        self,
+        text: str,
+        title: str = "レポート",
+        output: Optional[BinaryIO] = None
+    ) -> BinaryIO:
+        """シンプルなテキストPDFを生成（output指定時はそのファイルへ書き込む）"""
+        buffer = output if output is not None else io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4)
         
         story = []
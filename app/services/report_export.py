@@ -0,0 +1,155 @@
+"""複数企業の分析レポートPDFをZIPにまとめて配信する
+
+各PDFはプロセスプールで並列に一時ファイルへ描画し、完成した順にZIPへ追加して
+そのままクライアントへ送る。ZIP全体やPDFをメモリ上に組み立てることはない。
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.config import settings
+from app.models.schemas import PDFGenerateRequest
+from app.utils.memory_budget import estimate_render_bytes, get_memory_budget
+
+# ワーカープロセス内で使い回すPDFService（フォント・スタイルの初期化を一度だけ行う）
+_worker_pdf_service = None
+
+
+def _render_report_file(payload: Dict[str, Any], path: str) -> int:
+    """分析レポートPDFをファイルへ描画してサイズを返す（ワーカープロセスで実行）"""
+    global _worker_pdf_service
+    if _worker_pdf_service is None:
+        from app.services.pdf_service import PDFService
+
+        _worker_pdf_service = PDFService()
+
+    request = PDFGenerateRequest(**payload)
+    with open(path, "wb") as output:
+        _worker_pdf_service.generate_analysis_report(
+            company_data=request.company_data,
+            results=request.results,
+            solutions=request.solutions,
+            output=output,
+            structured_results=request.structured_results
+        )
+    return os.path.getsize(path)
+
+
+class _ZipStream(io.RawIOBase):
+    """ZipFileの書き込み先（書かれたバイト列を取り出すまで保持する、シーク不可のストリーム）
+
+    シークできないため、ZipFileは各エントリのサイズをデータ記述子として後置する。
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def report_filename(request: PDFGenerateRequest, used: Dict[str, int]) -> str:
+    """ZIP内のファイル名（同じ企業名が重複する場合は連番を付ける）"""
+    company_name = request.company_data.get("company_name", "企業")
+    stem = f"{company_name}_分析結果_{datetime.now().strftime('%Y%m%d')}"
+    # パス区切りを含む企業名でZIP内のディレクトリを作らない
+    stem = stem.replace("/", "_").replace("\\", "_")
+    used[stem] = used.get(stem, 0) + 1
+    return f"{stem}.pdf" if used[stem] == 1 else f"{stem}_{used[stem]}.pdf"
+
+
+class ReportExporter:
+    """分析レポートPDFのZIP一括出力"""
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls) -> ProcessPoolExecutor:
+        """描画用の共有プロセスプールを取得（テキスト抽出とは分けて、分析処理を待たせない）"""
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=settings.PDF_EXPORT_WORKERS or None,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return cls._executor
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """描画用プロセスプールを停止"""
+        with cls._executor_lock:
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
+
+    async def stream_zip(self, requests: List[PDFGenerateRequest]) -> AsyncIterator[bytes]:
+        """PDFを並列に描画し、完成した順にZIPへ追加しながらバイト列を返す"""
+        loop = asyncio.get_running_loop()
+        executor = self.get_executor()
+        memory_budget = get_memory_budget()
+        workdir = tempfile.mkdtemp(prefix="report_export_")
+        used_names: Dict[str, int] = {}
+
+        async def render(index: int, request: PDFGenerateRequest) -> Tuple[str, str]:
+            path = os.path.join(workdir, f"{index}.pdf")
+            text_chars = sum(len(text) for text in request.results.values())
+            try:
+                async with memory_budget.reserve(estimate_render_bytes(text_chars), "export"):
+                    await loop.run_in_executor(executor, _render_report_file, request.model_dump(), path)
+            except Exception as e:
+                # 完成順に処理するため、どのレポートが失敗したかをエラーに含める
+                company_name = request.company_data.get("company_name", "企業")
+                raise RuntimeError(f"{index + 1}件目（{company_name}）: {e}") from e
+            return report_filename(request, used_names), path
+
+        tasks = [asyncio.create_task(render(i, request)) for i, request in enumerate(requests)]
+        stream = _ZipStream()
+        errors = []
+        try:
+            # PDFは圧縮済みで再圧縮の効果が小さく、イベントループを塞ぐため無圧縮で格納する
+            with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+                for finished in asyncio.as_completed(tasks):
+                    try:
+                        name, path = await finished
+                    except Exception as e:
+                        errors.append(str(e))
+                        continue
+
+                    with open(path, "rb") as source, archive.open(name, "w") as entry:
+                        while True:
+                            chunk = await asyncio.to_thread(source.read, settings.PDF_STREAM_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            entry.write(chunk)
+                            data = stream.drain()
+                            if data:
+                                yield data
+                    os.remove(path)
+                    yield stream.drain()
+
+                if errors:
+                    # 描画に失敗したレポートがあれば一覧を同梱する
+                    archive.writestr("errors.txt", "\n".join(errors))
+            yield stream.drain()
+        finally:
+            # クライアントの切断などで中断された場合は残りの描画を取り消す
+            for task in tasks:
+                task.cancel()
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,263 @@
+"""ローカルの有価証券報告書PDFを一括で取り込む
+
+ディレクトリ内のPDFを企業コードに対応づけ、プロセスプールでテキストを抽出して
+報告書テキストストアとPDFキャッシュに格納し、企業を対応表（CompanyRegistry）に登録する。
+以後の企業分析ではWebからの取得・PDF解析を行わずに取り込み済みの報告書を使用する。
+
+企業コードとの対応は、マニフェストCSV（code, company_name, file 列）か、
+ファイル名（例: ``3097_物語コーポレーション.pdf``, ``3097.pdf``）から決める。
+
+    python -m app.services.report_ingestion /data/reports [--manifest manifest.csv] [--workers 8]
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from app.config import settings
+
+# ファイル名先頭の企業コード（4桁＋英字1文字まで）と、続く企業名
+FILENAME_PATTERN = re.compile(r"^(?P<code>\d{4}[0-9A-Z]?)(?:[_\-\s]+(?P<name>.+))?$")
+
+# 取り込んだ報告書の識別子（テキストストア・PDFキャッシュ・チェックポイントのキーになる）
+LOCAL_REPORT_SCHEME = "local-report"
+
+
+@dataclass
+class IngestItem:
+    """取り込み対象のPDF"""
+    code: str
+    company_name: str
+    path: str
+
+
+@dataclass
+class IngestionProgress:
+    """取り込みの進捗とスループット"""
+    total: int
+    done: int = 0
+    skipped: int = 0
+    failed: int = 0
+    pages: int = 0
+    chars: int = 0
+    bytes: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    errors: List[Dict[str, str]] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """残り時間の見積もり（実績がなければNone）"""
+        if not self.done:
+            return None
+        return (self.total - self.done) / self.documents_per_second
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "done": self.done,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "pages": self.pages,
+            "chars": self.chars,
+            "bytes": self.bytes,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "documents_per_second": round(self.documents_per_second, 2),
+            "pages_per_second": round(self.pages_per_second, 1),
+            "eta_seconds": None if self.eta_seconds is None else round(self.eta_seconds, 1),
+            "finished": self.finished_at is not None,
+            "errors": self.errors[-20:],
+        }
+
+    def summary_line(self) -> str:
+        line = (
+            f"{self.done}/{self.total} 件（スキップ {self.skipped}, 失敗 {self.failed}）"
+            f" {self.pages} ページ {self.elapsed:.1f}秒"
+            f" {self.documents_per_second:.1f} 件/秒 {self.pages_per_second:.0f} ページ/秒"
+        )
+        if self.eta_seconds is not None and self.finished_at is None:
+            line += f" 残り約{self.eta_seconds:.0f}秒"
+        return line
+
+
+def scan_directory(directory: str, manifest: Optional[str] = None) -> List[IngestItem]:
+    """取り込み対象のPDFを列挙（マニフェストがなければファイル名から企業コードを判定）
+
+    マニフェストの file 列は directory 配下に限る（絶対パスや ``../`` で外を指す行はスキップ）。
+    """
+    if manifest:
+        root = os.path.realpath(directory)
+        items = []
+        with open(manifest, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                path = os.path.realpath(os.path.join(root, row["file"]))
+                if os.path.commonpath([root, path]) != root:
+                    print(f"取り込み元ディレクトリ外のためスキップ: {row['file']}")
+                    continue
+                items.append(IngestItem(row["code"].strip(), (row.get("company_name") or "").strip(), path))
+        return items
+
+    items = []
+    for root, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            stem, extension = os.path.splitext(filename)
+            if extension.lower() != ".pdf":
+                continue
+            match = FILENAME_PATTERN.match(stem)
+            if not match:
+                print(f"企業コードを判定できないためスキップ: {filename}")
+                continue
+            items.append(IngestItem(match.group("code"), (match.group("name") or "").strip(), os.path.join(root, filename)))
+    return items
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ingest_file(path: str, code: str, store_root: str) -> Dict[str, Any]:
+    """1文書を抽出してテキストストアに保存（ワーカープロセスで実行）"""
+    from app.utils.pdf_text_extractor import _open_document
+    from app.utils.report_text_store import ReportTextStore
+
+    report_url = f"{LOCAL_REPORT_SCHEME}://{code}/{_file_digest(path)[:16]}"
+    store = ReportTextStore(store_root)
+    key = ReportTextStore.make_key(report_url)
+    result = {"report_url": report_url, "bytes": os.path.getsize(path)}
+
+    if store.has(key):
+        # 同じ内容のファイルは取り込み済み
+        return {**result, "skipped": True, "pages": store.page_count(key), "chars": 0}
+
+    with _open_document(path) as doc:
+        pages = [page.get_text() for page in doc]
+    store.put(key, pages, report_url)
+    return {**result, "skipped": False, "pages": len(pages), "chars": sum(len(page) for page in pages)}
+
+
+def _link_into_pdf_cache(cache_path: str, source_path: str) -> None:
+    """PDFキャッシュに元ファイルを登録（可能ならハードリンク、不可ならコピー）"""
+    if os.path.exists(cache_path):
+        return
+    tmp_path = f"{cache_path}.{os.getpid()}.part"
+    try:
+        os.link(source_path, tmp_path)
+    except OSError:
+        import shutil
+
+        shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, cache_path)
+
+
+async def ingest_reports(
+    items: List[IngestItem],
+    executor: Optional[Executor] = None,
+    concurrency: Optional[int] = None,
+    progress: Optional[IngestionProgress] = None,
+    on_progress: Optional[Callable[[IngestionProgress], None]] = None
+) -> IngestionProgress:
+    """PDFを並列に取り込み、企業を対応表に登録する"""
+    from app.utils.company_registry import company_registry
+    from app.utils.memory_budget import estimate_extraction_bytes, get_memory_budget
+    from app.utils.pdf_downloader import PDFDownloader
+    from app.utils.pdf_text_extractor import PDFTextExtractor
+
+    loop = asyncio.get_running_loop()
+    executor = executor or PDFTextExtractor.get_executor()
+    # ワーカー数より少し多く投入して、プールを空けずにメモリ上の結果を抑える
+    semaphore = asyncio.Semaphore(concurrency or (settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1) * 2)
+    progress = progress or IngestionProgress(total=len(items))
+    memory_budget = get_memory_budget()
+    downloader = PDFDownloader()
+    registrations = []
+
+    async def ingest(item: IngestItem) -> None:
+        async with semaphore:
+            try:
+                # 分析処理と同じメモリ予算に抽出中の推定量を計上する
+                async with memory_budget.reserve(estimate_extraction_bytes(os.path.getsize(item.path)), "ingest"):
+                    result = await loop.run_in_executor(
+                        executor, _ingest_file, item.path, item.code, settings.REPORT_TEXT_STORE_DIR
+                    )
+                _link_into_pdf_cache(downloader.cache_path(result["report_url"]), item.path)
+            except Exception as e:
+                progress.failed += 1
+                progress.errors.append({"path": item.path, "error": str(e)})
+            else:
+                progress.skipped += result["skipped"]
+                progress.pages += result["pages"]
+                progress.chars += result["chars"]
+                progress.bytes += result["bytes"]
+                registrations.append({
+                    "code": item.code,
+                    "company_name": item.company_name,
+                    "report_url": result["report_url"],
+                    "source_path": item.path,
+                    "pages": result["pages"],
+                })
+            progress.done += 1
+            if on_progress is not None:
+                on_progress(progress)
+
+    try:
+        await asyncio.gather(*(ingest(item) for item in items))
+    finally:
+        # 中断された場合も完了分は登録する
+        await asyncio.to_thread(company_registry.register_many, registrations)
+        progress.finished_at = time.time()
+    return progress
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="有価証券報告書PDFの一括取り込み")
+    parser.add_argument("directory")
+    parser.add_argument("--manifest", help="code, company_name, file 列を持つCSV")
+    parser.add_argument("--workers", type=int, default=settings.PDF_EXTRACT_WORKERS or os.cpu_count())
+    args = parser.parse_args()
+
+    items = scan_directory(args.directory, args.manifest)
+    print(f"取り込み対象: {len(items)} 件（ワーカー {args.workers}）")
+
+    last_report = [0.0]
+
+    def report(progress: IngestionProgress) -> None:
+        if time.time() - last_report[0] >= 1.0 or progress.done == progress.total:
+            last_report[0] = time.time()
+            print(progress.summary_line(), flush=True)
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        progress = asyncio.run(ingest_reports(
+            items, executor=executor, concurrency=args.workers * 2, on_progress=report
+        ))
+
+    print(f"=== 取り込み完了: {progress.summary_line()} ===")
+    for error in progress.errors:
+        print(f"失敗: {error['path']}: {error['error']}")
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,95 @@
+import hashlib
 import json
-from typing import List
+import os
+import threading
+from types import MappingProxyType
+from typing import List, Optional, Sequence, Tuple
 from app.config import settings
-from app.models.schemas import Solution
+from app.models.schemas import Solution, SolutionsResponse
+from app.utils.http_cache import make_etag
+
+def format_solution(solution: Solution) -> str:
+    """マッチングプロンプト用にソリューションを1行で表現"""
+    return f"・{solution.name}：{solution.features}（用途：{solution.use_case}）"
+
+class SolutionCatalog:
+    """読み込み済みソリューションカタログ（不変）"""
+    
+    def __init__(self, solutions: Sequence[Solution], version: Tuple[int, int], content_hash: str):
+        self.solutions: Tuple[Solution, ...] = tuple(solutions)
+        self.version = version
+        self.etag = make_etag(content_hash)
+        self.by_name = MappingProxyType({s.name: s for s in self.solutions})
+        
+        # プロンプト用テキスト・APIレスポンスを事前に構築
+        self.lines: Tuple[str, ...] = tuple(format_solution(s) for s in self.solutions)
+        self.solutions_text = "\n".join(self.lines)
+        self.response_body = SolutionsResponse(
+            success=True, solutions=list(self.solutions)
+        ).model_dump_json().encode("utf-8")
+        self._index = None
+        self._index_lock = threading.Lock()
+    
+    @property
+    def index(self):
+        """類似度インデックス（NumPyの読み込みを避けるため初回の絞り込み時に構築）"""
+        with self._index_lock:
+            if self._index is None:
+                from app.utils.text_search import TfidfIndex
+                
+                self._index = TfidfIndex([f"{s.name} {s.features} {s.use_case}" for s in self.solutions])
+            return self._index
+    
+    def select(self, query: str, k: int) -> Tuple[List[Solution], str]:
+        """類似度上位k件のソリューションと、そのプロンプト用テキストを返す"""
+        if len(self.solutions) <= k:
+            return list(self.solutions), self.solutions_text
+        
+        indices = self.index.top_k(query, k)
+        return (
+            [self.solutions[i] for i in indices],
+            "\n".join(self.lines[i] for i in indices)
+        )
+
+# 読み込み済みカタログ（ファイルの更新日時・サイズが変わったときのみ再読み込み）
+_catalog: Optional[SolutionCatalog] = None
+_catalog_lock = threading.Lock()
 
 class SolutionService:
     """ソリューション管理サービス"""
     
+    def get_catalog(self) -> SolutionCatalog:
+        """ソリューションカタログを取得（ファイル更新時は再読み込み）"""
+        global _catalog
+        stat = os.stat(settings.SOLUTIONS_FILE)
+        version = (stat.st_mtime_ns, stat.st_size)
+        
+        catalog = _catalog
+        if catalog is not None and catalog.version == version:
+            return catalog
+        
+        with _catalog_lock:
+            if _catalog is None or _catalog.version != version:
+                with open(settings.SOLUTIONS_FILE, "rb") as f:
+                    raw = f.read()
+                data = json.loads(raw.decode("utf-8"))
+                _catalog = SolutionCatalog(
+                    [Solution(**item) for item in data],
+                    version,
+                    hashlib.sha256(raw).hexdigest()
+                )
+            return _catalog
+    
     def get_solutions(self) -> List[Solution]:
         """ソリューション一覧を取得"""
-        with open(settings.SOLUTIONS_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        return [Solution(**item) for item in data]
\ No newline at end of file
+        return list(self.get_catalog().solutions)
+    
+    def shortlist(self, query: str, k: Optional[int] = None) -> List[Solution]:
+        """仮説などの文章に類似するソリューションを上位k件に絞り込む"""
+        solutions, _ = self.shortlist_with_text(query, k)
+        return solutions
+    
+    def shortlist_with_text(self, query: str, k: Optional[int] = None) -> Tuple[List[Solution], str]:
+        """絞り込んだソリューションと、事前に整形済みのプロンプト用テキストを返す"""
+        k = settings.SOLUTION_SHORTLIST_K if k is None else k
+        return self.get_catalog().select(query, k)
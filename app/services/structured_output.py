@@ -0,0 +1,257 @@
+"""仮説・マッチング・ヒアリング各段の構造化（JSON）出力
+
+各段のプロンプトYAMLの ``structured_output`` に出力項目・文字数上限・件数上限・
+出力トークン上限と、後段に渡す項目を定義する。
+
+    structured_output:
+      title: 課題仮説
+      replace_from: 【アウトプット形式】
+      max_output_tokens: 3072
+      fields:
+        - {name: summary, label: 概要, max_chars: 200}
+        - name: issues
+          label: 課題
+          type: list
+          max_items: 3
+          fields:
+            - {name: title, label: 課題名, max_chars: 40}
+            - {name: urgency, label: 緊急度, enum: [高, 中, 低]}
+      downstream:
+        matching: [issues]
+
+``type`` は string（既定）または list。list は ``fields`` があればオブジェクトの配列、
+なければ文字列の配列として扱う。
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+
+# 段の名前と、プロンプトYAMLのファイル名・キー
+STAGE_PROMPTS = {
+    "hypothesis": ("hypothesis_prompt.yml", "hypothesis_prompt"),
+    "matching": ("solution_matching_prompt.yml", "matching_prompt"),
+    "hearing": ("hearing_prompt.yml", "hearing_prompt"),
+}
+
+# PDF描画用のブロック（種類, テキスト）。種類は heading / paragraph / bullet / detail（番号付き項目の内訳）
+Block = Tuple[str, str]
+
+
+@dataclass
+class FieldSpec:
+    """出力項目の定義"""
+    name: str
+    label: str
+    type: str = "string"
+    max_chars: Optional[int] = None
+    max_items: Optional[int] = None
+    enum: List[str] = field(default_factory=list)
+    fields: List["FieldSpec"] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FieldSpec":
+        return cls(
+            name=data["name"],
+            label=data.get("label", data["name"]),
+            type=data.get("type", "string"),
+            max_chars=data.get("max_chars"),
+            max_items=data.get("max_items"),
+            enum=[str(value) for value in data.get("enum", [])],
+            fields=[cls.from_dict(child) for child in data.get("fields", [])]
+        )
+
+    def describe(self) -> str:
+        """プロンプトに示す項目の説明"""
+        if self.enum:
+            return f"{self.label}（" + " / ".join(f'"{value}"' for value in self.enum) + " のいずれか）"
+        if self.type == "list":
+            limits = [f"最大{self.max_items}件"] if self.max_items else []
+            if self.fields:
+                return f"{self.label}（オブジェクトの配列・" + "・".join(limits + ["各要素は次の項目を持つ"]) + "）"
+            if self.max_chars:
+                limits.append(f"各{self.max_chars}字以内")
+            return f"{self.label}（文字列の配列" + "".join(f"・{limit}" for limit in limits) + "）"
+        if self.max_chars:
+            return f"{self.label}（{self.max_chars}字以内）"
+        return self.label
+
+    def to_schema(self) -> Dict[str, Any]:
+        """Gemini の response_schema（OpenAPIのサブセット）に変換"""
+        if self.type == "list":
+            item = self._item_schema()
+            return {"type": "array", "description": self.describe(), "items": item}
+        return self._item_schema(self.describe())
+
+    def _item_schema(self, description: Optional[str] = None) -> Dict[str, Any]:
+        if self.fields:
+            schema = {
+                "type": "object",
+                "properties": {child.name: child.to_schema() for child in self.fields},
+                "required": [child.name for child in self.fields],
+            }
+        else:
+            schema = {"type": "string"}
+            if self.enum:
+                schema["enum"] = list(self.enum)
+        if description:
+            schema["description"] = description
+        return schema
+
+    def coerce(self, value: Any) -> Any:
+        """モデルの出力を定義に合わせて整える（欠損は空値、超過は切り詰め）"""
+        if self.type == "list":
+            items = value if isinstance(value, list) else ([] if value in (None, "") else [value])
+            if self.max_items:
+                items = items[:self.max_items]
+            return [self._coerce_item(item) for item in items]
+        return self._coerce_item(value)
+
+    def _coerce_item(self, value: Any) -> Any:
+        if self.fields:
+            value = value if isinstance(value, dict) else {}
+            return {child.name: child.coerce(value.get(child.name)) for child in self.fields}
+        text = "" if value is None else str(value).strip()
+        if self.max_chars:
+            text = text[:self.max_chars]
+        return text
+
+
+@dataclass
+class StageSchema:
+    """段ごとの構造化出力の定義"""
+    stage: str
+    title: str
+    fields: List[FieldSpec]
+    max_output_tokens: Optional[int] = None
+    replace_from: Optional[str] = None
+    instructions: str = ""
+    downstream: Dict[str, List[str]] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, stage: str, data: Dict[str, Any]) -> "StageSchema":
+        return cls(
+            stage=stage,
+            title=data.get("title", stage),
+            fields=[FieldSpec.from_dict(item) for item in data.get("fields", [])],
+            max_output_tokens=data.get("max_output_tokens"),
+            replace_from=data.get("replace_from"),
+            instructions=data.get("instructions", ""),
+            downstream=data.get("downstream", {})
+        )
+
+    def build_prompt(self, prompt: str) -> str:
+        """プロンプトの出力形式部分をJSON出力の指示に置き換える"""
+        if self.replace_from and self.replace_from in prompt:
+            prompt = prompt[:prompt.index(self.replace_from)].rstrip()
+
+        lines = [
+            "【出力形式】",
+            "次の項目を持つJSONオブジェクトのみを出力してください（前後の説明文やコードブロックは不要）。",
+            "文字数・件数の上限を必ず守り、簡潔に記述してください。",
+        ]
+        lines.extend(_describe_fields(self.fields, indent=""))
+        if self.instructions:
+            lines.extend(["", self.instructions.strip()])
+        return prompt + "\n\n" + "\n".join(lines)
+
+    def response_schema(self) -> Dict[str, Any]:
+        """Gemini の response_schema"""
+        return {
+            "type": "object",
+            "properties": {spec.name: spec.to_schema() for spec in self.fields},
+            "required": [spec.name for spec in self.fields],
+        }
+
+    def parse(self, text: str) -> Optional[Dict[str, Any]]:
+        """モデルの応答からJSONを取り出して整える（JSONでなければNone）"""
+        start = text.find("{")
+        end = text.rfind("}")
+        if start < 0 or end <= start:
+            return None
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        return {spec.name: spec.coerce(data.get(spec.name)) for spec in self.fields}
+
+    def to_markdown(self, data: Dict[str, Any], field_names: Optional[List[str]] = None) -> str:
+        """Markdownに整形（field_names指定時はその項目のみ）"""
+        lines = [f"## {self.title}"]
+        for kind, text in self.to_blocks(data, field_names):
+            if kind == "heading":
+                lines.extend(["", f"### {text}"])
+            elif kind == "bullet":
+                lines.append(f"- {text}")
+            elif kind == "detail":
+                lines.append(f"   - {text}")
+            else:
+                lines.append(text)
+        return "\n".join(lines)
+
+    def to_blocks(self, data: Dict[str, Any], field_names: Optional[List[str]] = None) -> List[Block]:
+        """PDF描画用のブロック列に変換（空の項目は省略）"""
+        blocks = []
+        for spec in self.fields:
+            if field_names is not None and spec.name not in field_names:
+                continue
+            value = data.get(spec.name)
+            if not value:
+                continue
+
+            blocks.append(("heading", spec.label))
+            if spec.type != "list":
+                blocks.append(("paragraph", value))
+            elif not spec.fields:
+                blocks.extend(("bullet", item) for item in value if item)
+            else:
+                for number, item in enumerate(value, 1):
+                    head, *rest = spec.fields
+                    blocks.append(("paragraph", f"{number}. {item.get(head.name, '')}"))
+                    blocks.extend(
+                        ("detail", f"{child.label}：{item[child.name]}")
+                        for child in rest
+                        if item.get(child.name)
+                    )
+        return blocks
+
+    def downstream_text(self, data: Dict[str, Any], consumer: str) -> Optional[str]:
+        """後段に渡すテキスト（後段の定義がなければNone）"""
+        field_names = self.downstream.get(consumer)
+        if field_names is None:
+            return None
+        return self.to_markdown(data, field_names)
+
+
+def _describe_fields(fields: List[FieldSpec], indent: str) -> List[str]:
+    lines = []
+    for spec in fields:
+        lines.append(f"{indent}- {spec.name}: {spec.describe()}")
+        lines.extend(_describe_fields(spec.fields, indent + "  "))
+    return lines
+
+
+_schemas: Dict[str, Optional[StageSchema]] = {}
+_schemas_lock = threading.Lock()
+
+
+def get_stage_schema(stage: str) -> Optional[StageSchema]:
+    """段の構造化出力定義を取得（YAMLに定義がなければNone）"""
+    with _schemas_lock:
+        if stage in _schemas:
+            return _schemas[stage]
+
+    import yaml
+
+    filename, key = STAGE_PROMPTS[stage]
+    with open(os.path.join(settings.PROMPTS_DIR, filename), "r", encoding="utf-8") as f:
+        definition = (yaml.safe_load(f).get(key) or {}).get("structured_output")
+
+    schema = StageSchema.from_dict(stage, definition) if definition else None
+    with _schemas_lock:
+        _schemas[stage] = schema
+    return schema
@@ -0,0 +1,121 @@
+"""要約の方式（full / fast / fast_split）の所要時間・トークン量・出力量を比較する
+
+``python -m app.services.summary_benchmark 企業名`` として実行する。
+各方式をチェックポイントを使わずに指定回数実行し、Gemini呼び出しの回数・入出力量と
+要約全体の所要時間を表示する。``GEMINI_USE_FAKE_MODEL=true`` ならローカル検証用モデルで
+呼び出し回数と入力量を比較できる（所要時間・出力量はモデルの設定による）。
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.services.gemini_service import SUMMARY_ANALYSIS_MODES, GeminiService
+from app.utils.cache_backend import MemoryCacheBackend
+from app.utils.step_checkpoint import StepCheckpointStore
+
+
+@dataclass
+class ModeMeasurement:
+    """1つの方式の計測結果（各回の値）"""
+    mode: str
+    latencies: List[float] = field(default_factory=list)
+    calls: List[int] = field(default_factory=list)
+    input_tokens: List[int] = field(default_factory=list)
+    output_tokens: List[int] = field(default_factory=list)
+    output_chars: List[int] = field(default_factory=list)
+    filled_steps: List[int] = field(default_factory=list)
+
+    def summary_line(self) -> str:
+        median = statistics.median
+        return (
+            f"{self.mode:<11} {median(self.latencies):8.2f}s {median(self.calls):6.0f}"
+            f" {median(self.input_tokens):10.0f} {median(self.output_tokens):10.0f}"
+            f" {median(self.output_chars):10.0f} {min(self.filled_steps):6d}"
+        )
+
+
+class _CallRecorder:
+    """GeminiServiceの呼び出しを記録する（使用量が返らない場合は文字数から推定）"""
+
+    def __init__(self, service: GeminiService):
+        self._generate = service._generate
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        service._generate = self.generate
+
+    async def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> Any:
+        response = await self._generate(prompt, generation_config)
+        usage = getattr(response, "usage_metadata", None)
+        self.calls += 1
+        self.input_tokens += getattr(usage, "prompt_token_count", 0) or int(len(prompt) / settings.GEMINI_CHARS_PER_TOKEN)
+        self.output_tokens += getattr(usage, "candidates_token_count", 0) or int(
+            len(response.text or "") / settings.GEMINI_CHARS_PER_TOKEN
+        )
+        return response
+
+    def reset(self) -> None:
+        self.calls = self.input_tokens = self.output_tokens = 0
+
+
+async def run_benchmark(pdf_url: str, company_name: str, modes: List[str], runs: int) -> List[ModeMeasurement]:
+    """各方式を runs 回ずつ実行して計測"""
+    service = GeminiService()
+    recorder = _CallRecorder(service)
+    measurements = []
+    for mode in modes:
+        measurement = ModeMeasurement(mode)
+        for _ in range(runs):
+            # 段階的要約も毎回すべてのステップを実行させる
+            service.checkpoints = StepCheckpointStore(
+                MemoryCacheBackend("benchmark_checkpoints", max_bytes=64 * 1024 * 1024, max_entry_bytes=1024 * 1024)
+            )
+            recorder.reset()
+            started = time.perf_counter()
+            result = await service.run_summary_chain(pdf_url, company_name, mode)
+            measurement.latencies.append(time.perf_counter() - started)
+            measurement.calls.append(recorder.calls)
+            measurement.input_tokens.append(recorder.input_tokens)
+            measurement.output_tokens.append(recorder.output_tokens)
+            measurement.output_chars.append(sum(len(text) for text in result.step_results.values()))
+            measurement.filled_steps.append(len(result.step_results))
+        measurements.append(measurement)
+    return measurements
+
+
+async def _resolve_pdf_url(company_name: str) -> Optional[str]:
+    from app.services.company_service import CompanyService
+
+    company_service = CompanyService()
+    code = company_service.get_company_code(company_name)
+    return await company_service.resolve_pdf_url(code) if code else None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="要約の方式ごとの所要時間・トークン量の比較")
+    parser.add_argument("company_name")
+    parser.add_argument("--pdf-url", help="報告書のURL（省略時は企業名から特定）")
+    parser.add_argument("--modes", nargs="+", default=list(SUMMARY_ANALYSIS_MODES), choices=list(SUMMARY_ANALYSIS_MODES))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    pdf_url = args.pdf_url or asyncio.run(_resolve_pdf_url(args.company_name))
+    if not pdf_url:
+        print(f"報告書を特定できませんでした: {args.company_name}")
+        return 1
+
+    measurements = asyncio.run(run_benchmark(pdf_url, args.company_name, args.modes, args.runs))
+
+    print(f"=== 要約方式の比較: {args.company_name}（{args.runs}回の中央値、トークンは推定を含む） ===")
+    print(f"{'方式':<10} {'所要時間':>8} {'呼出数':>5} {'入力トークン':>8} {'出力トークン':>8} {'出力文字数':>8} {'ステップ':>4}")
+    for measurement in measurements:
+        print(measurement.summary_line())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
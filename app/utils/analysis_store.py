@@ -0,0 +1,87 @@
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.models.schemas import AnalysisRecord, AnalysisSectionInfo, SummaryStepResult
+from app.utils.cache_backend import CacheBackend, get_cache_backend
+
+# 個別に取得できるセクション（名前, 表示名）。PDFの results と同じキーを使う
+ANALYSIS_SECTIONS: List[Tuple[str, str]] = [
+    ("summary", "有価証券報告書要約"),
+    ("hypothesis", "仮説・担当者課題"),
+    ("matching_result", "ソリューションマッチング"),
+    ("hearing_items", "ヒアリング項目"),
+]
+
+
+class AnalysisStore:
+    """完了した企業分析を分析IDで保存するストア（保存先はキャッシュバックエンド）
+
+    保存した分析は変更しないため、セクションごとの取得結果は分析IDで一意に決まる。
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend or get_cache_backend(
+            "analyses",
+            max_bytes=settings.ANALYSIS_STORE_MAX_BYTES,
+            default_ttl=settings.ANALYSIS_TTL_SECONDS
+        )
+
+    def save(
+        self,
+        company_data: Dict[str, str],
+        pdf_url: Optional[str],
+        summary: str,
+        summary_steps: List[SummaryStepResult],
+        hypothesis: str = "",
+        matching_result: str = "",
+        hearing_items: str = "",
+        structured_results: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> AnalysisRecord:
+        """分析結果を新しい分析IDで保存"""
+        record = AnalysisRecord(
+            analysis_id=uuid.uuid4().hex,
+            created_at=time.time(),
+            company_data=company_data,
+            pdf_url=pdf_url,
+            summary=summary,
+            summary_steps=summary_steps,
+            hypothesis=hypothesis,
+            matching_result=matching_result,
+            hearing_items=hearing_items,
+            structured_results=structured_results or {}
+        )
+        self.backend.set(record.analysis_id, record.model_dump_json().encode("utf-8"))
+        return record
+
+    def get(self, analysis_id: str) -> Optional[AnalysisRecord]:
+        """保存済みの分析を取得（期限切れ・未保存はNone）"""
+        value = self.backend.get(analysis_id)
+        return AnalysisRecord.model_validate_json(value) if value else None
+
+    @staticmethod
+    def section_index(record: AnalysisRecord) -> List[AnalysisSectionInfo]:
+        """内容のあるセクションと要約ステップの一覧"""
+        base_path = f"/analyses/{record.analysis_id}"
+        sections = [
+            AnalysisSectionInfo(
+                name=name, title=title, chars=len(getattr(record, name)), path=f"{base_path}/sections/{name}"
+            )
+            for name, title in ANALYSIS_SECTIONS
+            if getattr(record, name)
+        ]
+        sections.extend(
+            AnalysisSectionInfo(
+                name=f"summary_step{step.step}",
+                title=f"要約ステップ{step.step}（{step.name}）",
+                chars=len(step.content),
+                path=f"{base_path}/summary/steps/{step.step}"
+            )
+            for step in record.summary_steps
+        )
+        return sections
+
+    @staticmethod
+    def results(record: AnalysisRecord) -> Dict[str, str]:
+        """PDF生成用のセクション本文（PDFGenerateRequest.results と同じ形）"""
+        return {name: getattr(record, name) for name, _ in ANALYSIS_SECTIONS}
@@ -0,0 +1,290 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.config import settings
+
+
+class CacheBackend(ABC):
+    """キャッシュバックエンドの共通インターフェース
+
+    値はバイト列で扱い、エントリごとのTTLと、名前空間ごとの合計サイズ・
+    1エントリあたりのサイズ上限を持つ。上限を超えるエントリは保存しない。
+    """
+
+    def __init__(self, namespace: str, max_bytes: int, max_entry_bytes: int, default_ttl: Optional[int] = None):
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.default_ttl = default_ttl
+
+    def _expires_at(self, ttl: Optional[int]) -> Optional[float]:
+        ttl = self.default_ttl if ttl is None else ttl
+        return time.time() + ttl if ttl else None
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """値を取得（期限切れ・未保存はNone）"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        """値を保存"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """値を削除"""
+
+    def get_json(self, key: str) -> Any:
+        """JSONとして保存した値を取得"""
+        value = self.get(key)
+        return None if value is None else json.loads(value.decode("utf-8"))
+
+    def set_json(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """値をJSONとして保存"""
+        self.set(key, json.dumps(value, ensure_ascii=False).encode("utf-8"), ttl)
+
+
+class MemoryCacheBackend(CacheBackend):
+    """プロセス内LRUキャッシュ"""
+
+    def __init__(self, namespace: str, max_bytes: int, max_entry_bytes: int, default_ttl: Optional[int] = None):
+        super().__init__(namespace, max_bytes, max_entry_bytes, default_ttl)
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        if len(value) > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, self._expires_at(ttl))
+            self._total_bytes += len(value)
+            while self._total_bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= len(entry[0])
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """同一ホストの複数ワーカーで共有するSQLite（WALモード）キャッシュ"""
+
+    # 参照日時の更新間隔（読み出しのたびに書き込まないための間引き）
+    TOUCH_INTERVAL = 60
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        max_bytes: int,
+        max_entry_bytes: int,
+        default_ttl: Optional[int] = None
+    ):
+        super().__init__(namespace, max_bytes, max_entry_bytes, default_ttl)
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_entries_accessed"
+            " ON cache_entries (namespace, accessed_at)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """スレッドごとの接続を取得"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value, expires_at, accessed_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at, accessed_at = row
+        now = time.time()
+        if expires_at is not None and expires_at < now:
+            self.delete(key)
+            return None
+        if now - accessed_at > self.TOUCH_INTERVAL:
+            connection.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+        return bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        if len(value) > self.max_entry_bytes:
+            return
+
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entries"
+                " (namespace, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, sqlite3.Binary(value), len(value), self._expires_at(ttl), now)
+            )
+            connection.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at < ?",
+                (self.namespace, now)
+            )
+            self._evict(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """合計サイズが上限を超えた分を参照日時の古い順に削除"""
+        (total,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,)
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        rows = connection.execute(
+            "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY accessed_at",
+            (self.namespace,)
+        )
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((self.namespace, key))
+            total -= size
+        connection.executemany(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", evicted
+        )
+
+    def delete(self, key: str) -> None:
+        self._connection().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        )
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redisプロトコルのキャッシュ（複数ホストで共有）
+
+    ``client`` には ``get`` / ``set(name, value, ex=...)`` / ``delete`` を持つ
+    redis-py 互換のオブジェクトを渡す。合計サイズはRedis側の maxmemory と
+    退避ポリシーで制限する前提とし、ここでは1エントリの上限のみ確認する。
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        namespace: str,
+        max_bytes: int,
+        max_entry_bytes: int,
+        default_ttl: Optional[int] = None
+    ):
+        super().__init__(namespace, max_bytes, max_entry_bytes, default_ttl)
+        self.client = client
+
+    def _key(self, key: str) -> str:
+        return f"{settings.CACHE_KEY_PREFIX}:{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self._key(key))
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        if len(value) > self.max_entry_bytes:
+            return
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self._key(key), value, ex=ttl or None)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self._key(key))
+
+
+_backends: Dict[str, CacheBackend] = {}
+_backends_lock = threading.Lock()
+_redis_client: Any = None
+
+
+def _get_redis_client() -> Any:
+    """Redisクライアントを取得（redisパッケージは使用時のみ必要）"""
+    global _redis_client
+    if _redis_client is None:
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis には redis パッケージが必要です") from e
+        _redis_client = redis.Redis.from_url(settings.CACHE_REDIS_URL)
+    return _redis_client
+
+
+def get_cache_backend(
+    namespace: str,
+    max_bytes: Optional[int] = None,
+    max_entry_bytes: Optional[int] = None,
+    default_ttl: Optional[int] = None
+) -> CacheBackend:
+    """設定に応じた名前空間ごとのキャッシュバックエンドを取得"""
+    with _backends_lock:
+        backend = _backends.get(namespace)
+        if backend is not None:
+            return backend
+
+        max_bytes = settings.CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        max_entry_bytes = settings.CACHE_MAX_ENTRY_BYTES if max_entry_bytes is None else max_entry_bytes
+
+        if settings.CACHE_BACKEND == "memory":
+            backend = MemoryCacheBackend(namespace, max_bytes, max_entry_bytes, default_ttl)
+        elif settings.CACHE_BACKEND == "sqlite":
+            backend = SQLiteCacheBackend(settings.CACHE_SQLITE_PATH, namespace, max_bytes, max_entry_bytes, default_ttl)
+        elif settings.CACHE_BACKEND == "redis":
+            backend = RedisCacheBackend(_get_redis_client(), namespace, max_bytes, max_entry_bytes, default_ttl)
+        else:
+            raise ValueError(f"未対応のキャッシュバックエンドです: {settings.CACHE_BACKEND}")
+
+        _backends[namespace] = backend
+        return backend
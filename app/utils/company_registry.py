@@ -0,0 +1,88 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+from app.config import settings
+
+
+class CompanyRegistry:
+    """取り込んだ企業の企業名・企業コード・報告書の対応表（JSONファイルに永続化）
+
+    company_codes の静的な辞書に加えて参照する。ファイルの更新日時が変わっていれば
+    読み直すため、複数ワーカー間でも取り込み結果が反映される。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.COMPANY_REGISTRY_PATH
+        self._data: Dict[str, Any] = {"companies": {}, "reports": {}}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        """ファイルが更新されていれば読み直す"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return self._data
+
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+                self._mtime = mtime
+            return self._data
+
+    def get_code(self, company_name: str) -> Optional[str]:
+        """企業名から企業コードを取得"""
+        return self._load()["companies"].get(company_name)
+
+    def get_report_url(self, code: str) -> Optional[str]:
+        """企業コードに対応する取り込み済み報告書の識別子を取得"""
+        report = self._load()["reports"].get(code)
+        return report["report_url"] if report else None
+
+    def register_many(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """取り込み結果をまとめて登録（code, company_name, report_url を含む辞書）
+
+        他プロセスの登録を上書きしないよう、読み込みから書き込みまでをファイルロックの下で行う。
+        """
+        entries = list(entries)
+        if not entries:
+            return 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            data = self._read_file()
+            companies = dict(data["companies"])
+            reports = dict(data["reports"])
+            for entry in entries:
+                if entry.get("company_name"):
+                    companies[entry["company_name"]] = entry["code"]
+                reports[entry["code"]] = {**entry, "registered_at": time.time()}
+
+            updated = {"companies": companies, "reports": reports}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(updated, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+            self._data = updated
+            self._mtime = os.stat(self.path).st_mtime
+        return len(entries)
+
+    def _read_file(self) -> Dict[str, Any]:
+        """ファイルの現在の内容を読む（更新日時による読み直しの判定を経ない）"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"companies": {}, "reports": {}}
+
+    def __len__(self) -> int:
+        return len(self._load()["reports"])
+
+
+company_registry = CompanyRegistry()
@@ -0,0 +1,32 @@
+from typing import Optional
+from urllib.parse import quote
+
+
+def make_etag(key: str, weak: bool = False) -> str:
+    """キャッシュキーからETagを生成（内容は同じでもバイト列が一致しない場合は弱いETag）"""
+    return f'W/"{key}"' if weak else f'"{key}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match ヘッダーがETagに一致するか判定"""
+    if not if_none_match:
+        return False
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        # If-None-Match は弱い比較（W/ の有無を問わずに一致を判定する）
+        if _opaque_tag(candidate) == _opaque_tag(etag):
+            return True
+
+    return False
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def attachment_header(filename: str) -> str:
+    """日本語ファイル名にも対応した Content-Disposition ヘッダー値を生成"""
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
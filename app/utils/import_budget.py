@@ -0,0 +1,81 @@
+"""アプリケーションのインポート時間を計測し、予算超過を検出する
+
+``python -X importtime`` で ``main`` を読み込んだ結果を集計する。
+CIなどで ``python -m app.utils.import_budget`` として実行し、予算を超えた場合は
+終了コード1を返す。
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import List, Tuple
+
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+# 起動時に読み込まず、初回利用時に読み込むモジュール
+HEAVY_MODULES = ("fitz", "google.generativeai", "reportlab", "yaml", "bs4", "requests", "numpy")
+
+
+def measure_import_time(module: str = "main") -> List[Tuple[str, int, int]]:
+    """新しいプロセスでモジュールを読み込み、(モジュール名, 自身の時間, 累積時間)[μs] を返す"""
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "import-budget-check")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True
+    )
+
+    timings = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            timings.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return timings
+
+
+def loaded_heavy_modules(timings: List[Tuple[str, int, int]]) -> List[str]:
+    """起動時に読み込まれてしまった HEAVY_MODULES（サブモジュールを含む）"""
+    names = {name for name, _, _ in timings}
+    return [
+        heavy for heavy in HEAVY_MODULES
+        if any(name == heavy or name.startswith(f"{heavy}.") for name in names)
+    ]
+
+
+def report(module: str, budget_ms: int, top: int) -> bool:
+    """計測結果を表示し、予算内ならTrueを返す"""
+    timings = measure_import_time(module)
+    total_ms = next((cumulative for name, _, cumulative in timings if name == module), 0) / 1000
+
+    print(f"=== インポート時間: {module} ===")
+    print(f"合計: {total_ms:.0f}ms（予算 {budget_ms}ms）")
+    print(f"--- 累積時間の上位{top}モジュール ---")
+    for name, own, cumulative in sorted(timings, key=lambda t: t[2], reverse=True)[:top]:
+        print(f"{cumulative / 1000:8.1f}ms  (自身 {own / 1000:6.1f}ms)  {name}")
+
+    heavy = loaded_heavy_modules(timings)
+    if heavy:
+        print(f"起動時に読み込まれた重いモジュール: {heavy}")
+    return total_ms <= budget_ms and not heavy
+
+
+def main() -> int:
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="インポート時間の予算チェック")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=int, default=settings.IMPORT_TIME_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    if report(args.module, args.budget_ms, args.top):
+        return 0
+    print("インポート時間が予算を超えています")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# コンテナのメモリ上限（cgroup v2 / v1）
+CGROUP_MEMORY_LIMIT_FILES = (
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+)
+# 上限なしを表す値（cgroup v1 はページ境界に丸めた巨大値を返す）
+UNLIMITED_THRESHOLD = 1 << 60
+
+
+def detect_memory_limit() -> Optional[int]:
+    """コンテナに割り当てられたメモリ量を取得（取得できない・無制限ならNone）"""
+    for path in CGROUP_MEMORY_LIMIT_FILES:
+        try:
+            with open(path, "r") as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < UNLIMITED_THRESHOLD:
+            return int(value)
+    return None
+
+
+def estimate_extraction_bytes(pdf_size: int) -> int:
+    """PDFのテキスト抽出中の推定メモリ量（fitzの文書と抽出結果）"""
+    return int(pdf_size * settings.MEMORY_ESTIMATE_EXTRACT_FACTOR)
+
+
+def estimate_text_bytes(chars: int) -> int:
+    """抽出済みテキスト（ページ・全文・検索インデックス）を保持する間の推定メモリ量"""
+    return chars * settings.MEMORY_ESTIMATE_TEXT_BYTES_PER_CHAR
+
+
+def estimate_render_bytes(chars: int) -> int:
+    """レポート描画中の推定メモリ量（reportlab は保存時まで全要素を保持する）"""
+    return settings.MEMORY_ESTIMATE_RENDER_BASE_BYTES + chars * settings.MEMORY_ESTIMATE_RENDER_BYTES_PER_CHAR
+
+
+class MemoryBudget:
+    """推定メモリ量（バイト）を単位とするセマフォ
+
+    PDFのダウンロード・テキスト抽出・レポート描画など、メモリを多く使う処理は
+    開始前に推定量を予約し、合計が上限を超える場合は先着順に待機する。
+    上限より大きい予約は、他に実行中の処理がなくなった時点で単独で通す。
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.in_use_bytes = 0
+        self.peak_bytes = 0
+        self._in_use_by_kind: Dict[str, int] = {}
+        self._active = 0
+        self._waiters: Deque[Tuple[int, str, asyncio.Future]] = deque()
+        self.admitted_count = 0
+        self.queued_count = 0
+        self.wait_seconds_total = 0.0
+
+    def _can_admit(self, nbytes: int) -> bool:
+        return self._active == 0 or self.in_use_bytes + nbytes <= self.limit_bytes
+
+    def _admit(self, nbytes: int, kind: str) -> None:
+        self._active += 1
+        self.in_use_bytes += nbytes
+        self.peak_bytes = max(self.peak_bytes, self.in_use_bytes)
+        self._in_use_by_kind[kind] = self._in_use_by_kind.get(kind, 0) + nbytes
+        self.admitted_count += 1
+
+    async def acquire(self, nbytes: int, kind: str) -> None:
+        """推定量を予約（空きがなければ待機）"""
+        # 先に待っている処理を追い越さない（大きな予約が飢餓状態にならないように）
+        if not self._waiters and self._can_admit(nbytes):
+            self._admit(nbytes, kind)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((nbytes, kind, future))
+        self.queued_count += 1
+        started = time.monotonic()
+        logger.info(f"メモリ予算待ち: {kind} {nbytes} bytes（使用中 {self.in_use_bytes}/{self.limit_bytes}）")
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 割り当て後に取り消された場合は予約を返却する
+                self.release(nbytes, kind)
+            else:
+                self._dispatch()
+            raise
+        finally:
+            self.wait_seconds_total += time.monotonic() - started
+
+    def release(self, nbytes: int, kind: str) -> None:
+        """予約を返却し、待機中の処理を先着順に通す"""
+        self._active -= 1
+        self.in_use_bytes -= nbytes
+        self._in_use_by_kind[kind] -= nbytes
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._waiters:
+            nbytes, kind, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._can_admit(nbytes):
+                return
+            self._waiters.popleft()
+            self._admit(nbytes, kind)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int, kind: str) -> AsyncIterator[None]:
+        """ブロックの間だけ推定量を予約する"""
+        nbytes = max(0, int(nbytes))
+        await self.acquire(nbytes, kind)
+        try:
+            yield
+        finally:
+            self.release(nbytes, kind)
+
+    def stats(self) -> Dict[str, Any]:
+        """現在の利用状況を返す"""
+        return {
+            "limit_bytes": self.limit_bytes,
+            "in_use_bytes": self.in_use_bytes,
+            "in_use_by_kind": {kind: used for kind, used in self._in_use_by_kind.items() if used},
+            "peak_bytes": self.peak_bytes,
+            "active": self._active,
+            "queued": sum(1 for _, _, future in self._waiters if not future.done()),
+            "admitted_count": self.admitted_count,
+            "queued_count": self.queued_count,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+        }
+
+
+_memory_budget: Optional[MemoryBudget] = None
+
+
+def get_memory_budget() -> MemoryBudget:
+    """プロセス共通のメモリ予算を取得（未設定ならコンテナのメモリ量から決める）"""
+    global _memory_budget
+    if _memory_budget is None:
+        limit = settings.MEMORY_BUDGET_BYTES
+        if not limit:
+            container_limit = detect_memory_limit()
+            limit = (
+                int(container_limit * settings.MEMORY_BUDGET_RATIO)
+                if container_limit else settings.MEMORY_BUDGET_FALLBACK_BYTES
+            )
+        _memory_budget = MemoryBudget(limit)
+    return _memory_budget
@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+from app.config import settings
+from app.utils.text_search import BM25Index
+
+
+@dataclass
+class Passage:
+    """報告書の一節（ページ番号は0始まり）"""
+    page: int
+    text: str
+
+
+def split_passages(pages: Sequence[str], max_chars: int) -> List[Passage]:
+    """ページを行単位でまとめ、おおよそmax_chars以下のパッセージに分割"""
+    passages = []
+    for page_number, page_text in enumerate(pages):
+        lines = []
+        length = 0
+        for line in page_text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if lines and length + len(line) > max_chars:
+                passages.append(Passage(page_number, "\n".join(lines)))
+                lines, length = [], 0
+            lines.append(line)
+            length += len(line) + 1
+        if lines:
+            passages.append(Passage(page_number, "\n".join(lines)))
+    return passages
+
+
+class PassageRetriever:
+    """報告書パッセージのBM25検索"""
+
+    def __init__(self, pages: Sequence[str]):
+        self.passages = split_passages(pages, settings.REPORT_RETRIEVAL_PASSAGE_CHARS)
+        self.index = BM25Index([p.text for p in self.passages])
+
+    def retrieve(self, query_terms: Sequence[str], top_k: int, max_chars: int) -> str:
+        """問い合わせ語に関連する上位パッセージを報告書の順序で連結して返す"""
+        selected = []
+        total = 0
+        for passage_id in self.index.top_k(" ".join(query_terms), top_k):
+            length = len(self.passages[passage_id].text)
+            if selected and total + length > max_chars:
+                break
+            selected.append(passage_id)
+            total += length
+
+        return self._format(selected, max_chars)
+
+    def retrieve_union(self, queries: Sequence[Tuple[Sequence[str], int]], max_chars: int) -> str:
+        """複数の問い合わせの上位パッセージを重複なく、報告書の順序で連結して返す
+
+        各問い合わせの順位を1位から順に交互に採用し、どの観点も文字数上限内に
+        含まれるようにする。
+        """
+        rankings = [self.index.top_k(" ".join(terms), top_k) for terms, top_k in queries]
+        selected = []
+        seen = set()
+        total = 0
+        for rank in range(max((len(r) for r in rankings), default=0)):
+            for ranking in rankings:
+                if rank >= len(ranking) or ranking[rank] in seen:
+                    continue
+                length = len(self.passages[ranking[rank]].text)
+                if selected and total + length > max_chars:
+                    continue
+                seen.add(ranking[rank])
+                selected.append(ranking[rank])
+                total += length
+
+        return self._format(selected, max_chars)
+
+    def _format(self, passage_ids: Sequence[int], max_chars: int) -> str:
+        """パッセージをページ番号つきで報告書の順序に連結"""
+        return "\n\n".join(
+            f"[p.{self.passages[i].page + 1}]\n{self.passages[i].text}"
+            for i in sorted(passage_ids)
+        )[:max_chars]
+
+
+_retriever_cache: "OrderedDict[str, PassageRetriever]" = OrderedDict()
+_retriever_lock = threading.Lock()
+
+
+def get_passage_retriever(report_key: str, pages: Sequence[str]) -> PassageRetriever:
+    """報告書ごとの検索インデックスを取得（直近分のみメモリに保持）"""
+    with _retriever_lock:
+        retriever = _retriever_cache.get(report_key)
+        if retriever is not None:
+            _retriever_cache.move_to_end(report_key)
+            return retriever
+
+    retriever = PassageRetriever(pages)
+
+    with _retriever_lock:
+        _retriever_cache[report_key] = retriever
+        while len(_retriever_cache) > settings.REPORT_RETRIEVAL_CACHE_SIZE:
+            _retriever_cache.popitem(last=False)
+    return retriever
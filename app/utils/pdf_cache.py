@@ -0,0 +1,47 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.utils.cache_backend import CacheBackend, get_cache_backend
+
+
+class PDFCache:
+    """生成済みPDFのキャッシュ（合計サイズ上限つき、保存先はキャッシュバックエンド）"""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    @property
+    def max_entry_bytes(self) -> int:
+        return self.backend.max_entry_bytes
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """リクエスト内容からキャッシュキー（SHA-256）を生成"""
+        canonical = json.dumps(
+            payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """キャッシュからPDFを取得"""
+        return self.backend.get(key)
+
+    def put(self, key: str, data: bytes) -> None:
+        """PDFをキャッシュに格納（上限を超えた分はバックエンドが古い順に破棄）"""
+        self.backend.set(key, data)
+
+
+_pdf_cache: Optional[PDFCache] = None
+
+
+def get_pdf_cache() -> PDFCache:
+    """プロセス共通のPDFキャッシュを取得（バックエンドは初回利用時に用意し、起動時には接続しない）"""
+    global _pdf_cache
+    if _pdf_cache is None:
+        _pdf_cache = PDFCache(get_cache_backend(
+            "pdf",
+            max_bytes=settings.PDF_CACHE_MAX_BYTES,
+            max_entry_bytes=settings.PDF_CACHE_MAX_ENTRY_BYTES
+        ))
+    return _pdf_cache
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+from app.config import settings
+from app.utils.traffic_recorder import record_download, restore_download
+
+
+# 使用中（ダウンロード・テキスト抽出中）のキャッシュファイルと利用数。整理の対象から外す
+_leases: Counter = Counter()
+_leases_lock = threading.Lock()
+
+
+class PDFDownloader:
+    """有価証券報告書PDFをディスクへストリーミング保存するダウンローダー"""
+
+    def __init__(self):
+        self.headers = {"User-Agent": "Mozilla/5.0"}
+        self.cache_dir = settings.PDF_DOWNLOAD_DIR
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cache_path(self, pdf_url: str) -> str:
+        """URLに対応するキャッシュファイルのパスを取得"""
+        digest = hashlib.sha256(pdf_url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.pdf")
+
+    @contextmanager
+    def lease(self, pdf_url: str) -> Iterator[None]:
+        """ブロック内ではこのURLのキャッシュファイルを整理で削除させない（抽出ワーカーが開き直すため）"""
+        path = self.cache_path(pdf_url)
+        with _leases_lock:
+            _leases[path] += 1
+        try:
+            yield
+        finally:
+            with _leases_lock:
+                _leases[path] -= 1
+                if _leases[path] <= 0:
+                    del _leases[path]
+
+    def download(self, pdf_url: str) -> str:
+        """PDFをチャンク単位でファイルに保存し、そのパスを返す"""
+        import requests
+
+        path = self.cache_path(pdf_url)
+        if os.path.exists(path):
+            # 最近使ったファイルとして更新日時を進める（古い順に削除するため）
+            os.utime(path)
+            record_download(pdf_url, path, 0.0)
+            return path
+        if restore_download(pdf_url, path):
+            return path
+
+        started = time.perf_counter()
+        max_bytes = settings.PDF_MAX_DOWNLOAD_BYTES
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f, requests.get(
+                pdf_url,
+                headers=self.headers,
+                stream=True,
+                timeout=settings.PDF_DOWNLOAD_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+
+                content_length = int(response.headers.get("Content-Length") or 0)
+                if content_length > max_bytes:
+                    raise Exception(f"PDFサイズが上限を超えています: {content_length} bytes（上限 {max_bytes} bytes）")
+
+                total = 0
+                for chunk in response.iter_content(chunk_size=settings.PDF_DOWNLOAD_CHUNK_SIZE):
+                    total += len(chunk)
+                    if total > max_bytes:
+                        raise Exception(f"PDFサイズが上限（{max_bytes} bytes）を超えています")
+                    f.write(chunk)
+
+            # 書き込み完了後に置き換え、途中状態のファイルを読ませない
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        record_download(pdf_url, path, time.perf_counter() - started)
+        self._prune()
+        return path
+
+    def _prune(self) -> None:
+        """キャッシュ合計サイズが上限を超えた場合に古いファイルから削除（使用中のファイルは残す）"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pdf"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        with _leases_lock:
+            leased = set(_leases)
+        for _, size, path in sorted(entries):
+            if total <= settings.PDF_DOWNLOAD_CACHE_MAX_BYTES:
+                break
+            if path in leased:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,108 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple, Union
+from app.config import settings
+
+# PDFの入力元（ファイルパスまたはバイト列）
+PDFSource = Union[str, bytes]
+
+
+@dataclass
+class ExtractionResult:
+    """テキスト抽出結果"""
+    pages: List[str]
+    page_timings: List[float]
+    elapsed: float
+
+    @property
+    def text(self) -> str:
+        """全ページのテキストを連結して返す"""
+        return "".join(self.pages)
+
+    def slowest_pages(self, count: int = 3) -> List[Tuple[int, float]]:
+        """抽出に時間のかかったページ（1始まりのページ番号, 秒）を返す"""
+        ranked = sorted(enumerate(self.page_timings, 1), key=lambda item: item[1], reverse=True)
+        return ranked[:count]
+
+
+def _open_document(source: PDFSource) -> Any:
+    """パスまたはバイト列からPDFを開く（PyMuPDFはワーカー側でのみ読み込む）"""
+    import fitz  # PyMuPDF
+
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def _count_pages(source: PDFSource) -> int:
+    """ページ数を取得（ワーカープロセスで実行）"""
+    with _open_document(source) as doc:
+        return len(doc)
+
+
+def _extract_page_range(source: PDFSource, start: int, end: int) -> List[Tuple[str, float]]:
+    """指定範囲のページからテキストを抽出（ワーカープロセスで実行）"""
+    results = []
+    with _open_document(source) as doc:
+        for page_number in range(start, end):
+            started = time.perf_counter()
+            text = doc[page_number].get_text()
+            results.append((text, time.perf_counter() - started))
+    return results
+
+
+class PDFTextExtractor:
+    """プロセスプールでページ範囲ごとに並列実行するPDFテキスト抽出"""
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls) -> ProcessPoolExecutor:
+        """共有プロセスプールを取得（初回のみ生成）"""
+        with cls._executor_lock:
+            if cls._executor is None:
+                # gRPCなどのスレッドを抱えた親プロセスをforkしないようspawnを使用
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=settings.PDF_EXTRACT_WORKERS or None,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return cls._executor
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """共有プロセスプールを停止"""
+        with cls._executor_lock:
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
+
+    async def extract(self, source: PDFSource) -> ExtractionResult:
+        """PDFの全ページからテキストを抽出"""
+        loop = asyncio.get_running_loop()
+        executor = self.get_executor()
+        started = time.perf_counter()
+
+        page_count = await loop.run_in_executor(executor, _count_pages, source)
+
+        # ページ範囲に分割して並列抽出し、最後に一度だけ結合する
+        pages_per_task = max(1, settings.PDF_EXTRACT_PAGES_PER_TASK)
+        chunks = await asyncio.gather(*[
+            loop.run_in_executor(
+                executor, _extract_page_range, source, start, min(start + pages_per_task, page_count)
+            )
+            for start in range(0, page_count, pages_per_task)
+        ])
+
+        pages = [text for chunk in chunks for text, _ in chunk]
+        page_timings = [elapsed for chunk in chunks for _, elapsed in chunk]
+
+        return ExtractionResult(
+            pages=pages,
+            page_timings=page_timings,
+            elapsed=time.perf_counter() - started
+        )
@@ -0,0 +1,48 @@
+import asyncio
+import importlib
+import logging
+import time
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 初回リクエストで読み込まれる重いモジュール（起動直後に読み込んでおく）
+PREWARM_MODULES = [
+    "yaml",
+    "requests",
+    "bs4",
+    "numpy",
+    "fitz",
+    "google.generativeai",
+    "reportlab.platypus",
+    "app.utils.text_search",
+    "app.services.pdf_service",
+]
+
+
+def _prewarm_sync() -> None:
+    """モジュールの読み込みとカタログの構築を行う（スレッドで実行）"""
+    for module_name in PREWARM_MODULES:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            logger.warning(f"事前読み込み失敗: {module_name}: {e}")
+            continue
+        logger.info(f"事前読み込み: {module_name} ({(time.perf_counter() - started) * 1000:.0f}ms)")
+
+    from app.services.solution_service import SolutionService
+    SolutionService().get_catalog().index
+
+
+async def prewarm() -> None:
+    """サーバーがリクエスト受付を開始した後に、バックグラウンドで事前読み込みを行う"""
+    # startup イベントの完了（＝受付開始）を待ってから開始する
+    await asyncio.sleep(settings.PREWARM_DELAY_SECONDS)
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(_prewarm_sync)
+    except Exception as e:
+        logger.warning(f"事前読み込みエラー: {e}")
+        return
+    logger.info(f"事前読み込み完了: {(time.perf_counter() - started) * 1000:.0f}ms")
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Dict, List, Optional
+from app.config import settings
+
+# 有価証券報告書の見出し（例：【事業等のリスク】）
+SECTION_PATTERN = re.compile(r"^\s*【([^】]{1,40})】\s*$", re.MULTILINE)
+
+STORE_FORMAT_VERSION = 1
+
+
+class ReportTextStore:
+    """抽出済み報告書テキストの永続ストア（ページ単位圧縮＋オフセット索引）
+
+    1文書につき、ページごとにzlib圧縮したデータを連結した ``.bin`` と、
+    各ページのオフセット・長さと見出し位置を記録した ``.json`` を保存する。
+    読み出し時は ``.bin`` をメモリマップし、必要なページだけを展開する。
+    ``.bin`` は保存のたびに別名で書き、索引が指すファイルを切り替える
+    （書き直し中に読んでも、索引とデータの組み合わせが食い違わない）。
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.REPORT_TEXT_STORE_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self._index_cache: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(source_id: str) -> str:
+        """報告書の識別子（PDF URLなど）からストアのキーを生成"""
+        return hashlib.sha256(source_id.encode("utf-8")).hexdigest()
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def _data_path(self, key: str, index: Dict[str, Any]) -> str:
+        # data_file のない索引は、データを固定名で保存していた頃のもの
+        return os.path.join(self.root, index.get("data_file") or f"{key}.bin")
+
+    def has(self, key: str) -> bool:
+        """文書が保存済みか判定"""
+        return self._load_index(key) is not None
+
+    def put(self, key: str, pages: List[str], source: str = "") -> Dict[str, Any]:
+        """ページ単位のテキストを圧縮して保存"""
+        index_path = self._index_path(key)
+        data_file = f"{key}.{uuid.uuid4().hex[:12]}.bin"
+        offsets = []
+        sections = []
+        position = 0
+        raw_chars = 0
+
+        fd, tmp_data_path = tempfile.mkstemp(dir=self.root, prefix=f"{key}.", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            for page_number, text in enumerate(pages):
+                blob = zlib.compress(text.encode("utf-8"), settings.REPORT_TEXT_STORE_COMPRESSION_LEVEL)
+                f.write(blob)
+                offsets.append([position, len(blob)])
+                position += len(blob)
+                raw_chars += len(text)
+
+                for match in SECTION_PATTERN.finditer(text):
+                    sections.append({"title": match.group(1), "page": page_number})
+
+        index = {
+            "version": STORE_FORMAT_VERSION,
+            "source": source,
+            "data_file": data_file,
+            "created_at": time.time(),
+            "raw_chars": raw_chars,
+            "compressed_bytes": position,
+            "pages": offsets,
+            "sections": sections
+        }
+
+        # データを新しい名前で確定させ、索引の置き換えをもって保存完了とする
+        previous = self._read_index_file(key)
+        os.replace(tmp_data_path, os.path.join(self.root, data_file))
+        fd, tmp_index_path = tempfile.mkstemp(dir=self.root, prefix=f"{key}.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_index_path, index_path)
+
+        with self._lock:
+            self._index_cache[key] = index
+        if previous is not None and self._data_path(key, previous) != self._data_path(key, index):
+            # 読み出し中のプロセスは開いたファイルをそのまま読める。古い索引を持つ場合は読み直す
+            try:
+                os.remove(self._data_path(key, previous))
+            except FileNotFoundError:
+                pass
+        return index
+
+    def _read_index_file(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._index_path(key), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get("version") != STORE_FORMAT_VERSION:
+            return None
+        return index
+
+    def _load_index(self, key: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """索引を読み込み（メモリ上にキャッシュ。refresh 指定時はファイルから読み直す）"""
+        if not refresh:
+            with self._lock:
+                index = self._index_cache.get(key)
+            if index is not None:
+                return index
+
+        index = self._read_index_file(key)
+        if index is None or not os.path.exists(self._data_path(key, index)):
+            with self._lock:
+                self._index_cache.pop(key, None)
+            return None
+
+        with self._lock:
+            self._index_cache[key] = index
+        return index
+
+    def page_count(self, key: str) -> int:
+        """保存済みページ数を取得"""
+        index = self._load_index(key)
+        return len(index["pages"]) if index else 0
+
+    def sections(self, key: str) -> List[Dict[str, Any]]:
+        """見出しとその開始ページ（0始まり）の一覧を取得"""
+        index = self._load_index(key)
+        return list(index["sections"]) if index else []
+
+    def read_pages(self, key: str, start: int = 0, end: Optional[int] = None) -> Optional[List[str]]:
+        """指定範囲のページテキストを読み出し（未保存の場合はNone）"""
+        index = self._load_index(key)
+        if index is None:
+            return None
+
+        offsets = index["pages"][start:end]
+        if not offsets:
+            return []
+
+        try:
+            f = open(self._data_path(key, index), "rb")
+        except FileNotFoundError:
+            # 他のプロセスが書き直して古いデータを削除した場合は、新しい索引で読み直す
+            index = self._load_index(key, refresh=True)
+            if index is None:
+                return None
+            offsets = index["pages"][start:end]
+            f = open(self._data_path(key, index), "rb")
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ["" for _ in offsets]
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return [
+                    zlib.decompress(mapped[offset:offset + length]).decode("utf-8")
+                    for offset, length in offsets
+                ]
+
+    def read_text(self, key: str, start: int = 0, end: Optional[int] = None) -> Optional[str]:
+        """指定範囲のページテキストを連結して読み出し"""
+        pages = self.read_pages(key, start, end)
+        return None if pages is None else "".join(pages)
+
+    def read_section(self, key: str, title: str) -> Optional[str]:
+        """見出しを含むページから次の見出しのページまでを読み出し"""
+        sections = self.sections(key)
+        for i, section in enumerate(sections):
+            if title in section["title"]:
+                end = sections[i + 1]["page"] + 1 if i + 1 < len(sections) else None
+                return self.read_text(key, section["page"], end)
+        return None
@@ -0,0 +1,42 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+from app.config import settings
+from app.utils.cache_backend import CacheBackend, get_cache_backend
+
+
+@dataclass
+class ReportURLEntry:
+    """企業コードから解決した報告書PDFのURL（見つからなかった場合はNone）"""
+    pdf_url: Optional[str]
+    resolved_at: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.resolved_at
+
+    @property
+    def is_stale(self) -> bool:
+        """再検証の時期を過ぎているか（期限切れまでは値をそのまま返してよい）"""
+        return self.age >= settings.REPORT_URL_REVALIDATE_AFTER_SECONDS
+
+
+class ReportURLCache:
+    """企業コード→報告書PDF URLの解決結果キャッシュ（保存先はキャッシュバックエンド）"""
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend or get_cache_backend(
+            "report_urls", default_ttl=settings.REPORT_URL_CACHE_TTL_SECONDS
+        )
+
+    def get(self, code: str) -> Optional[ReportURLEntry]:
+        """保存済みの解決結果を取得（期限切れ・未保存はNone）"""
+        data = self.backend.get_json(code)
+        if not data:
+            return None
+        return ReportURLEntry(pdf_url=data.get("pdf_url"), resolved_at=data["resolved_at"])
+
+    def put(self, code: str, pdf_url: Optional[str]) -> None:
+        """解決結果を保存（見つからなかった結果は短い期限で保存）"""
+        ttl = None if pdf_url else settings.REPORT_URL_NEGATIVE_TTL_SECONDS
+        self.backend.set_json(code, {"pdf_url": pdf_url, "resolved_at": time.time()}, ttl=ttl)
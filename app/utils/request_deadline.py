@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from fastapi import HTTPException, Request
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 現在のリクエストの期限（time.monotonic() の値。期限なしはNone）
+current_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+
+class SharedDeadline:
+    """複数の呼び出し元が相乗りする処理の期限（待っている呼び出し元のうち最も遅い期限に合わせる）
+
+    期限のない呼び出し元が相乗りすると期限なしになる。
+    相乗りした処理から入れ子で相乗りした処理は、外側の延長も反映する。
+    """
+
+    def __init__(self, deadline: Optional[float], parent: Optional["SharedDeadline"] = None):
+        self._deadline = deadline
+        self._parent = parent
+
+    @property
+    def deadline(self) -> Optional[float]:
+        if self._parent is not None:
+            return _later(self._deadline, self._parent.deadline)
+        return self._deadline
+
+    def extend_to(self, deadline: Optional[float]) -> None:
+        """待っている呼び出し元の期限がより遅ければ、処理全体の期限をそこまで延ばす"""
+        self._deadline = _later(self._deadline, deadline)
+
+
+def _later(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    if a is None or b is None:
+        return None
+    return max(a, b)
+
+
+# 相乗りされている処理の期限（設定時は current_deadline より優先して使う）
+shared_deadline: ContextVar[Optional[SharedDeadline]] = ContextVar("request_shared_deadline", default=None)
+
+# 期限を指定するヘッダー（秒数）
+TIMEOUT_HEADER = "X-Request-Timeout"
+# クライアントが切断した場合のステータス（nginx の慣例。クライアントには届かない）
+CLIENT_CLOSED_REQUEST = 499
+
+
+class DeadlineExceeded(Exception):
+    """リクエストの期限を過ぎた"""
+
+
+def effective_deadline() -> Optional[float]:
+    """このコンテキストの処理に適用する期限（time.monotonic() の値。期限なしはNone）"""
+    shared = shared_deadline.get()
+    return shared.deadline if shared is not None else current_deadline.get()
+
+
+def remaining_seconds() -> Optional[float]:
+    """現在のリクエストの残り時間（期限なしはNone）"""
+    deadline = effective_deadline()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(stage: str) -> None:
+    """期限を過ぎていれば、この段を開始せずに DeadlineExceeded を送出"""
+    remaining = remaining_seconds()
+    if remaining is not None and remaining <= 0:
+        record_cancellation("deadline_before_stage", stage)
+        raise DeadlineExceeded(f"リクエストの期限を過ぎたため {stage} を中止しました")
+
+
+def resolve_timeout(path: str, header_value: Optional[str]) -> Optional[float]:
+    """エンドポイントの設定値とヘッダーから期限（秒）を決める（上限は REQUEST_TIMEOUT_MAX_SECONDS）"""
+    timeout = settings.REQUEST_TIMEOUTS.get(path)
+    if header_value:
+        try:
+            timeout = float(header_value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{TIMEOUT_HEADER} は秒数で指定してください")
+        if timeout <= 0:
+            raise HTTPException(status_code=400, detail=f"{TIMEOUT_HEADER} は正の値で指定してください")
+    if timeout is None:
+        return None
+    return min(timeout, settings.REQUEST_TIMEOUT_MAX_SECONDS)
+
+
+# 取り消しの累計（理由別・エンドポイントや段別）
+_cancellations: Counter = Counter()
+_cancellations_by_target: Counter = Counter()
+_cancellations_lock = threading.Lock()
+
+
+def record_cancellation(reason: str, target: str) -> None:
+    with _cancellations_lock:
+        _cancellations[reason] += 1
+        _cancellations_by_target[f"{reason}:{target}"] += 1
+
+
+def cancellation_stats() -> Dict[str, Any]:
+    """取り消しの累計"""
+    with _cancellations_lock:
+        return {"by_reason": dict(_cancellations), "by_target": dict(_cancellations_by_target)}
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(settings.REQUEST_DISCONNECT_POLL_SECONDS)
+
+
+async def run_with_deadline(request: Request, work: Callable[[], Awaitable[T]]) -> T:
+    """期限とクライアントの切断を監視しながら処理を実行する
+
+    期限はエンドポイントごとの設定か X-Request-Timeout ヘッダーで決まり、処理内では
+    current_deadline として参照できる。期限切れ・切断時は処理を取り消し、
+    待機中・未開始の段（Gemini呼び出しなど）は実行されない。
+    """
+    path = request.url.path
+    timeout = resolve_timeout(path, request.headers.get(TIMEOUT_HEADER))
+
+    token = current_deadline.set(time.monotonic() + timeout if timeout else None)
+    try:
+        # タスクは現在のコンテキスト（期限）を引き継ぐ
+        task = asyncio.ensure_future(work())
+    finally:
+        current_deadline.reset(token)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+
+    try:
+        done, _ = await asyncio.wait({task, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if task in done:
+            return task.result()
+
+        reason = "disconnect" if watcher in done else "deadline"
+        task.cancel()
+        record_cancellation(reason, path)
+        logger.warning(f"リクエストを取り消し（{reason}）: {path}")
+        # 取り消しが各段に伝わるのを待つ（実行枠・予約の返却）
+        await asyncio.gather(task, return_exceptions=True)
+
+        if reason == "deadline":
+            raise HTTPException(status_code=504, detail=f"リクエストの期限（{timeout:g}秒）を過ぎたため処理を中止しました")
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="クライアントが切断したため処理を中止しました")
+    finally:
+        watcher.cancel()
+        if not task.done():
+            # このハンドラ自体が取り消された場合
+            task.cancel()
@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+from app.services.gemini_scheduler import SharedPriority, effective_priority, shared_priority
+from app.utils.request_deadline import SharedDeadline, effective_deadline, record_cancellation, shared_deadline
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """同じキーの処理を1つにまとめる（実行中なら後から来た呼び出しはその結果を待つ）
+
+    処理は最初の呼び出し元のコンテキストを引き継いだタスクとして実行する。
+    リクエストの期限は待っている呼び出し元のうち最も遅いものに合わせ、相乗りで延ばす
+    （先に期限が来る呼び出し元に合わせて、他の呼び出し元の処理まで打ち切らないため）。
+    Geminiの優先レーンは待っている呼び出し元のうち最も優先のものに合わせる
+    （先読みの処理に対話リクエストが相乗りしたら、以降の呼び出しを対話レーンで行う）。
+    待っている呼び出し元が取り消されても、共有している処理は取り消さない。
+    cancel_when_abandoned 指定時は、待っている呼び出し元が全員取り消された時点で処理も取り消す。
+    """
+
+    def __init__(self, cancel_when_abandoned: bool = False):
+        self._tasks: Dict[Hashable, "asyncio.Task[T]"] = {}
+        # 処理ごとの、結果を待っている呼び出し元の数
+        self._waiters: Dict["asyncio.Task[T]", int] = {}
+        self._priorities: Dict["asyncio.Task[T]", SharedPriority] = {}
+        self._deadlines: Dict["asyncio.Task[T]", SharedDeadline] = {}
+        self._cancel_when_abandoned = cancel_when_abandoned
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """キーの処理を実行（実行中なら相乗り）して結果を返す"""
+        task = self._tasks.get(key)
+        if task is None:
+            priority = SharedPriority(effective_priority(), parent=shared_priority.get())
+            deadline = SharedDeadline(effective_deadline(), parent=shared_deadline.get())
+            context = contextvars.copy_context()
+            context.run(shared_priority.set, priority)
+            context.run(shared_deadline.set, deadline)
+            task = context.run(asyncio.ensure_future, factory())
+            self._tasks[key] = task
+            self._priorities[task] = priority
+            self._deadlines[task] = deadline
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self._priorities[task].raise_to(effective_priority())
+            self._deadlines[task].extend_to(effective_deadline())
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and self._cancel_when_abandoned and not task.done():
+                # 結果を待つ呼び出し元がいなくなったため、残りの処理（Gemini呼び出しなど）を行わない
+                task.cancel()
+                record_cancellation("abandoned", "single_flight")
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if self._waiters[task] == 0:
+                del self._waiters[task]
+
+    def _forget(self, key: Hashable, task: "asyncio.Task[T]") -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        self._priorities.pop(task, None)
+        self._deadlines.pop(task, None)
+        # 待っている呼び出し元がいない場合も、未取得の例外として警告させない
+        if not task.cancelled():
+            task.exception()
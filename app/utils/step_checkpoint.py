@@ -0,0 +1,28 @@
+import hashlib
+from typing import Optional
+from app.config import settings
+from app.utils.cache_backend import CacheBackend, get_cache_backend
+
+
+class StepCheckpointStore:
+    """段階的要約の各ステップ結果を保存するチェックポイントストア"""
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend or get_cache_backend(
+            "summary_checkpoints", default_ttl=settings.CHECKPOINT_TTL_SECONDS
+        )
+
+    @staticmethod
+    def make_key(report_id: str, company_name: str, step_name: str, prompt_version: str) -> str:
+        """報告書・企業・ステップ・プロンプト版数からキーを生成"""
+        raw = "\n".join([report_id, company_name, step_name, prompt_version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """保存済みのステップ結果を取得（期限切れ・未保存はNone）"""
+        value = self.backend.get(key)
+        return value.decode("utf-8") if value else None
+
+    def put(self, key: str, text: str) -> None:
+        """ステップ結果を保存"""
+        self.backend.set(key, text.encode("utf-8"))
@@ -0,0 +1,243 @@
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set
+from app.config import settings
+from app.utils.report_text_store import SECTION_PATTERN
+
+# ヘッダー・フッターの候補とするページ先頭・末尾の行数と、行の最大文字数
+EDGE_LINES = 3
+EDGE_MAX_CHARS = 80
+# ページ番号のみの行（例: 12 / - 12 - / （12） / 12/150）
+PAGE_NUMBER_PATTERN = re.compile(r"^[\s\-－―—–(（]*\d{1,4}(?:\s*/\s*\d{1,4})?[\s\-－―—–)）]*$")
+# 装飾のない数字だけの行（表の数値セルの可能性がある）
+BARE_NUMBER_PATTERN = re.compile(r"^[0-9０-９]+$")
+# ページ番号を含むヘッダー・フッターは数字の違いを無視して比較する
+DIGITS_PATTERN = re.compile(r"[0-9０-９]+")
+# 連続する空白（全角空白・タブを含む）
+SPACES_PATTERN = re.compile(r"[ \t　 ]+")
+# 文末・見出し末尾（この後ろでは改行を残す）
+LINE_END_CHARS = "。．！？!?」』）)】:："
+# 行頭が箇条書き・見出し・番号付き項目の場合は前の行と結合しない
+LINE_START_PATTERN = re.compile(
+    r"^(?:[・●○■□◆◇▶►※＊*\-－【第]|[①-⑳]|[(（]?[0-9０-９a-zA-Zａ-ｚア-ン一二三四五六七八九十]{1,3}[)）.．、]\s*)"
+)
+# 数値のみのセル（例: 1,234 / △56 / 12.3% / －）
+NUMERIC_CELL_PATTERN = re.compile(r"^(?:[△▲\-－+]?[0-9０-９][0-9０-９,，.．]*[%％]?|[－\-―—]|[(（][0-9０-９,，.．]+[)）])$")
+CJK_PATTERN = re.compile(r"[぀-ヿ㐀-鿿！-｠]")
+# 折り返しとみなす行の長さ（ページ内の行幅に対する割合）
+WRAP_WIDTH_RATIO = 0.8
+
+
+@dataclass
+class NormalizationResult:
+    """正規化後のページと削減量"""
+    pages: List[str]
+    raw_chars: int
+    normalized_chars: int
+    removed_edge_lines: int
+    joined_lines: int
+    compacted_cells: int
+
+    @property
+    def reduction_ratio(self) -> float:
+        """削減された文字数の割合"""
+        return 1 - self.normalized_chars / self.raw_chars if self.raw_chars else 0.0
+
+    def summary_line(self) -> str:
+        return (
+            f"{self.raw_chars} → {self.normalized_chars} 文字（{self.reduction_ratio:.1%} 削減,"
+            f" ヘッダー・フッター {self.removed_edge_lines} 行, 行結合 {self.joined_lines},"
+            f" 数値セル圧縮 {self.compacted_cells}）"
+        )
+
+
+def _follows_page_sequence(line: str, page_index: int, page_offset: Optional[int]) -> bool:
+    """行内の数値がページの通し番号（ページ位置 + 全体で共通のずれ）と一致するか"""
+    if page_offset is None:
+        return False
+    return any(int(digits) - page_index == page_offset for digits in DIGITS_PATTERN.findall(line))
+
+
+def _edge_key(line: str, page_index: int, page_offset: Optional[int]) -> str:
+    # ページ番号を含むヘッダー・フッター（例: 有価証券報告書 12）だけは数字の違いを無視して比較する
+    key = SPACES_PATTERN.sub("", line)
+    if _follows_page_sequence(line, page_index, page_offset):
+        return DIGITS_PATTERN.sub("#", key)
+    return key
+
+
+def _edge_indexes(lines: Sequence[str]) -> List[int]:
+    """ページ先頭・末尾の空でない行のうち、短い行の位置"""
+    non_empty = [i for i, line in enumerate(lines) if line]
+    return [i for i in non_empty[:EDGE_LINES] + non_empty[-EDGE_LINES:] if len(lines[i]) <= EDGE_MAX_CHARS]
+
+
+def _repeat_threshold(page_count: int) -> float:
+    return max(settings.TEXT_NORMALIZATION_MIN_REPEAT_PAGES, page_count * settings.TEXT_NORMALIZATION_REPEAT_RATIO)
+
+
+def _page_number_offset(pages_lines: Sequence[List[str]]) -> Optional[int]:
+    """ページ先頭・末尾の数値がページ位置と同じ差で並んでいれば、その差（ページ番号のずれ）を返す"""
+    counts: Counter = Counter()
+    for page_index, lines in enumerate(pages_lines):
+        counts.update({
+            int(digits) - page_index
+            for i in _edge_indexes(lines) for digits in DIGITS_PATTERN.findall(lines[i]) if len(digits) <= 4
+        })
+    if not counts:
+        return None
+    offset, count = counts.most_common(1)[0]
+    return offset if count >= _repeat_threshold(len(pages_lines)) else None
+
+
+def _repeated_edge_keys(pages_lines: Sequence[List[str]], page_offset: Optional[int]) -> Set[str]:
+    """多くのページの先頭・末尾に現れる行（ヘッダー・フッター）を検出"""
+    counts: Counter = Counter()
+    for page_index, lines in enumerate(pages_lines):
+        # 【事業等のリスク】などの見出しと、表の数値セルは繰り返し現れても残す
+        counts.update({
+            _edge_key(lines[i], page_index, page_offset) for i in _edge_indexes(lines)
+            if not SECTION_PATTERN.match(lines[i]) and not NUMERIC_CELL_PATTERN.match(lines[i])
+        })
+    threshold = _repeat_threshold(len(pages_lines))
+    return {key for key, count in counts.items() if key and count >= threshold}
+
+
+def _is_page_number(line: str, page_index: int, page_offset: Optional[int]) -> bool:
+    """ページ番号のみの行か（装飾のない数字だけの行は、ページの通し番号と一致する場合のみ）"""
+    if not PAGE_NUMBER_PATTERN.match(line):
+        return False
+    return not BARE_NUMBER_PATTERN.match(line) or _follows_page_sequence(line, page_index, page_offset)
+
+
+def _wrap_width(lines: Sequence[str]) -> int:
+    """ページ内の本文の行幅（数値のみの行を除いた行の長さの上位10%）"""
+    lengths = sorted(len(line) for line in lines if line and not NUMERIC_CELL_PATTERN.match(line))
+    return lengths[int(len(lengths) * 0.9)] if lengths else 0
+
+
+def _should_join(previous: str, line: str, wrap_width: int) -> bool:
+    """折り返された文の続きとして前の行に結合するか（前の行が行幅いっぱいまである場合のみ）"""
+    if not previous or not line or len(previous) < wrap_width * WRAP_WIDTH_RATIO:
+        return False
+    if previous[-1] in LINE_END_CHARS or LINE_START_PATTERN.match(line):
+        return False
+    if NUMERIC_CELL_PATTERN.match(previous) or NUMERIC_CELL_PATTERN.match(line):
+        return False
+    return True
+
+
+def _join(previous: str, line: str) -> str:
+    # 和文同士は詰め、英数字同士は空白で区切る
+    if CJK_PATTERN.match(previous[-1]) or CJK_PATTERN.match(line[0]):
+        return previous + line
+    return f"{previous} {line}"
+
+
+def _compact_numeric_runs(lines: List[str]) -> List[str]:
+    """1セル1行に分かれた数値の並びを、直前の項目名の行にまとめる（例: 売上高 1,234 1,456）"""
+    compacted = []
+    run: List[str] = []
+
+    def flush() -> None:
+        if len(run) >= 2 and compacted and compacted[-1] and not NUMERIC_CELL_PATTERN.match(compacted[-1]):
+            compacted[-1] = f"{compacted[-1]} {' '.join(run)}"
+        elif len(run) >= 2:
+            compacted.append(" ".join(run))
+        else:
+            compacted.extend(run)
+        run.clear()
+
+    for line in lines:
+        if NUMERIC_CELL_PATTERN.match(line):
+            run.append(line)
+            continue
+        flush()
+        compacted.append(line)
+    flush()
+    return compacted
+
+
+def normalize_pages(pages: Sequence[str], compact_tables: bool = False) -> NormalizationResult:
+    """抽出したページテキストからプロンプトに不要な文字を取り除く
+
+    - 多くのページの先頭・末尾に繰り返し現れる行と、ページ番号（装飾つき、または通し番号どおりのもの）を削除
+    - 空白の連続をまとめ、文の途中で折り返された行を結合
+    - compact_tables 指定時は数値のみの行の並びを1行にまとめる
+    """
+    pages_lines = [
+        [SPACES_PATTERN.sub(" ", line).strip() for line in page.splitlines()]
+        for page in pages
+    ]
+    page_offset = _page_number_offset(pages_lines) if len(pages_lines) > 1 else None
+    repeated = _repeated_edge_keys(pages_lines, page_offset) if len(pages_lines) > 1 else set()
+
+    normalized = []
+    removed = joined = compacted_cells = 0
+    for page_index, lines in enumerate(pages_lines):
+        edges = set(_edge_indexes(lines))
+        # ページ番号はページの最初か最後の行にだけ現れる（表の数値を誤って消さない）
+        non_empty = [i for i, line in enumerate(lines) if line]
+        outermost = {non_empty[0], non_empty[-1]} if non_empty else set()
+        kept = []
+        for i, line in enumerate(lines):
+            if (
+                (i in edges and _edge_key(line, page_index, page_offset) in repeated)
+                or (i in outermost and _is_page_number(line, page_index, page_offset))
+            ):
+                removed += 1
+                continue
+            kept.append(line)
+
+        if compact_tables:
+            before = sum(1 for line in kept if line)
+            kept = _compact_numeric_runs(kept)
+            compacted_cells += before - sum(1 for line in kept if line)
+
+        wrap_width = _wrap_width(kept)
+        merged: List[str] = []
+        previous = ""
+        for line in kept:
+            if merged and _should_join(previous, line, wrap_width):
+                merged[-1] = _join(merged[-1], line)
+                joined += 1
+            elif line or (merged and merged[-1]):
+                # 空行は段落の区切りとして1行だけ残す
+                merged.append(line)
+            previous = line
+        normalized.append("\n".join(merged).strip() + "\n")
+
+    raw_chars = sum(len(page) for page in pages)
+    result = NormalizationResult(
+        pages=normalized,
+        raw_chars=raw_chars,
+        normalized_chars=sum(len(page) for page in normalized),
+        removed_edge_lines=removed,
+        joined_lines=joined,
+        compacted_cells=compacted_cells
+    )
+    _record(result)
+    return result
+
+
+# プロセス内の累計（/metrics で参照）
+_totals = {"documents": 0, "raw_chars": 0, "normalized_chars": 0}
+_totals_lock = threading.Lock()
+
+
+def _record(result: NormalizationResult) -> None:
+    with _totals_lock:
+        _totals["documents"] += 1
+        _totals["raw_chars"] += result.raw_chars
+        _totals["normalized_chars"] += result.normalized_chars
+
+
+def normalization_stats() -> Dict[str, Any]:
+    """正規化した文書数と累計の削減率"""
+    with _totals_lock:
+        totals = dict(_totals)
+    raw = totals["raw_chars"]
+    totals["reduction_ratio"] = round(1 - totals["normalized_chars"] / raw, 4) if raw else 0.0
+    return totals
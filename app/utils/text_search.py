@@ -0,0 +1,174 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import Callable, List, Sequence, Tuple
+import numpy as np
+
+# 漢字・カタカナ・英数字の連続（ひらがなは助詞などが多いため対象外）
+TOKEN_PATTERN = re.compile(r"[\u4e00-\u9fff\u3005]+|[\u30a0-\u30ff]+|[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """日本語向けトークナイズ（漢字・カタカナは文字bigram、英数字は単語単位）"""
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(normalized):
+        run = match.group(0)
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class _Postings:
+    """文書×語の出現を語順に並べたポスティング（BM25Index・TfidfIndex で共用）
+
+    重みは構築時の並び（文書順）で計算してから ``arrange`` で語順に並べ替える。
+    ``positions`` は複数語のポスティング区間の位置をループなしで求める。
+    """
+
+    def __init__(self, counters: Sequence[Counter]):
+        self.vocabulary = {}
+        doc_ids = []
+        term_ids = []
+        counts = []
+        for doc_id, counter in enumerate(counters):
+            for term, count in counter.items():
+                doc_ids.append(doc_id)
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                counts.append(count)
+
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.term_ids = np.asarray(term_ids, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.float64)
+        self.document_frequency = np.bincount(self.term_ids, minlength=len(self.vocabulary))
+        self.offsets = np.concatenate(([0], np.cumsum(self.document_frequency)))
+        self._order = np.argsort(self.term_ids, kind="stable")
+
+    def arrange(self, values: np.ndarray) -> np.ndarray:
+        """文書順の値を語順に並べ替える"""
+        return values[self._order]
+
+    def term_ids_of(self, terms: Sequence[str]) -> np.ndarray:
+        return np.asarray([self.vocabulary[t] for t in terms if t in self.vocabulary], dtype=np.int64)
+
+    def positions(self, term_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """語ごとのポスティング区間を連結した位置と、各区間の長さ"""
+        starts = self.offsets[term_ids]
+        lengths = self.offsets[term_ids + 1] - starts
+        # 区間 i の j 番目は starts[i] + (j - 区間 i より前の合計長)
+        shifts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return np.arange(int(lengths.sum()), dtype=np.int64) + shifts, lengths
+
+
+class BM25Index:
+    """NumPyによるBM25検索インデックス
+
+    文書×語の出現をポスティング配列として語順に並べて保持し、
+    各ポスティングのBM25重みを事前計算しておく。検索時は問い合わせ語の
+    区間を取り出して ``np.bincount`` で文書ごとに合算するだけで済む。
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.size = len(documents)
+        counters = [Counter(tokenize(text)) for text in documents]
+        self._postings = _Postings(counters)
+        self.vocabulary = self._postings.vocabulary
+
+        lengths = np.asarray([sum(counter.values()) for counter in counters], dtype=np.float64)
+        doc_ids = self._postings.doc_ids
+        term_ids = self._postings.term_ids
+        tf = self._postings.counts
+
+        document_frequency = self._postings.document_frequency
+        idf = np.log1p((self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        average_length = lengths.mean() if self.size and lengths.mean() > 0 else 1.0
+        length_norm = k1 * (1 - b + b * lengths / average_length)
+        weights = idf[term_ids] * tf * (k1 + 1) / (tf + length_norm[doc_ids]) if self.size else tf
+
+        # 語IDでソートし、語ごとのポスティング区間を引けるようにする
+        self._doc_ids = self._postings.arrange(doc_ids)
+        self._weights = self._postings.arrange(weights)
+
+    def scores(self, query: str) -> np.ndarray:
+        """問い合わせに対する全文書のスコアを計算"""
+        term_ids = np.unique(self._postings.term_ids_of(tokenize(query)))
+        if term_ids.size == 0:
+            return np.zeros(self.size, dtype=np.float64)
+
+        positions, _ = self._postings.positions(term_ids)
+        return np.bincount(self._doc_ids[positions], weights=self._weights[positions], minlength=self.size)
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """スコア上位k件の文書番号をスコア降順で返す（スコア0は除外）"""
+        if self.size == 0 or k <= 0:
+            return []
+
+        scores = self.scores(query)
+        k = min(k, self.size)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [int(i) for i in ranked if scores[i] > 0]
+
+
+def char_ngrams(text: str, sizes: Sequence[int] = (2, 3)) -> List[str]:
+    """空白を除いた文字n-gramを生成（短い説明文同士の類似度計算向け）"""
+    normalized = re.sub(r"\s+", "", unicodedata.normalize("NFKC", text).lower())
+    return [
+        normalized[i:i + n]
+        for n in sizes
+        for i in range(len(normalized) - n + 1)
+    ]
+
+
+class TfidfIndex:
+    """NumPyによるTF-IDFコサイン類似度検索インデックス
+
+    BM25Index と同じく語順に並べたポスティングとして、L2正規化済みの
+    TF-IDF重みを保持する。検索時は問い合わせベクトルの重みを掛けて合算する。
+    """
+
+    def __init__(self, documents: Sequence[str], analyzer: Callable[[str], List[str]] = char_ngrams):
+        self.size = len(documents)
+        self.analyzer = analyzer
+        self._postings = _Postings([Counter(analyzer(text)) for text in documents])
+        self.vocabulary = self._postings.vocabulary
+
+        doc_ids = self._postings.doc_ids
+        tf = np.log1p(self._postings.counts)
+        self.idf = np.log((1 + self.size) / (1 + self._postings.document_frequency)) + 1
+        weights = tf * self.idf[self._postings.term_ids]
+
+        # 文書ベクトルをL2正規化しておき、内積がそのままコサイン類似度になるようにする
+        norms = np.sqrt(np.bincount(doc_ids, weights=weights ** 2, minlength=self.size))
+        norms[norms == 0] = 1.0
+        weights = weights / norms[doc_ids]
+
+        self._doc_ids = self._postings.arrange(doc_ids)
+        self._weights = self._postings.arrange(weights)
+
+    def scores(self, query: str) -> np.ndarray:
+        """問い合わせと全文書のコサイン類似度を計算"""
+        counter = Counter(t for t in self.analyzer(query) if t in self.vocabulary)
+        if not counter:
+            return np.zeros(self.size, dtype=np.float64)
+
+        term_ids = self._postings.term_ids_of(list(counter))
+        query_weights = np.log1p(np.asarray(list(counter.values()), dtype=np.float64)) * self.idf[term_ids]
+        query_weights /= np.linalg.norm(query_weights)
+
+        positions, lengths = self._postings.positions(term_ids)
+        weights = self._weights[positions] * np.repeat(query_weights, lengths)
+        return np.bincount(self._doc_ids[positions], weights=weights, minlength=self.size)
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """類似度上位k件の文書番号を類似度降順で返す"""
+        if self.size == 0 or k <= 0:
+            return []
+
+        scores = self.scores(query)
+        k = min(k, self.size)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        return [int(i) for i in candidates[np.argsort(-scores[candidates], kind="stable")]]
@@ -0,0 +1,413 @@
+"""本番トラフィックと上流とのやり取りをカセットに記録し、再生時は上流の代わりに応答を返す
+
+記録（TRAFFIC_RECORDING_ENABLED=true）:
+    TRAFFIC_RECORD_PATHS に一致するリクエストを requests.jsonl に、その処理中に発生した
+    上流（Gemini・日経のURL解決・PDFダウンロード）とのやり取りを upstream.jsonl に、
+    ダウンロードしたPDFを blobs/ に保存する。カセットはプロセスごとに1ディレクトリ。
+再生（TRAFFIC_REPLAY_CASSETTES にカセットのディレクトリを指定）:
+    上流へは接続せず、記録された応答を記録時の所要時間（TRAFFIC_REPLAY_LATENCY_SCALE 倍）
+    だけ待ってから返す。リクエストの送信は ``python -m app.utils.traffic_replay`` で行う。
+    応答はプロンプトなどの内容が完全に一致する記録から返す。一致しなければ
+    （TRAFFIC_REPLAY_FALLBACK_ENABLED 時）同じリクエスト・種類の記録を呼び出し順に、
+    それもなければ種類ごとの記録を順に返す。一致の内訳は /metrics の traffic_replay で確認できる。
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 記録中のリクエストのID（上流とのやり取りをリクエストに対応付ける）
+current_request_id: ContextVar[Optional[str]] = ContextVar("traffic_request_id", default=None)
+
+# 記録するリクエストヘッダー（認証情報などは記録しない）
+RECORDED_HEADERS = ("content-type", "accept", "if-none-match", "x-request-timeout")
+# 再生時に記録時のリクエストIDを伝えるヘッダー（上流の記録をリクエスト単位で対応付ける）
+REPLAY_REQUEST_ID_HEADER = "x-traffic-request-id"
+REQUESTS_FILE = "requests.jsonl"
+UPSTREAM_FILE = "upstream.jsonl"
+BLOBS_DIR = "blobs"
+
+
+class UpstreamNotRecorded(Exception):
+    """再生中に、カセットに記録のない上流呼び出しが行われた"""
+
+
+def _digest(*parts: Any) -> str:
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CassetteWriter:
+    """カセットへの追記（行単位のJSONで、記録開始からの経過秒を付ける）"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, BLOBS_DIR), exist_ok=True)
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def offset(self) -> float:
+        return round(time.monotonic() - self.started, 4)
+
+    def append(self, filename: str, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock, open(os.path.join(self.directory, filename), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def record_upstream(self, kind: str, key: str, elapsed: float, **result: Any) -> None:
+        self.append(UPSTREAM_FILE, {
+            "request_id": current_request_id.get(),
+            "offset": self.offset(),
+            "kind": kind,
+            "key": key,
+            "elapsed": round(elapsed, 4),
+            **result
+        })
+
+    def put_blob(self, name: str, source_path: str) -> None:
+        """ファイルをカセットに保存（同名のものがあれば省略）"""
+        path = os.path.join(self.directory, BLOBS_DIR, name)
+        if os.path.exists(path):
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        os.close(fd)
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, path)
+
+
+class Cassette:
+    """再生用に読み込んだカセット（同じキーの応答は記録順に返し、尽きたら先頭に戻る）
+
+    キーが一致しない呼び出しには、fallback 指定時は同じリクエスト・種類の記録を
+    そのリクエスト内での呼び出し順に、なければ種類ごとの記録を順に返す。
+    """
+
+    def __init__(self, directories: List[str], fallback: bool = True):
+        self.directories = directories
+        self.fallback = fallback
+        self._entries: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._by_request: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._by_kind: Dict[str, List[Dict[str, Any]]] = {}
+        self._positions: Counter = Counter()
+        self._matches: Counter = Counter()
+        self._lock = threading.Lock()
+        for directory in directories:
+            for entry in read_jsonl(os.path.join(directory, UPSTREAM_FILE)):
+                entry["directory"] = directory
+                self._entries.setdefault((entry["kind"], entry["key"]), []).append(entry)
+                if entry.get("request_id"):
+                    self._by_request.setdefault((entry["request_id"], entry["kind"]), []).append(entry)
+                self._by_kind.setdefault(entry["kind"], []).append(entry)
+
+    def _take(self, position_key: Tuple[str, ...], entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        position = self._positions[position_key]
+        self._positions[position_key] += 1
+        return entries[position % len(entries)]
+
+    def next(self, kind: str, key: str) -> Dict[str, Any]:
+        request_id = current_request_id.get()
+        with self._lock:
+            entries = self._entries.get((kind, key))
+            if entries:
+                match, entry = "exact", self._take(("key", kind, key), entries)
+            elif self.fallback and self._by_request.get((request_id, kind)):
+                match, entry = "request", self._take(("request", request_id, kind), self._by_request[(request_id, kind)])
+            elif self.fallback and self._by_kind.get(kind):
+                match, entry = "kind", self._take(("kind", kind), self._by_kind[kind])
+            else:
+                self._matches["missing"] += 1
+                raise UpstreamNotRecorded(f"カセットに記録がありません: {kind} {key[:16]}")
+            self._matches[match] += 1
+        if match != "exact":
+            logger.debug(f"記録と一致しない上流呼び出しに代替の応答を使用（{match}）: {kind} {key[:16]}")
+        return entry
+
+    def match_stats(self) -> Dict[str, int]:
+        """上流呼び出しと記録の一致の内訳（exact: 完全一致, request: 同じリクエストの呼び出し順,
+        kind: 種類ごとの記録順, missing: 記録なし）"""
+        with self._lock:
+            return {match: self._matches[match] for match in ("exact", "request", "kind", "missing")}
+
+    @staticmethod
+    def blob_path(entry: Dict[str, Any]) -> str:
+        return os.path.join(entry["directory"], BLOBS_DIR, entry["response"]["blob"])
+
+
+def read_jsonl(path: str) -> List[Dict[str, Any]]:
+    """行単位のJSONを読み込む（書き込み途中の最終行は無視）"""
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+_writer: Optional[CassetteWriter] = None
+_cassette: Optional[Cassette] = None
+_init_lock = threading.Lock()
+
+
+def get_cassette_writer() -> Optional[CassetteWriter]:
+    """記録が有効ならこのプロセスのカセットを取得（無効ならNone）"""
+    global _writer
+    if not settings.TRAFFIC_RECORDING_ENABLED:
+        return None
+    with _init_lock:
+        if _writer is None:
+            name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+            _writer = CassetteWriter(os.path.join(settings.TRAFFIC_CASSETTE_DIR, name))
+        return _writer
+
+
+def get_replay_cassette() -> Optional[Cassette]:
+    """再生が有効なら上流の応答を返すカセットを取得（無効ならNone）"""
+    global _cassette
+    if not settings.TRAFFIC_REPLAY_CASSETTES:
+        return None
+    with _init_lock:
+        if _cassette is None:
+            _cassette = Cassette(settings.TRAFFIC_REPLAY_CASSETTES, settings.TRAFFIC_REPLAY_FALLBACK_ENABLED)
+        return _cassette
+
+
+def replay_match_stats() -> Optional[Dict[str, int]]:
+    """再生中なら上流呼び出しと記録の一致の内訳（再生中でなければNone）"""
+    cassette = get_replay_cassette()
+    return cassette.match_stats() if cassette is not None else None
+
+
+def _wait_recorded(entry: Dict[str, Any]) -> None:
+    delay = entry.get("elapsed", 0) * settings.TRAFFIC_REPLAY_LATENCY_SCALE
+    if delay > 0:
+        time.sleep(delay)
+
+
+def call_upstream(kind: str, key: str, call: Callable[[], T]) -> T:
+    """上流の同期呼び出し（記録時は応答を保存し、再生時は記録された応答を返す。応答はJSONにできる値）"""
+    cassette = get_replay_cassette()
+    if cassette is not None:
+        entry = cassette.next(kind, key)
+        _wait_recorded(entry)
+        if "error" in entry:
+            raise Exception(entry["error"])
+        return entry["response"]
+
+    writer = get_cassette_writer()
+    if writer is None:
+        return call()
+
+    started = time.perf_counter()
+    try:
+        response = call()
+    except Exception as e:
+        writer.record_upstream(kind, key, time.perf_counter() - started, error=str(e))
+        raise
+    writer.record_upstream(kind, key, time.perf_counter() - started, response=response)
+    return response
+
+
+def restore_download(pdf_url: str, path: str) -> bool:
+    """再生中ならカセットのPDFを path に置く（再生中でなければFalse）"""
+    cassette = get_replay_cassette()
+    if cassette is None:
+        return False
+
+    entry = cassette.next("pdf", _digest(pdf_url))
+    _wait_recorded(entry)
+    if "error" in entry:
+        raise Exception(entry["error"])
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    os.close(fd)
+    shutil.copyfile(Cassette.blob_path(entry), tmp_path)
+    os.replace(tmp_path, path)
+    return True
+
+
+def record_download(pdf_url: str, path: str, elapsed: float) -> None:
+    """取得したPDFをカセットに保存（ディスクキャッシュから返した場合も再生用に残す）"""
+    writer = get_cassette_writer()
+    if writer is None:
+        return
+    key = _digest(pdf_url)
+    writer.put_blob(f"{key}.pdf", path)
+    writer.record_upstream("pdf", key, elapsed, response={"blob": f"{key}.pdf", "bytes": os.path.getsize(path)})
+
+
+class RecordedResponse:
+    """記録・再生したGeminiの応答"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _content_text(content: Any) -> Any:
+    if isinstance(content, dict):
+        return {"role": content.get("role"), "parts": [str(part) for part in content.get("parts", [])]}
+    return content
+
+
+class RecordingModel:
+    """GenerativeModel の呼び出しを記録・再生するラッパー（再生時は元のモデルなし）
+
+    記録・再生の対象はテキストの応答のみ。コンテキストキャッシュは使わない（cached 方式は session 方式で実行）。
+    """
+
+    bypass_context_cache = True
+
+    def __init__(self, model: Optional[Any] = None):
+        self._model = model
+        self.model_name = getattr(model, "model_name", settings.GEMINI_MODEL_NAME)
+
+    def generate_content(self, contents: Any, generation_config: Optional[Dict[str, Any]] = None) -> RecordedResponse:
+        key = _digest("generate_content", _content_text(contents), generation_config)
+        return RecordedResponse(call_upstream(
+            "gemini", key,
+            lambda: self._model.generate_content(contents, generation_config=generation_config).text
+        ))
+
+    def start_chat(self, history: Optional[List[Dict[str, Any]]] = None) -> "RecordingChatSession":
+        return RecordingChatSession(self, history)
+
+
+class RecordingChatSession:
+    """会話セッションの記録・再生（履歴全体と送信内容をキーとする）"""
+
+    def __init__(self, model: RecordingModel, history: Optional[List[Dict[str, Any]]]):
+        self._history = [_content_text(content) for content in history or []]
+        self._chat = model._model.start_chat(history=history) if model._model is not None else None
+
+    def send_message(self, message: str, generation_config: Optional[Dict[str, Any]] = None) -> RecordedResponse:
+        key = _digest("send_message", self._history, message, generation_config)
+        text = call_upstream(
+            "gemini", key,
+            lambda: self._chat.send_message(message, generation_config=generation_config).text
+        )
+        self._history += [{"role": "user", "parts": [message]}, {"role": "model", "parts": [text]}]
+        return RecordedResponse(text)
+
+
+def wrap_model(model: Optional[Any]) -> Optional[Any]:
+    """記録・再生が有効ならモデルをラップする（再生時はモデルがなくてもよい）"""
+    if isinstance(model, RecordingModel):
+        return model
+    if settings.TRAFFIC_REPLAY_CASSETTES or (model is not None and settings.TRAFFIC_RECORDING_ENABLED):
+        return RecordingModel(model)
+    return model
+
+
+class TrafficRecorderMiddleware:
+    """TRAFFIC_RECORD_PATHS に一致するリクエストと応答の概要をカセットに記録するASGIミドルウェア
+
+    応答本文は記録しない（JSONの応答に含まれる analysis_id のみ、再生時の対応付けのために残す）。
+    再生時は記録を行わず、再生ツールが送る記録時のリクエストIDを上流の記録との対応付けに使う。
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] == "http" and get_replay_cassette() is not None:
+            await self._replay(scope, receive, send)
+            return
+
+        writer = get_cassette_writer()
+        if scope["type"] != "http" or writer is None or not scope["path"].startswith(tuple(settings.TRAFFIC_RECORD_PATHS)):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = uuid.uuid4().hex
+        headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])
+        }
+        entry: Dict[str, Any] = {
+            "id": request_id,
+            "at": time.time(),
+            "offset": writer.offset(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "headers": {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+        }
+        body = bytearray()
+        response_json = bytearray()
+        state = {"status": 500, "json": False, "bytes": 0, "ttfb": None, "truncated": False}
+        started = time.perf_counter()
+
+        async def receive_recorded() -> Dict[str, Any]:
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                if len(body) + len(chunk) > settings.TRAFFIC_RECORD_MAX_BODY_BYTES:
+                    state["truncated"] = True
+                else:
+                    body.extend(chunk)
+            return message
+
+        async def send_recorded(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                state["json"] = content_type.startswith(b"application/json")
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if state["ttfb"] is None:
+                    state["ttfb"] = time.perf_counter() - started
+                state["bytes"] += len(chunk)
+                if state["json"] and len(response_json) + len(chunk) <= settings.TRAFFIC_RECORD_MAX_BODY_BYTES:
+                    response_json.extend(chunk)
+            await send(message)
+
+        token = current_request_id.set(request_id)
+        try:
+            await self.app(scope, receive_recorded, send_recorded)
+        finally:
+            current_request_id.reset(token)
+            entry.update({
+                "body": None if state["truncated"] else body.decode("utf-8", errors="replace"),
+                "body_truncated": state["truncated"],
+                "status": state["status"],
+                "elapsed": round(time.perf_counter() - started, 4),
+                "ttfb": None if state["ttfb"] is None else round(state["ttfb"], 4),
+                "response_bytes": state["bytes"],
+                "analysis_id": _analysis_id(bytes(response_json)),
+            })
+            writer.append(REQUESTS_FILE, entry)
+
+
+    async def _replay(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        request_id = next((
+            value.decode("latin-1") for name, value in scope.get("headers", [])
+            if name.decode("latin-1").lower() == REPLAY_REQUEST_ID_HEADER
+        ), None)
+        token = current_request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_id.reset(token)
+
+
+def _analysis_id(response_json: bytes) -> Optional[str]:
+    try:
+        data = json.loads(response_json) if response_json else None
+    except ValueError:
+        return None
+    return data.get("analysis_id") if isinstance(data, dict) else None
@@ -0,0 +1,230 @@
+"""記録したトラフィックを再生し、スループットとレイテンシを計測する
+
+``python -m app.utils.traffic_replay カセット [カセット ...] --base-url http://localhost:8000 --speed 2``
+
+記録時と同じ間隔（--speed 倍速）でリクエストを送り、記録時の応答時間・ステータスと比較する。
+再生先のサーバーは TRAFFIC_REPLAY_CASSETTES に同じカセットを指定して起動し、上流（Gemini・
+日経・PDF）を記録どおりに返させる（チェックポイントやキャッシュは空の状態から始める）。
+記録時に返された analysis_id は、再生時に返された analysis_id に置き換えて送る。
+各リクエストには記録時のリクエストIDを付け、プロンプトなどが変わって記録と完全に一致しない
+上流呼び出しも同じリクエストの記録に対応付けさせる。再生後にサーバーの /metrics から
+完全一致した上流呼び出しの件数を取得して表示する（サーバー起動からの累計）。
+--output で結果をJSONに保存し、別バージョンでの結果を --baseline に指定すると差分を表示する。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+from app.utils.traffic_recorder import REPLAY_REQUEST_ID_HEADER, REQUESTS_FILE, read_jsonl
+
+
+@dataclass
+class ReplayResult:
+    """1リクエストの再生結果"""
+    id: str
+    method: str
+    path: str
+    scheduled: float
+    started: float
+    elapsed: float
+    status: int
+    recorded_elapsed: float
+    recorded_status: int
+    error: Optional[str] = None
+
+
+def load_requests(cassettes: List[str]) -> List[Dict[str, Any]]:
+    """カセットのリクエストを記録時刻順に読み込む（本文が上限を超えて記録されなかったものは除く）"""
+    entries = []
+    for cassette in cassettes:
+        entries.extend(read_jsonl(os.path.join(cassette, REQUESTS_FILE)))
+    return sorted((entry for entry in entries if not entry.get("body_truncated")), key=lambda entry: entry["at"])
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    """最近傍順位法による百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(ratio * len(ordered))) - 1))]
+
+
+class TrafficReplayer:
+    """記録したリクエストを記録時の間隔で送信する"""
+
+    def __init__(self, base_url: str, speed: float, max_workers: int, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.speed = speed
+        self.max_workers = max_workers
+        self.timeout = timeout
+        # 記録時の analysis_id → 再生時の analysis_id
+        self._analysis_ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _substitute(self, text: str) -> str:
+        with self._lock:
+            mapping = dict(self._analysis_ids)
+        for recorded, replayed in mapping.items():
+            text = text.replace(recorded, replayed)
+        return text
+
+    def _send(self, session: Any, entry: Dict[str, Any], scheduled: float, origin: float) -> ReplayResult:
+        path = self._substitute(entry["path"])
+        url = f"{self.base_url}{path}" + (f"?{entry['query']}" if entry.get("query") else "")
+        body = self._substitute(entry["body"]).encode("utf-8") if entry.get("body") else None
+        headers = {**entry.get("headers", {}), REPLAY_REQUEST_ID_HEADER: entry["id"]}
+        started = time.perf_counter()
+        status, error = 0, None
+        try:
+            # 応答本文は最後まで読み、ストリーミング応答も含めた所要時間を計る
+            with session.request(
+                entry["method"], url, data=body, headers=headers, timeout=self.timeout, stream=True
+            ) as response:
+                status = response.status_code
+                content = b"".join(response.iter_content(chunk_size=65536))
+            if entry.get("analysis_id") and response.headers.get("content-type", "").startswith("application/json"):
+                replayed_id = json.loads(content).get("analysis_id")
+                if replayed_id:
+                    with self._lock:
+                        self._analysis_ids[entry["analysis_id"]] = replayed_id
+        except Exception as e:
+            error = str(e)
+        return ReplayResult(
+            id=entry["id"],
+            method=entry["method"],
+            path=entry["path"],
+            scheduled=round(scheduled, 4),
+            started=round(started - origin, 4),
+            elapsed=round(time.perf_counter() - started, 4),
+            status=status,
+            recorded_elapsed=entry.get("elapsed", 0.0),
+            recorded_status=entry.get("status", 0),
+            error=error
+        )
+
+    def replay(self, entries: List[Dict[str, Any]]) -> List[ReplayResult]:
+        """記録時刻の差を --speed で割った間隔で送信し、全件の完了を待つ"""
+        import requests
+
+        if not entries:
+            return []
+        first = entries[0]["at"]
+        local = threading.local()
+
+        def send(entry: Dict[str, Any], scheduled: float, origin: float) -> ReplayResult:
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            return self._send(local.session, entry, scheduled, origin)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            origin = time.perf_counter()
+            futures = []
+            for entry in entries:
+                scheduled = (entry["at"] - first) / self.speed
+                delay = origin + scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(send, entry, scheduled, origin))
+            return [future.result() for future in futures]
+
+    def upstream_matches(self) -> Optional[Dict[str, int]]:
+        """再生先サーバーでの上流呼び出しと記録の一致の内訳（取得できなければNone）"""
+        import requests
+
+        try:
+            response = requests.get(f"{self.base_url}/metrics", timeout=self.timeout)
+            return response.json().get("traffic_replay")
+        except Exception:
+            return None
+
+
+def summarize(results: List[ReplayResult]) -> Dict[str, Any]:
+    """スループット・パス別レイテンシ・ステータスの不一致を集計"""
+    duration = max((r.started + r.elapsed for r in results), default=0.0)
+    by_path: Dict[str, List[ReplayResult]] = defaultdict(list)
+    for result in results:
+        by_path[result.path if result.path.startswith(("/search-company", "/pdf/")) else "その他"].append(result)
+
+    paths = {}
+    for path, path_results in sorted(by_path.items()):
+        elapsed = [r.elapsed for r in path_results]
+        recorded = [r.recorded_elapsed for r in path_results]
+        paths[path] = {
+            "count": len(path_results),
+            "p50": percentile(elapsed, 0.5),
+            "p95": percentile(elapsed, 0.95),
+            "p99": percentile(elapsed, 0.99),
+            "recorded_p50": percentile(recorded, 0.5),
+            "recorded_p95": percentile(recorded, 0.95),
+        }
+    return {
+        "requests": len(results),
+        "duration": round(duration, 3),
+        "throughput": round(len(results) / duration, 3) if duration else 0.0,
+        "errors": sum(1 for r in results if r.error),
+        "status_mismatches": sum(1 for r in results if r.status != r.recorded_status),
+        "paths": paths,
+    }
+
+
+def print_summary(summary: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    print(f"リクエスト: {summary['requests']} 件 / {summary['duration']:.1f}秒"
+          f"（{summary['throughput']:.2f} req/s）, 通信エラー {summary['errors']}, ステータス不一致 {summary['status_mismatches']}")
+    matches = summary.get("upstream_matches")
+    if matches:
+        total = sum(matches.values())
+        print(f"上流呼び出し: {total} 件（完全一致 {matches['exact']}, 同じリクエストの呼び出し順 {matches['request']},"
+              f" 種類ごとの記録順 {matches['kind']}, 記録なし {matches['missing']}）")
+    if baseline:
+        print(f"基準: {baseline['requests']} 件 / {baseline['duration']:.1f}秒（{baseline['throughput']:.2f} req/s）")
+    print(f"{'パス':<24} {'件数':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'記録p50':>8} {'記録p95':>8}")
+    for path, stats in summary["paths"].items():
+        print(f"{path:<24} {stats['count']:5d} {stats['p50']:8.3f} {stats['p95']:8.3f} {stats['p99']:8.3f}"
+              f" {stats['recorded_p50']:8.3f} {stats['recorded_p95']:8.3f}")
+        base = (baseline or {}).get("paths", {}).get(path)
+        if base:
+            print(f"{'  基準との差':<24} {'':5} {stats['p50'] - base['p50']:+8.3f} {stats['p95'] - base['p95']:+8.3f}"
+                  f" {stats['p99'] - base['p99']:+8.3f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="記録したトラフィックの再生")
+    parser.add_argument("cassettes", nargs="+", help="カセットのディレクトリ")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="再生速度の倍率（2なら記録時の半分の間隔で送信）")
+    parser.add_argument("--max-workers", type=int, default=64, help="同時に送信中にできるリクエスト数の上限")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="結果を保存するJSONファイル")
+    parser.add_argument("--baseline", help="比較する以前の --output のJSONファイル")
+    args = parser.parse_args()
+
+    if args.speed <= 0:
+        parser.error("--speed は正の値で指定してください")
+
+    entries = load_requests(args.cassettes)
+    print(f"再生対象: {len(entries)} 件（{args.speed:g}倍速）→ {args.base_url}")
+    replayer = TrafficReplayer(args.base_url, args.speed, args.max_workers, args.timeout)
+    results = replayer.replay(entries)
+    summary = summarize(results)
+    summary["upstream_matches"] = replayer.upstream_matches()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["summary"]
+    print_summary(summary, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": [asdict(r) for r in results]}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
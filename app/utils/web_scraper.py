@@ -1,63 +1,149 @@
-import requests
-from bs4 import BeautifulSoup
+import html
 import re
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Set
+from urllib.parse import urljoin
+from app.config import settings
+from app.utils.report_url_cache import ReportURLCache
+from app.utils.traffic_recorder import call_upstream
+
+# 目的のアンカーとスクリプトだけを走査する軽量パーサー用のパターン
+ANCHOR_PATTERN = re.compile(r"<a\b([^>]*)>(.*?)</a\s*>", re.IGNORECASE | re.DOTALL)
+HREF_PATTERN = re.compile(r"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+SCRIPT_PATTERN = re.compile(r"<script\b[^>]*>(.*?)</script\s*>", re.IGNORECASE | re.DOTALL)
+PDF_LOCATION_PATTERN = re.compile(r"window\['pdfLocation'\]\s*=\s*\"(.*?)\"")
+REPORT_LINK_TEXT = "有価証券報告書"
+
+
+def find_report_links(page_html: str) -> Iterator[str]:
+    """「有価証券報告書」を含むリンクのhrefを順に返す"""
+    for match in ANCHOR_PATTERN.finditer(page_html):
+        if REPORT_LINK_TEXT not in html.unescape(TAG_PATTERN.sub("", match.group(2))):
+            continue
+        href = HREF_PATTERN.search(match.group(1))
+        if href:
+            yield html.unescape(next(group for group in href.groups() if group is not None))
+
+
+def find_pdf_location(page_html: str) -> Optional[str]:
+    """スクリプトブロック内の window['pdfLocation'] を取得"""
+    for match in SCRIPT_PATTERN.finditer(page_html):
+        script = match.group(1)
+        if "pdfLocation" not in script:
+            continue
+        location = PDF_LOCATION_PATTERN.search(script)
+        if location:
+            return location.group(1)
+    return None
+
 
 class WebScraper:
     """Webスクレイピングユーティリティ"""
     
-    def __init__(self):
+    # 古くなった解決結果をバックグラウンドで再検証する（同じ企業コードは同時に1件まで）
+    _revalidate_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="report-url")
+    _revalidating: Set[str] = set()
+    _revalidating_lock = threading.Lock()
+    
+    def __init__(self, url_cache: Optional[ReportURLCache] = None):
         self.headers = {"User-Agent": "Mozilla/5.0"}
+        self.url_cache = url_cache or ReportURLCache()
     
     def fetch_securities_report_pdf(self, code: str) -> Optional[str]:
-        """企業コードから有価証券報告書PDFのURLを取得"""
-        url = f"https://www.nikkei.com/nkd/company/ednr/?scode={code}"
+        """企業コードから有価証券報告書PDFのURLを取得（解決済みならキャッシュから返す）"""
+        entry = self.url_cache.get(code)
+        if entry is not None:
+            if entry.is_stale:
+                self._schedule_revalidation(code)
+            return entry.pdf_url
         
         try:
-            res = requests.get(url, headers=self.headers)
+            pdf_url = self.resolve_securities_report_pdf(code)
+        except Exception as e:
+            print(f"PDF取得エラー: {e}")
+            return None
+        
+        self.url_cache.put(code, pdf_url)
+        return pdf_url
+    
+    def resolve_securities_report_pdf(self, code: str) -> Optional[str]:
+        """日経のページからPDFのURLを解決（通信エラーは例外として送出。トラフィック記録・再生の対象）"""
+        return call_upstream("scraper", code, lambda: self._resolve_securities_report_pdf(code))
+    
+    def _resolve_securities_report_pdf(self, code: str) -> Optional[str]:
+        import requests
+        
+        url = f"https://www.nikkei.com/nkd/company/ednr/?scode={code}"
+        
+        with requests.Session() as session:
+            session.headers.update(self.headers)
+            res = session.get(url, timeout=settings.WEB_SCRAPER_TIMEOUT)
             res.raise_for_status()
-            soup = BeautifulSoup(res.text, "html.parser")
             
-            # 「有価証券報告書」を含むリンクを抽出
-            links = soup.find_all("a", string=re.compile("有価証券報告書"))
+            # 「有価証券報告書」を含むリンクを抽出（見つからなければ従来のHTML解析で再確認）
+            links = list(find_report_links(res.text)) or self._find_report_links_with_soup(res.text)
             
-            for link in links:
-                href = link.get("href")
-                if not href:
-                    continue
-                
-                full_url = requests.compat.urljoin(url, href)
+            for href in links:
+                full_url = urljoin(url, href)
                 
                 # PDFのURLを抽出
-                pdf_url = self._extract_pdf_url(full_url)
+                pdf_url = self._extract_pdf_url(session, full_url)
                 if pdf_url:
                     return pdf_url
-            
-            return None
-            
-        except Exception as e:
-            print(f"PDF取得エラー: {e}")
-            return None
+        
+        return None
+    
+    def _extract_pdf_url(self, session, page_url: str) -> Optional[str]:
+        """ページからPDFのURLを抽出（通信エラーは例外として送出し、見つからない場合のみNone）"""
+        res = session.get(page_url, timeout=settings.WEB_SCRAPER_TIMEOUT)
+        res.raise_for_status()
+        
+        # JavaScriptからPDFパスを抽出
+        pdf_path = find_pdf_location(res.text) or self._find_pdf_location_with_soup(res.text)
+        if pdf_path:
+            return f"https://www.nikkei.com{pdf_path}"
+        
+        return None
+    
+    def _find_report_links_with_soup(self, page_html: str) -> list:
+        """BeautifulSoupによるリンク抽出（軽量パーサーで見つからない場合のみ）"""
+        from bs4 import BeautifulSoup
+        
+        soup = BeautifulSoup(page_html, "html.parser")
+        links = soup.find_all("a", string=re.compile(REPORT_LINK_TEXT))
+        return [link.get("href") for link in links if link.get("href")]
     
-    def _extract_pdf_url(self, page_url: str) -> Optional[str]:
-        """ページからPDFのURLを抽出"""
+    def _find_pdf_location_with_soup(self, page_html: str) -> Optional[str]:
+        """BeautifulSoupによるPDFパス抽出（軽量パーサーで見つからない場合のみ）"""
+        from bs4 import BeautifulSoup
+        
+        soup = BeautifulSoup(page_html, "html.parser")
+        script_text = "".join([
+            script.get_text() for script in soup.find_all("script")
+        ])
+        match = PDF_LOCATION_PATTERN.search(script_text)
+        return match.group(1) if match else None
+    
+    def _schedule_revalidation(self, code: str) -> None:
+        """解決結果の再検証をバックグラウンドで開始（実行中なら何もしない）"""
+        with self._revalidating_lock:
+            if code in self._revalidating:
+                return
+            self._revalidating.add(code)
+        self._revalidate_executor.submit(self._revalidate, code)
+    
+    def _revalidate(self, code: str) -> None:
         try:
-            res = requests.get(page_url, headers=self.headers)
-            res.raise_for_status()
-            soup = BeautifulSoup(res.text, "html.parser")
-            
-            # JavaScriptからPDFパスを抽出
-            script_text = "".join([
-                script.get_text() for script in soup.find_all("script")
-            ])
-            
-            match = re.search(r"window\['pdfLocation'\]\s*=\s*\"(.*?)\"", script_text)
-            if match:
-                pdf_path = match.group(1)
-                return f"https://www.nikkei.com{pdf_path}"
-            
-            return None
-            
+            pdf_url = self.resolve_securities_report_pdf(code)
+            if pdf_url:
+                self.url_cache.put(code, pdf_url)
+            else:
+                # 一時的な不具合で既知のURLを失わないよう、見つからない場合は保存済みの値を残す
+                print(f"PDF URL再検証: 見つからないため保存済みの値を維持 ({code})")
         except Exception as e:
-            print(f"PDF URL抽出エラー: {e}")
-            return None
\ No newline at end of file
+            print(f"PDF URL再検証エラー: {e}")
+        finally:
+            with self._revalidating_lock:
+                self._revalidating.discard(code)
@@ -12,11 +12,18 @@
 # print(f"PORT: {os.environ.get('PORT')}")
 
 
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.api.routes import router
-# from app.api.pdf_routes import router as pdf_router
+from app.api.ingest_routes import router as ingest_router
+from app.api.analysis_routes import router as analysis_router
+from app.utils.pdf_text_extractor import PDFTextExtractor
+from app.services.report_export import ReportExporter
+from app.utils.prewarm import prewarm
+from app.utils.traffic_recorder import TrafficRecorderMiddleware
+from app.api.pdf_routes import router as pdf_router
 
 def create_app() -> FastAPI:
     """FastAPIアプリケーションを作成"""
@@ -35,36 +42,31 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # 本番トラフィックの記録（容量試験の再生用。既定は無効）と、再生時のリクエストの対応付け
+    if settings.TRAFFIC_RECORDING_ENABLED or settings.TRAFFIC_REPLAY_CASSETTES:
+        app.add_middleware(TrafficRecorderMiddleware)
+
     @app.get("/")
     def root():
         return {"message": "App is running"}
 
-    # ★ここに追加 - 起動時イベント
+    # 起動時イベント（受付開始後にバックグラウンドで事前読み込み）
     @app.on_event("startup")
     async def startup_event():
-        print("=== 環境変数確認 ===")
-        
-        # 全ての環境変数を確認
-        import os
-        all_vars = dict(os.environ)
-        print(f"全環境変数数: {len(all_vars)}")
-        
-        # Google関連の変数を探す
-        google_vars = {k: v for k, v in all_vars.items() if 'GOOGLE' in k.upper()}
-        print(f"Google関連変数: {google_vars}")
-        
-        # 具体的に確認
-        api_key = os.getenv('GOOGLE_API_KEY')
-        print(f"GOOGLE_API_KEY: {api_key is not None}")
-        if api_key:
-            print(f"キーの長さ: {len(api_key)}")
-            print(f"最初の10文字: {api_key[:10]}...")
-        
-        print("================")
+        if settings.PREWARM_ON_STARTUP:
+            app.state.prewarm_task = asyncio.create_task(prewarm())
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        # テキスト抽出・レポート描画用プロセスプールを停止
+        PDFTextExtractor.shutdown()
+        ReportExporter.shutdown()
 
     # ルーターを登録
     app.include_router(router)
-    # app.include_router(pdf_router)
+    app.include_router(ingest_router)
+    app.include_router(analysis_router)
+    app.include_router(pdf_router)
 
     return app
 
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# app.config の読み込み前に、外部サービスに接続しない設定にする
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_WORKDIR = tempfile.mkdtemp(prefix="sales_ai_agent_tests_")
+os.environ.update({
+    "GEMINI_USE_FAKE_MODEL": "true",
+    "CACHE_BACKEND": "memory",
+    "PREWARM_ON_STARTUP": "false",
+    "COMPANY_REGISTRY_PATH": os.path.join(_WORKDIR, "company_registry.json"),
+    "REPORT_TEXT_STORE_DIR": os.path.join(_WORKDIR, "report_texts"),
+    "PDF_DOWNLOAD_DIR": os.path.join(_WORKDIR, "pdfs"),
+    "TRAFFIC_CASSETTE_DIR": os.path.join(_WORKDIR, "cassettes"),
+})
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+# プロンプトなどは相対パスで参照する
+os.chdir(_ROOT)
@@ -0,0 +1,164 @@
+import threading
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+import pytest
+
+from app.utils import cache_backend
+from app.utils.cache_backend import MemoryCacheBackend, RedisCacheBackend, SQLiteCacheBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """redis-py の get / set(ex=) / delete のみを持つローカル代替"""
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.entries: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or (entry[1] is not None and entry[1] <= self.clock.now):
+                self.entries.pop(name, None)
+                return None
+            return entry[0]
+
+    def set(self, name: str, value: bytes, ex: Optional[int] = None) -> None:
+        with self.lock:
+            self.entries[name] = (value, self.clock.now + ex if ex else None)
+
+    def delete(self, name: str) -> None:
+        with self.lock:
+            self.entries.pop(name, None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_backend, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def make_backend(request, clock, tmp_path):
+    """同じ設定のバックエンドを作る関数（SQLite・Redisは呼び出しごとに別の接続・クライアント）"""
+    redis_server = FakeRedis(clock)
+    memory_backends: Dict[str, MemoryCacheBackend] = {}
+
+    def make(namespace: str = "test", max_bytes: int = 1024, max_entry_bytes: int = 256, default_ttl=None):
+        if request.param == "memory":
+            # プロセス内キャッシュは名前空間ごとに1つを共有する
+            return memory_backends.setdefault(
+                namespace, MemoryCacheBackend(namespace, max_bytes, max_entry_bytes, default_ttl)
+            )
+        if request.param == "sqlite":
+            return SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), namespace, max_bytes, max_entry_bytes, default_ttl)
+        return RedisCacheBackend(redis_server, namespace, max_bytes, max_entry_bytes, default_ttl)
+
+    make.kind = request.param
+    return make
+
+
+def test_set_get_delete(make_backend):
+    backend = make_backend()
+    assert backend.get("a") is None
+    backend.set("a", b"value")
+    assert backend.get("a") == b"value"
+    backend.set("a", b"replaced")
+    assert backend.get("a") == b"replaced"
+    backend.delete("a")
+    assert backend.get("a") is None
+    backend.delete("missing")
+
+
+def test_json_round_trip(make_backend):
+    backend = make_backend()
+    backend.set_json("j", {"企業": "サンプル", "steps": [1, 2]})
+    assert backend.get_json("j") == {"企業": "サンプル", "steps": [1, 2]}
+    assert backend.get_json("missing") is None
+
+
+def test_entry_over_limit_is_not_stored(make_backend):
+    backend = make_backend(max_entry_bytes=8)
+    backend.set("big", b"x" * 9)
+    assert backend.get("big") is None
+    backend.set("small", b"x" * 8)
+    assert backend.get("small") == b"x" * 8
+
+
+def test_ttl_expiry(make_backend, clock):
+    backend = make_backend(default_ttl=60)
+    backend.set("default", b"1")
+    backend.set("short", b"2", ttl=10)
+    clock.now += 30
+    assert backend.get("short") is None
+    assert backend.get("default") == b"1"
+    clock.now += 31
+    assert backend.get("default") is None
+
+
+def test_namespaces_are_isolated(make_backend):
+    first = make_backend("first")
+    second = make_backend("second")
+    first.set("key", b"first")
+    second.set("key", b"second")
+    assert first.get("key") == b"first"
+    assert second.get("key") == b"second"
+    second.delete("key")
+    assert first.get("key") == b"first"
+
+
+def test_shared_between_connections(make_backend):
+    writer = make_backend()
+    reader = make_backend()
+    writer.set("shared", b"value")
+    assert reader.get("shared") == b"value"
+    reader.delete("shared")
+    assert writer.get("shared") is None
+
+
+def test_eviction_at_size_limit(make_backend, clock):
+    if make_backend.kind == "redis":
+        pytest.skip("合計サイズはRedis側の maxmemory で制限する")
+    backend = make_backend(max_bytes=10, max_entry_bytes=10)
+    for key in ("a", "b", "c"):
+        backend.set(key, b"x" * 4)
+        clock.now += 1
+    # 合計が上限を超えた分は最も古いエントリから削除される
+    assert backend.get("a") is None
+    assert backend.get("b") == b"x" * 4
+    assert backend.get("c") == b"x" * 4
+
+
+def test_sqlite_eviction_prefers_recently_read_entries(clock, tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    backend = SQLiteCacheBackend(path, "test", max_bytes=10, max_entry_bytes=10)
+    other = SQLiteCacheBackend(path, "test", max_bytes=10, max_entry_bytes=10)
+    backend.set("a", b"x" * 4)
+    clock.now += 1
+    backend.set("b", b"x" * 4)
+    # 参照日時の更新間隔を過ぎてから別の接続で a を読む
+    clock.now += SQLiteCacheBackend.TOUCH_INTERVAL + 1
+    assert other.get("a") == b"x" * 4
+    clock.now += 1
+    other.set("c", b"x" * 4)
+    assert backend.get("b") is None
+    assert backend.get("a") == b"x" * 4
+
+
+def test_redis_keys_use_prefix_and_ttl(clock):
+    server = FakeRedis(clock)
+    backend = RedisCacheBackend(server, "ns", max_bytes=1024, max_entry_bytes=256, default_ttl=5)
+    backend.set("key", b"value")
+    (name,) = server.entries
+    assert name.endswith(":ns:key")
+    assert server.entries[name][1] == clock.now + 5
@@ -0,0 +1,25 @@
+import multiprocessing
+
+from app.utils.company_registry import CompanyRegistry
+
+
+def register_batches(path: str, worker: int) -> None:
+    registry = CompanyRegistry(path)
+    for batch in range(20):
+        code = f"{worker}{batch:03d}"
+        registry.register_many([{"code": code, "company_name": f"企業{code}", "report_url": f"local-report://{code}"}])
+
+
+def test_concurrent_processes_do_not_lose_registrations(tmp_path):
+    path = str(tmp_path / "registry.json")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=register_batches, args=(path, worker)) for worker in range(1, 5)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+
+    registry = CompanyRegistry(path)
+    assert len(registry) == 80
+    assert registry.get_code("企業1000") == "1000"
+    assert registry.get_report_url("4019") == "local-report://4019"
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.dependencies import get_company_service
+from app.models.schemas import CompanySearchRequest
+from app.services import company_service as company_service_module
+from app.services.company_service import CompanyService
+from app.utils.request_deadline import DeadlineExceeded, current_deadline
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = CompanyService()
+    monkeypatch.setattr(service, "get_company_code", lambda company_name: "E00001")
+
+    async def resolve_pdf_url(code):
+        return "https://example.com/report.pdf"
+
+    monkeypatch.setattr(service, "resolve_pdf_url", resolve_pdf_url)
+    return service
+
+
+def expire_during_summary(service, monkeypatch):
+    async def run_summary_chain(pdf_url, company_name, mode):
+        raise DeadlineExceeded("リクエストの期限を過ぎたため gemini を中止しました")
+
+    monkeypatch.setattr(service.gemini_service, "run_summary_chain", run_summary_chain)
+
+
+def test_deadline_in_stage_is_not_turned_into_failed_response(service, monkeypatch):
+    expire_during_summary(service, monkeypatch)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(service.analyze_company(CompanySearchRequest(company_name="テスト株式会社")))
+
+
+def test_expired_request_does_not_start_next_stage(service, monkeypatch):
+    calls = []
+
+    async def resolve_pdf_url(code):
+        calls.append(code)
+        return "https://example.com/report.pdf"
+
+    monkeypatch.setattr(service, "resolve_pdf_url", resolve_pdf_url)
+
+    async def scenario():
+        current_deadline.set(time.monotonic() - 1)
+        await service.analyze_company(CompanySearchRequest(company_name="テスト株式会社"))
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert calls == []
+
+
+def test_search_company_returns_504_when_stage_hits_deadline(service, monkeypatch):
+    from main import app
+
+    expire_during_summary(service, monkeypatch)
+    app.dependency_overrides[get_company_service] = lambda: service
+    try:
+        response = TestClient(app).post("/search-company", json={"company_name": "テスト株式会社"})
+    finally:
+        app.dependency_overrides.pop(get_company_service)
+    assert response.status_code == 504
+
+
+def test_abandoned_pdf_url_resolution_is_cancelled(monkeypatch):
+    service = CompanyService()
+    release = threading.Event()
+    monkeypatch.setattr(service.web_scraper, "fetch_securities_report_pdf", lambda code: release.wait(5))
+
+    async def scenario():
+        task = asyncio.ensure_future(service.resolve_pdf_url("E99999"))
+        await asyncio.sleep(0.01)
+        assert company_service_module._pdf_url_flights.in_flight("E99999")
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+        in_flight = company_service_module._pdf_url_flights.in_flight("E99999")
+        release.set()
+        return in_flight
+
+    try:
+        assert asyncio.run(scenario()) is False
+    finally:
+        release.set()
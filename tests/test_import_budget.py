@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+from app.config import settings
+from app.utils.import_budget import HEAVY_MODULES, loaded_heavy_modules, measure_import_time
+
+
+def test_main_import_within_budget_without_heavy_modules():
+    timings = measure_import_time("main")
+    total_ms = next(cumulative for name, _, cumulative in timings if name == "main") / 1000
+
+    assert loaded_heavy_modules(timings) == []
+    assert total_ms <= settings.IMPORT_TIME_BUDGET_MS
+
+
+def test_loaded_heavy_modules_detects_submodules():
+    timings = [("main", 1, 1), ("google.generativeai.types", 1, 1), ("numpy", 1, 1), ("yamlish", 1, 1)]
+    assert loaded_heavy_modules(timings) == ["google.generativeai", "numpy"]
+    assert "fitz" in HEAVY_MODULES
+
+
+def test_main_import_does_not_open_cache_backend(tmp_path):
+    sqlite_path = tmp_path / "cache.sqlite3"
+    env = {**os.environ, "CACHE_BACKEND": "sqlite", "CACHE_SQLITE_PATH": str(sqlite_path)}
+    subprocess.run([sys.executable, "-c", "import main"], env=env, check=True, capture_output=True)
+    assert not sqlite_path.exists()
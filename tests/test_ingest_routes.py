@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from app.api import ingest_routes
+from app.config import settings
+
+
+class DoneTask:
+    def cancelled(self) -> bool:
+        return False
+
+    def exception(self):
+        return None
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    jobs = {}
+    monkeypatch.setattr(ingest_routes, "_jobs", jobs)
+    monkeypatch.setattr(settings, "REPORT_INGEST_JOB_TTL_SECONDS", 60)
+    monkeypatch.setattr(settings, "REPORT_INGEST_MAX_JOBS", 3)
+    return jobs
+
+
+def add_job(jobs, job_id: str, finished_at=None):
+    jobs[job_id] = {"directory": job_id, "progress": None, "task": None, "finished_at": finished_at}
+
+
+def test_prune_removes_expired_finished_jobs(jobs, monkeypatch):
+    monkeypatch.setattr(ingest_routes.time, "monotonic", lambda: 1000.0)
+    add_job(jobs, "expired", finished_at=900.0)
+    add_job(jobs, "recent", finished_at=990.0)
+    add_job(jobs, "running")
+    ingest_routes._prune_jobs()
+    assert set(jobs) == {"recent", "running"}
+
+
+def test_prune_keeps_running_jobs_and_caps_finished(jobs, monkeypatch):
+    monkeypatch.setattr(ingest_routes.time, "monotonic", lambda: 1000.0)
+    for i in range(4):
+        add_job(jobs, f"finished{i}", finished_at=990.0 + i)
+    add_job(jobs, "running")
+    ingest_routes._prune_jobs()
+    # 上限3件まで古い完了済みジョブから削除し、実行中のジョブは残す
+    assert set(jobs) == {"finished2", "finished3", "running"}
+
+
+def test_done_callback_marks_job_finished(jobs):
+    add_job(jobs, "job")
+    ingest_routes._on_job_done("job", DoneTask())
+    assert jobs["job"]["finished_at"] is not None
+    ingest_routes._on_job_done("unknown", DoneTask())
+
+
+def test_manifest_rows_outside_directory_are_skipped(tmp_path):
+    from app.services.report_ingestion import scan_directory
+
+    directory = tmp_path / "reports"
+    (directory / "sub").mkdir(parents=True)
+    outside = tmp_path / "secret.pdf"
+    outside.write_bytes(b"%PDF-")
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text(
+        "code,company_name,file\n"
+        "1111,内側,sub/1111.pdf\n"
+        f"2222,絶対パス,{outside}\n"
+        "3333,親ディレクトリ,../secret.pdf\n"
+        "4444,迂回,sub/../../secret.pdf\n",
+        encoding="utf-8"
+    )
+    items = scan_directory(str(directory), str(manifest))
+    assert [(item.code, item.path) for item in items] == [
+        ("1111", os.path.join(os.path.realpath(directory), "sub", "1111.pdf"))
+    ]
@@ -0,0 +1,33 @@
+import os
+
+from app.config import settings
+from app.utils.pdf_downloader import PDFDownloader
+
+
+def cached_pdf(downloader: PDFDownloader, url: str, size: int, mtime: float) -> str:
+    path = downloader.cache_path(url)
+    with open(path, "wb") as f:
+        f.write(b"%PDF-" + b"x" * (size - 5))
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_prune_removes_oldest_files_but_keeps_leased_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_DOWNLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PDF_DOWNLOAD_CACHE_MAX_BYTES", 250)
+    downloader = PDFDownloader()
+    in_use = cached_pdf(downloader, "https://example.com/in_use.pdf", 100, 1000)
+    oldest_free = cached_pdf(downloader, "https://example.com/old.pdf", 100, 1001)
+    newest = cached_pdf(downloader, "https://example.com/new.pdf", 100, 1002)
+
+    with downloader.lease("https://example.com/in_use.pdf"):
+        downloader._prune()
+    assert os.path.exists(in_use)
+    assert not os.path.exists(oldest_free)
+    assert os.path.exists(newest)
+
+    # 使用が終われば通常どおり古い順に削除される
+    monkeypatch.setattr(settings, "PDF_DOWNLOAD_CACHE_MAX_BYTES", 150)
+    downloader._prune()
+    assert not os.path.exists(in_use)
+    assert os.path.exists(newest)
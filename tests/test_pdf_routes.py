@@ -0,0 +1,122 @@
+import asyncio
+import io
+
+import pytest
+
+from app.api import pdf_routes
+from app.models.schemas import PDFGenerateRequest
+from app.utils.cache_backend import MemoryCacheBackend
+from app.utils import pdf_cache as pdf_cache_module
+from app.utils.pdf_cache import PDFCache
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """描画と分析の解決を記録する（描画結果は max_entry_bytes の大小で切り替える）"""
+    calls = {"render": 0, "resolve": 0}
+    content = b"%PDF-" + b"x" * 200
+
+    async def fake_render(request):
+        calls["render"] += 1
+        await asyncio.sleep(0.05)
+        return io.BytesIO(content)
+
+    async def fake_resolve(request):
+        calls["resolve"] += 1
+        return request.model_copy(update={"company_data": {"company_name": "テスト株式会社"}, "results": {"step1": "本文"}})
+
+    monkeypatch.setattr(pdf_routes, "_render_report", fake_render)
+    monkeypatch.setattr(pdf_routes, "_resolve_analysis", fake_resolve)
+    calls["content"] = content
+    return calls
+
+
+def use_cache(monkeypatch, max_entry_bytes: int) -> PDFCache:
+    cache = PDFCache(MemoryCacheBackend("pdf_test", max_bytes=1024 * 1024, max_entry_bytes=max_entry_bytes))
+    monkeypatch.setattr(pdf_cache_module, "_pdf_cache", cache)
+    return cache
+
+
+async def read_body(response) -> bytes:
+    if hasattr(response, "body_iterator"):
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return response.body
+
+
+@pytest.mark.parametrize("max_entry_bytes", [1024, 100])
+def test_request_joins_background_render_once(monkeypatch, renders, max_entry_bytes):
+    cache = use_cache(monkeypatch, max_entry_bytes)
+
+    async def scenario():
+        pdf_routes.schedule_report_render("analysis-1")
+        await asyncio.sleep(0)
+        assert pdf_routes._report_renders.in_flight(PDFCache.make_key(PDFGenerateRequest(analysis_id="analysis-1").model_dump()))
+        response = await pdf_routes.generate_analysis_report(PDFGenerateRequest(analysis_id="analysis-1"), if_none_match=None)
+        return response, await read_body(response)
+
+    response, body = asyncio.run(scenario())
+    assert body == renders["content"]
+    assert renders["render"] == 1
+    # バックグラウンド描画とリクエストがそれぞれ1回だけ解決する
+    assert renders["resolve"] == 2
+    cached = cache.get(PDFCache.make_key(PDFGenerateRequest(analysis_id="analysis-1").model_dump()))
+    assert cached == (renders["content"] if max_entry_bytes == 1024 else None)
+
+
+def test_concurrent_oversized_requests_share_one_render(monkeypatch, renders):
+    use_cache(monkeypatch, 100)
+
+    async def scenario():
+        request = PDFGenerateRequest(analysis_id="analysis-2")
+        responses = await asyncio.gather(
+            pdf_routes.generate_analysis_report(request, if_none_match=None),
+            pdf_routes.generate_analysis_report(request, if_none_match=None),
+        )
+        return [await read_body(response) for response in responses]
+
+    assert asyncio.run(scenario()) == [renders["content"], renders["content"]]
+    assert renders["render"] == 1
+    assert renders["resolve"] == 2
+
+
+def test_cache_is_accessed_off_the_event_loop(monkeypatch, renders):
+    import threading
+
+    cache = use_cache(monkeypatch, 1024)
+    threads = []
+    for name in ("get", "put"):
+        original = getattr(cache, name)
+
+        def recorded(*args, _original=original):
+            threads.append(threading.current_thread())
+            return _original(*args)
+
+        monkeypatch.setattr(cache, name, recorded)
+
+    async def scenario():
+        request = PDFGenerateRequest(analysis_id="analysis-3")
+        await read_body(await pdf_routes.generate_analysis_report(request, if_none_match=None))
+        await read_body(await pdf_routes.generate_analysis_report(request, if_none_match=None))
+
+    asyncio.run(scenario())
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
+    assert renders["render"] == 1
+
+
+def test_report_etag_is_weak(monkeypatch, renders):
+    use_cache(monkeypatch, 1024)
+
+    async def scenario():
+        request = PDFGenerateRequest(analysis_id="analysis-4")
+        response = await pdf_routes.generate_analysis_report(request, if_none_match=None)
+        await read_body(response)
+        etag = response.headers["etag"]
+        revalidated = await pdf_routes.generate_analysis_report(request, if_none_match=etag)
+        strong = await pdf_routes.generate_analysis_report(request, if_none_match=etag[2:])
+        return etag, revalidated.status_code, strong.status_code
+
+    etag, revalidated, strong = asyncio.run(scenario())
+    # 描画日時が入るため、描画し直すとバイト列が変わる
+    assert etag.startswith('W/"')
+    assert revalidated == strong == 304
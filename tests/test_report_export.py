@@ -0,0 +1,76 @@
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.report_export import ReportExporter
+
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """描画をスレッドで行うクライアント（'Japanese' フォントは代替フォントで登録する）"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from main import app
+
+    try:
+        pdfmetrics.getFont("Japanese")
+    except KeyError:
+        pdfmetrics.registerFont(TTFont("Japanese", FONT_PATH))
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(ReportExporter, "_executor", executor)
+    yield TestClient(app)
+    executor.shutdown(wait=True)
+
+
+def report(company_name: str) -> dict:
+    return {
+        "company_data": {"company_name": company_name},
+        "results": {"step1": f"{company_name}の事業概要", "step2": "経営課題"},
+    }
+
+
+def test_export_streams_zip_of_reports(client):
+    response = client.post("/pdf/export", json={"reports": [report("A社"), report("B社"), report("A社")]})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = sorted(archive.namelist())
+        assert len(names) == 3
+        assert [name.split("_")[0] for name in names] == ["A社", "A社", "B社"]
+        for name in names:
+            assert archive.read(name).startswith(b"%PDF-")
+
+
+def test_export_rejects_empty_request(client):
+    assert client.post("/pdf/export", json={"reports": []}).status_code == 422
+
+
+def test_export_lists_failed_reports(client, monkeypatch):
+    from app.services import report_export
+
+    render = report_export._render_report_file
+
+    def failing_render(payload, path):
+        if payload["company_data"]["company_name"] == "B社":
+            raise ValueError("描画失敗")
+        return render(payload, path)
+
+    monkeypatch.setattr(report_export, "_render_report_file", failing_render)
+    response = client.post("/pdf/export", json={"reports": [report("A社"), report("B社")]})
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert len([name for name in archive.namelist() if name.endswith(".pdf")]) == 1
+        assert archive.read("errors.txt").decode("utf-8") == "2件目（B社）: 描画失敗"
+
+
+def test_export_stores_entries_without_recompression(client):
+    response = client.post("/pdf/export", json={"reports": [report("A社")]})
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert [info.compress_type for info in archive.infolist()] == [zipfile.ZIP_STORED]
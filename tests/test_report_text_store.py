@@ -0,0 +1,35 @@
+import os
+import threading
+
+from app.utils.report_text_store import ReportTextStore
+
+
+def test_roundtrip_pages_and_sections(tmp_path):
+    store = ReportTextStore(str(tmp_path))
+    store.put("doc", ["【事業の内容】\n本文1\n", "本文2\n", "【事業等のリスク】\n本文3\n"])
+    assert store.read_pages("doc") == ["【事業の内容】\n本文1\n", "本文2\n", "【事業等のリスク】\n本文3\n"]
+    assert store.read_section("doc", "事業の内容") == "【事業の内容】\n本文1\n本文2\n【事業等のリスク】\n本文3\n"
+
+
+def test_rewrite_is_seen_by_store_with_cached_index(tmp_path):
+    reader = ReportTextStore(str(tmp_path))
+    ReportTextStore(str(tmp_path)).put("doc", ["古い本文\n"])
+    assert reader.read_pages("doc") == ["古い本文\n"]
+
+    # 別のインスタンス（別プロセス）が書き直しても、古い索引と新しいデータを組み合わせない
+    ReportTextStore(str(tmp_path)).put("doc", ["新しい本文です\n", "2ページ目\n"])
+    assert reader.read_pages("doc") == ["新しい本文です\n", "2ページ目\n"]
+    assert sorted(name.endswith(".bin") for name in os.listdir(tmp_path)).count(True) == 1
+
+
+def test_concurrent_puts_of_same_key_leave_a_consistent_document(tmp_path):
+    store = ReportTextStore(str(tmp_path))
+    documents = [[f"文書{i}のページ{page}\n" * (i + 1) for page in range(5)] for i in range(8)]
+    threads = [threading.Thread(target=store.put, args=("doc", pages)) for pages in documents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert ReportTextStore(str(tmp_path)).read_pages("doc") in documents
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services import gemini_scheduler
+from app.services.gemini_scheduler import GeminiScheduler, Priority, effective_priority, priority_scope
+from app.utils.request_deadline import current_deadline, remaining_seconds
+from app.utils.single_flight import SingleFlight
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = GeminiScheduler(rpm_limit=1000, tpm_limit=10_000_000, max_concurrency=1)
+    monkeypatch.setattr(gemini_scheduler, "_scheduler", scheduler)
+    return scheduler
+
+
+def test_interactive_waiter_raises_shared_flight_priority(scheduler):
+    async def scenario():
+        flights = SingleFlight()
+        release = threading.Event()
+        order = []
+
+        async def call(name, priority=None):
+            await scheduler.submit(lambda: order.append(name), 10, priority)
+
+        # 実行枠を塞いでおき、以降の呼び出しを待機させる
+        blocker = asyncio.ensure_future(scheduler.submit(release.wait, 10, Priority.INTERACTIVE))
+        try:
+            await asyncio.sleep(0.01)
+            other = asyncio.ensure_future(call("other_background", Priority.BACKGROUND))
+            started = asyncio.Event()
+
+            async def summary():
+                started.set()
+                await call("shared_summary")
+                return effective_priority()
+
+            with priority_scope(Priority.BACKGROUND):
+                prefetch = asyncio.ensure_future(flights.run("key", summary))
+            await started.wait()
+            await asyncio.sleep(0.01)
+            assert scheduler.stats()["queued"] == {"interactive": 0, "background": 2, "batch": 0}
+
+            interactive = asyncio.ensure_future(flights.run("key", summary))
+            await asyncio.sleep(0.01)
+            assert scheduler.stats()["queued"] == {"interactive": 1, "background": 1, "batch": 0}
+        finally:
+            release.set()
+
+        results = await asyncio.gather(blocker, other, prefetch, interactive)
+        assert order == ["shared_summary", "other_background"]
+        assert results[2] == results[3] == Priority.INTERACTIVE
+
+    asyncio.run(scenario())
+
+
+def test_background_waiters_keep_background_priority(scheduler):
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            return effective_priority()
+
+        with priority_scope(Priority.BACKGROUND):
+            results = await asyncio.gather(flights.run("key", work), flights.run("key", work))
+        assert results == [Priority.BACKGROUND, Priority.BACKGROUND]
+
+    asyncio.run(scenario())
+
+
+def test_nested_flight_follows_outer_priority(scheduler):
+    async def scenario():
+        outer_flights, inner_flights = SingleFlight(), SingleFlight()
+        joined = asyncio.Event()
+
+        async def inner():
+            await joined.wait()
+            return effective_priority()
+
+        async def outer():
+            return await inner_flights.run("inner", inner)
+
+        with priority_scope(Priority.BATCH):
+            first = asyncio.ensure_future(outer_flights.run("outer", outer))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(outer_flights.run("outer", outer))
+        await asyncio.sleep(0)
+        joined.set()
+        assert await asyncio.gather(first, second) == [Priority.INTERACTIVE, Priority.INTERACTIVE]
+
+    asyncio.run(scenario())
+
+
+def test_nested_flight_follows_latest_waiter_deadline():
+    async def scenario():
+        outer_flights, inner_flights = SingleFlight(), SingleFlight()
+        joined = asyncio.Event()
+
+        async def inner():
+            await joined.wait()
+            return remaining_seconds()
+
+        async def outer():
+            return await inner_flights.run("inner", inner)
+
+        async def run(timeout):
+            current_deadline.set(None if timeout is None else time.monotonic() + timeout)
+            return await outer_flights.run("outer", outer)
+
+        first = asyncio.ensure_future(run(1))
+        await asyncio.sleep(0.01)
+        later = asyncio.ensure_future(run(60))
+        await asyncio.sleep(0)
+        joined.set()
+        extended = await asyncio.gather(first, later)
+
+        joined.clear()
+        first = asyncio.ensure_future(run(1))
+        await asyncio.sleep(0.01)
+        unbounded = asyncio.ensure_future(run(None))
+        await asyncio.sleep(0)
+        joined.set()
+        return extended, await asyncio.gather(first, unbounded)
+
+    extended, unbounded = asyncio.run(scenario())
+    assert all(50 < remaining < 60 for remaining in extended)
+    assert unbounded == [None, None]
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from typing import List
+
+import pytest
+
+from app.config import settings
+from app.services.fake_gemini_model import FakeGenerativeModel
+from app.services.gemini_service import SUMMARY_STEPS, GeminiService
+from app.utils.cache_backend import MemoryCacheBackend
+from app.utils.request_deadline import DeadlineExceeded, current_deadline
+from app.utils.step_checkpoint import StepCheckpointStore
+
+SECTIONS = ["事業の内容", "経営成績", "事業等のリスク", "設備の状況", "対処すべき課題", "研究開発活動"]
+
+
+def make_pages(count: int = 40) -> List[str]:
+    """見出しと本文を含む合成の報告書ページ"""
+    pages = []
+    for i in range(count):
+        section = SECTIONS[i % len(SECTIONS)]
+        body = f"当社グループの{section}について、売上高・設備投資・人手不足・DX・IT投資の状況を記載する。" * 12
+        pages.append(f"【{section}】\n{body}\n")
+    return pages
+
+
+def make_service(model: FakeGenerativeModel) -> GeminiService:
+    service = GeminiService(model=model)
+    service.checkpoints = StepCheckpointStore(
+        MemoryCacheBackend("test_checkpoints", max_bytes=16 * 1024 * 1024, max_entry_bytes=1024 * 1024)
+    )
+    pages = make_pages()
+
+    async def load_pages(pdf_url: str) -> List[str]:
+        return pages
+
+    service._load_raw_report_pages = load_pages
+    return service
+
+
+def run_chain(monkeypatch, mode: str, pdf_url: str):
+    monkeypatch.setattr(settings, "SUMMARY_CHAIN_MODE", mode)
+    model = FakeGenerativeModel()
+    service = make_service(model)
+    result = asyncio.run(service.run_summary_chain(pdf_url, "テスト株式会社"))
+    return model, service, result
+
+
+@pytest.mark.parametrize("mode", ["independent", "session", "cached"])
+def test_chain_calls_each_step_once(monkeypatch, mode):
+    model, _, result = run_chain(monkeypatch, mode, f"local-report://test/{mode}")
+
+    assert len(model.calls) == len(SUMMARY_STEPS)
+    assert sorted(result.step_results) == list(range(1, len(SUMMARY_STEPS) + 1))
+    assert result.reused_steps == []
+    for i in range(1, len(SUMMARY_STEPS) + 1):
+        assert f"## Step {i}:" in result.step_results[i]
+    expected_kind = "generate_content" if mode == "independent" else "send_message"
+    assert {call.kind for call in model.calls} == {expected_kind}
+
+
+def test_session_and_cached_modes_send_less_input(monkeypatch):
+    independent, _, _ = run_chain(monkeypatch, "independent", "local-report://test/compare-independent")
+    session, _, _ = run_chain(monkeypatch, "session", "local-report://test/compare-session")
+    cached, _, _ = run_chain(monkeypatch, "cached", "local-report://test/compare-cached")
+
+    # session は前回送信分が暗黙的キャッシュに載り、cached は報告書がコンテキストキャッシュに載る
+    assert session.total_input_chars < independent.total_input_chars
+    assert cached.total_input_chars < session.total_input_chars
+    # 報告書を含むのは最初の送信だけ
+    assert all(call.input_chars < session.calls[0].input_chars for call in session.calls[1:])
+    assert sum(call.cached_chars for call in cached.calls) > 0
+
+
+def test_chain_resumes_from_checkpoints(monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_CHAIN_MODE", "independent")
+    model = FakeGenerativeModel()
+    service = make_service(model)
+    pdf_url = "local-report://test/resume"
+    asyncio.run(service.run_summary_chain(pdf_url, "テスト株式会社"))
+
+    # 後半のチェックポイントを消すと、そのステップだけを再実行する
+    keys = service._summary_checkpoint_keys(pdf_url, "テスト株式会社", SUMMARY_STEPS)
+    for key in keys[3:]:
+        service.checkpoints.backend.delete(key)
+    model.calls.clear()
+    result = asyncio.run(service.run_summary_chain(pdf_url, "テスト株式会社"))
+
+    assert result.reused_steps == [1, 2, 3]
+    assert len(model.calls) == len(SUMMARY_STEPS) - 3
+
+
+class ConfigRecordingModel(FakeGenerativeModel):
+    """generate_content に渡された生成設定を記録する"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.configs = []
+
+    def generate_content(self, contents, generation_config=None):
+        self.configs.append(generation_config)
+        return super().generate_content(contents, generation_config=generation_config)
+
+
+def step_budgets(service: GeminiService) -> List[int]:
+    return [service._load_yaml_prompt(yaml_file)["max_output_tokens"] for yaml_file, _ in SUMMARY_STEPS]
+
+
+def sent_budgets(model: ConfigRecordingModel) -> List[int]:
+    """送信した出力上限から、思考トークンの分を除いた回答の上限"""
+    return [config["max_output_tokens"] - settings.GEMINI_THINKING_TOKEN_ALLOWANCE for config in model.configs]
+
+
+def test_output_budgets_apply_without_structured_output(monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_CHAIN_MODE", "independent")
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT_ENABLED", False)
+    model = ConfigRecordingModel()
+    service = make_service(model)
+    asyncio.run(service.run_summary_chain("local-report://test/budgets", "テスト株式会社"))
+
+    assert sent_budgets(model) == step_budgets(service)
+    assert all("response_schema" not in config for config in model.configs)
+
+
+@pytest.mark.parametrize("mode, parts", [("fast", [[1, 2, 3, 4, 5, 6]]), ("fast_split", [[1, 2, 3], [4, 5, 6]])])
+def test_fast_modes_use_summed_step_budgets(monkeypatch, mode, parts):
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT_ENABLED", False)
+    model = ConfigRecordingModel()
+    service = make_service(model)
+    result = asyncio.run(service.run_summary_chain(f"local-report://test/{mode}", "テスト株式会社", mode))
+
+    budgets = step_budgets(service)
+    assert sorted(sent_budgets(model)) == sorted(
+        sum(budgets[i - 1] for i in steps) for steps in parts
+    )
+    assert sorted(result.step_results) == list(range(1, len(SUMMARY_STEPS) + 1))
+
+
+def test_thinking_allowance_is_added_to_output_budget(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_THINKING_TOKEN_ALLOWANCE", 1000)
+    service = make_service(ConfigRecordingModel())
+    assert service._generation_config(4096) == {"max_output_tokens": 5096}
+    monkeypatch.setattr(settings, "GEMINI_THINKING_TOKEN_ALLOWANCE", 0)
+    assert service._generation_config(4096) == {"max_output_tokens": 4096}
+    assert service._generation_config(None) is None
+
+
+def slow_loading_service(model: FakeGenerativeModel, seconds: float) -> GeminiService:
+    service = make_service(model)
+    load_pages = service._load_raw_report_pages
+
+    async def slow_load_pages(pdf_url: str) -> List[str]:
+        await asyncio.sleep(seconds)
+        return await load_pages(pdf_url)
+
+    service._load_raw_report_pages = slow_load_pages
+    return service
+
+
+def test_slow_stage_hits_request_deadline_inside_shared_chain():
+    model = FakeGenerativeModel()
+    service = slow_loading_service(model, 0.1)
+
+    async def scenario():
+        current_deadline.set(time.monotonic() + 0.05)
+        await service.run_summary_chain("local-report://test/deadline", "テスト株式会社")
+
+    with pytest.raises(DeadlineExceeded, match="gemini"):
+        asyncio.run(scenario())
+    assert model.calls == []
+
+
+def test_waiter_with_later_deadline_extends_shared_chain():
+    model = FakeGenerativeModel()
+    service = slow_loading_service(model, 0.1)
+
+    async def run(timeout):
+        current_deadline.set(time.monotonic() + timeout)
+        return await service.run_summary_chain("local-report://test/extended", "テスト株式会社")
+
+    async def scenario():
+        first = asyncio.ensure_future(run(0.05))
+        await asyncio.sleep(0.01)
+        return await asyncio.gather(first, run(60), return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    # 先に期限が来る呼び出し元がいても、遅い期限の呼び出し元が待つ限り処理を続ける
+    assert first is second
+    assert len(model.calls) == len(SUMMARY_STEPS)
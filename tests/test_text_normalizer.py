@@ -0,0 +1,42 @@
+from app.utils.text_normalizer import normalize_pages
+
+BODIES = ["事業の概況について説明します。", "経営方針を示します。", "設備投資の状況です。", "研究開発の成果です。", "リスク要因を挙げます。"]
+
+
+def make_pages(count: int, first: str, last: str, start: int = 1) -> list:
+    """各ページの先頭・末尾の行を書式で指定したページ（{n} はページ番号）"""
+    return [
+        f"{first.format(n=start + i)}\n{BODIES[i]}\n{last.format(n=start + i)}\n"
+        for i in range(count)
+    ]
+
+
+def test_removes_repeated_header_and_decorated_page_numbers():
+    result = normalize_pages(make_pages(5, "株式会社サンプル 有価証券報告書", "- {n} -"))
+    assert result.pages == [f"{body}\n" for body in BODIES]
+    assert result.removed_edge_lines == 10
+
+
+def test_removes_bare_numbers_that_follow_the_page_sequence():
+    result = normalize_pages(make_pages(5, "株式会社サンプル", "{n}", start=31))
+    assert result.pages == [f"{body}\n" for body in BODIES]
+
+
+def test_keeps_bare_numbers_outside_the_page_sequence():
+    # 表の最後のセル（年度や金額）がページの最後の行になっても削除しない
+    pages = [f"売上高の推移\n{BODIES[i]}\n{value}\n" for i, value in enumerate(["2023", "345", "2023", "12", "7"])]
+    result = normalize_pages(pages)
+    assert [page.splitlines()[-1] for page in result.pages] == ["2023", "345", "2023", "12", "7"]
+
+
+def test_header_with_page_number_is_removed_across_pages():
+    result = normalize_pages(make_pages(5, "有価証券報告書 {n}", "本ページ末尾"))
+    assert all(not page.startswith("有価証券報告書") for page in result.pages)
+
+
+def test_keeps_edge_lines_that_differ_only_by_numbers():
+    # 数字だけが異なる本文の行はヘッダーとみなさない
+    pages = [f"当期の従業員数は{100 + i * 7}名です。\n{BODIES[i]}\n" for i in range(5)]
+    result = normalize_pages(pages)
+    assert [page.splitlines()[0] for page in result.pages] == [f"当期の従業員数は{100 + i * 7}名です。" for i in range(5)]
+    assert result.removed_edge_lines == 0
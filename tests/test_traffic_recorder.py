@@ -0,0 +1,95 @@
+import pytest
+
+from app.config import settings
+from app.utils import traffic_recorder
+from app.utils.traffic_recorder import (
+    Cassette,
+    CassetteWriter,
+    RecordingModel,
+    UpstreamNotRecorded,
+    current_request_id,
+)
+
+
+@pytest.fixture
+def cassette_dir(tmp_path):
+    """2件のリクエストでGeminiを2回・1回呼び出した記録"""
+    writer = CassetteWriter(str(tmp_path))
+    for request_id, calls in (("req-1", ["a1", "a2"]), ("req-2", ["b1"])):
+        token = current_request_id.set(request_id)
+        try:
+            for key in calls:
+                writer.record_upstream("gemini", key, 0.0, response=f"{key}の応答")
+        finally:
+            current_request_id.reset(token)
+    return str(tmp_path)
+
+
+def next_in_request(cassette: Cassette, request_id: str, kind: str, key: str) -> str:
+    token = current_request_id.set(request_id)
+    try:
+        return cassette.next(kind, key)["response"]
+    finally:
+        current_request_id.reset(token)
+
+
+def test_exact_match_takes_precedence(cassette_dir):
+    cassette = Cassette([cassette_dir])
+    assert next_in_request(cassette, "req-2", "gemini", "a2") == "a2の応答"
+    assert cassette.match_stats() == {"exact": 1, "request": 0, "kind": 0, "missing": 0}
+
+
+def test_changed_calls_fall_back_to_request_order(cassette_dir):
+    cassette = Cassette([cassette_dir])
+    assert next_in_request(cassette, "req-1", "gemini", "changed-1") == "a1の応答"
+    assert next_in_request(cassette, "req-1", "gemini", "changed-2") == "a2の応答"
+    assert next_in_request(cassette, "req-2", "gemini", "changed-3") == "b1の応答"
+    assert cassette.match_stats() == {"exact": 0, "request": 3, "kind": 0, "missing": 0}
+
+
+def test_unknown_request_falls_back_to_kind_order(cassette_dir):
+    cassette = Cassette([cassette_dir])
+    assert [next_in_request(cassette, "other", "gemini", f"changed-{i}") for i in range(4)] == [
+        "a1の応答", "a2の応答", "b1の応答", "a1の応答"
+    ]
+    with pytest.raises(UpstreamNotRecorded):
+        next_in_request(cassette, "req-1", "pdf", "missing")
+    assert cassette.match_stats() == {"exact": 0, "request": 0, "kind": 4, "missing": 1}
+
+
+def test_fallback_can_be_disabled(cassette_dir):
+    cassette = Cassette([cassette_dir], fallback=False)
+    with pytest.raises(UpstreamNotRecorded):
+        next_in_request(cassette, "req-1", "gemini", "changed-1")
+    assert cassette.match_stats()["missing"] == 1
+
+
+def test_replayed_model_answers_changed_prompt(tmp_path, monkeypatch):
+    # 記録時と異なるプロンプト（検索件数の変更など）でも同じリクエストの応答を返す
+    writer = CassetteWriter(str(tmp_path))
+    monkeypatch.setattr(settings, "TRAFFIC_RECORDING_ENABLED", True)
+    monkeypatch.setattr(traffic_recorder, "_writer", writer)
+
+    class Model:
+        model_name = "recorded"
+
+        def generate_content(self, contents, generation_config=None):
+            return traffic_recorder.RecordedResponse(f"記録時の応答: {contents}")
+
+    token = current_request_id.set("req-1")
+    try:
+        RecordingModel(Model()).generate_content("元のプロンプト")
+    finally:
+        current_request_id.reset(token)
+
+    monkeypatch.setattr(settings, "TRAFFIC_RECORDING_ENABLED", False)
+    monkeypatch.setattr(settings, "TRAFFIC_REPLAY_CASSETTES", [str(tmp_path)])
+    monkeypatch.setattr(settings, "TRAFFIC_REPLAY_LATENCY_SCALE", 0.0)
+    monkeypatch.setattr(traffic_recorder, "_cassette", None)
+    token = current_request_id.set("req-1")
+    try:
+        response = RecordingModel().generate_content("変更後のプロンプト")
+    finally:
+        current_request_id.reset(token)
+    assert response.text == "記録時の応答: 元のプロンプト"
+    assert traffic_recorder.replay_match_stats() == {"exact": 0, "request": 1, "kind": 0, "missing": 0}
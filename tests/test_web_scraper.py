@@ -0,0 +1,72 @@
+from typing import Dict
+
+import pytest
+import requests
+
+from app.utils.cache_backend import MemoryCacheBackend
+from app.utils.report_url_cache import ReportURLCache
+from app.utils.web_scraper import WebScraper
+
+LIST_PAGE = '<a href="/nkd/company/ednr/report/?id=1">有価証券報告書</a>'
+REPORT_PAGE = "<script>window['pdfLocation'] = \"/pdf/report.pdf\";</script>"
+
+
+class FakeResponse:
+    def __init__(self, text: str, status: int = 200):
+        self.text = text
+        self.status = status
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise requests.HTTPError(f"{self.status} Error")
+
+
+class FakeSession:
+    """URLの一部に対応する応答（例外なら送出）を返す requests.Session の代替"""
+
+    pages: Dict[str, object] = {}
+
+    def __init__(self):
+        self.headers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def get(self, url: str, timeout=None) -> FakeResponse:
+        for fragment, page in self.pages.items():
+            if fragment in url:
+                if isinstance(page, Exception):
+                    raise page
+                return page
+        return FakeResponse("", 404)
+
+
+@pytest.fixture
+def scraper(monkeypatch):
+    monkeypatch.setattr(requests, "Session", FakeSession)
+    backend = MemoryCacheBackend("test_report_urls", max_bytes=1024 * 1024, max_entry_bytes=4096)
+    return WebScraper(ReportURLCache(backend))
+
+
+def test_resolves_and_caches_pdf_url(scraper):
+    FakeSession.pages = {"scode=": FakeResponse(LIST_PAGE), "report/": FakeResponse(REPORT_PAGE)}
+    assert scraper.fetch_securities_report_pdf("1234") == "https://www.nikkei.com/pdf/report.pdf"
+    assert scraper.url_cache.get("1234").pdf_url == "https://www.nikkei.com/pdf/report.pdf"
+
+
+@pytest.mark.parametrize("failure", [requests.ConnectionError("connection reset"), FakeResponse("", 503)])
+def test_transport_error_on_report_page_is_not_cached(scraper, failure):
+    FakeSession.pages = {"scode=": FakeResponse(LIST_PAGE), "report/": failure}
+    assert scraper.fetch_securities_report_pdf("1234") is None
+    # 一時的な障害を「見つからない」として保存しない
+    assert scraper.url_cache.get("1234") is None
+
+
+def test_missing_link_is_cached_as_not_found(scraper):
+    FakeSession.pages = {"scode=": FakeResponse(LIST_PAGE), "report/": FakeResponse("<html></html>")}
+    assert scraper.fetch_securities_report_pdf("1234") is None
+    entry = scraper.url_cache.get("1234")
+    assert entry is not None and entry.pdf_url is None